@@ -53,12 +53,17 @@ LOGOUT_REDIRECT_URL = 'Login'
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'books.middleware.StaticAssetMiddleware',
+    'books.middleware.SQLProfileMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'users.middleware.UserContextMiddleware',
+    'books.middleware.RateLimitMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'books.middleware.ReplicaMiddleware',
 ]
 
 ROOT_URLCONF = 'bookexchangesystem.urls'
@@ -73,6 +78,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'users.context_processors.user_context',
             ],
         },
     },
@@ -84,11 +90,58 @@ WSGI_APPLICATION = 'bookexchangesystem.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/6.0/ref/settings/#databases
 
+# Server tuning for SQLite under concurrent load: BEGIN IMMEDIATE below
+# and SQLITE_PRAGMAS (books/sqlite.py). On when DEBUG is off; set
+# SQLITE_TUNING=1 or 0 in the environment to choose.
+SQLITE_TUNING = os.environ.get('SQLITE_TUNING', '0' if DEBUG else '1') == '1'
+SQLITE_OPTIONS = {
+    # take the write lock at BEGIN: a writer then waits out busy_timeout
+    # instead of failing with "database is locked" on lock upgrade
+    'transaction_mode': 'IMMEDIATE',
+} if SQLITE_TUNING else {}
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # reuse connections across requests so the PRAGMAs below run once each
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': SQLITE_OPTIONS,
+    },
+}
+
+# Read replica for @replica_reads views (books/routers.py). Locally it is a
+# snapshot of db.sqlite3 refreshed by `manage.py snapshot_replica`; until
+# that file exists every query stays on default.
+REPLICA_PATH = BASE_DIR / 'db-replica.sqlite3'
+if REPLICA_PATH.exists():
+    DATABASES['replica'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': REPLICA_PATH,
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        'TEST': {'MIRROR': 'default'},
     }
+
+DATABASE_ROUTERS = ['books.routers.ReplicaRouter']
+
+# Seconds a browser keeps reading from the primary after it writes.
+# Keep it above the replica's lag (the snapshot interval locally).
+REPLICA_STICKY_SECONDS = 30
+
+# Applied to every new SQLite connection when SQLITE_TUNING is on
+# (books/sqlite.py), in this order; the replica, a read-only snapshot,
+# skips journal_mode and synchronous. WAL lets readers run alongside the
+# single writer; NORMAL only fsyncs at checkpoints, which is still
+# durable against application crashes.
+SQLITE_PRAGMAS = {
+    'busy_timeout': 5000,              # ms to wait for the write lock
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'mmap_size': 128 * 1024 * 1024,    # bytes
+    'cache_size': -32000,              # negative = KiB, ~32 MB per connection
+    'temp_store': 'MEMORY',
 }
 
 
@@ -111,6 +164,19 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 
+# Sessions are read from the cache and written to the database behind it
+# (users/sessions.py); the logged-in user and profile are cached for
+# AUTH_USER_CACHE_SECONDS (users/backends.py). Both use the "default"
+# cache; with a per-process cache (LocMem) there is nothing a logout or
+# deactivation in one worker could reach in the others, so they fall
+# back to plain cached_db sessions and uncached users.
+SESSION_ENGINE = 'users.sessions'
+SESSION_WRITE_BEHIND_SECONDS = 30
+
+AUTHENTICATION_BACKENDS = ['users.backends.CachedModelBackend']
+AUTH_USER_CACHE_SECONDS = 60
+
+
 # Internationalization
 # https://docs.djangoproject.com/en/6.0/topics/i18n/
 
@@ -130,7 +196,112 @@ STATIC_URL = 'static/'
 STATICFILES_DIRS = [
     os.path.join(BASE_DIR, 'static')
 ]
+# `manage.py collectstatic` is the build step: it writes minified,
+# content-hashed files with .gz/.br variants here (books/staticfiles.py)
+STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 
 MEDIA_URL = '/media/'
 
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+
+# Let the front proxy send media bytes (books/media.py): None streams them
+# from Django, "x-accel-redirect" for nginx (an internal location at
+# MEDIA_ACCEL_REDIRECT_PREFIX aliased to MEDIA_ROOT), "x-sendfile" for
+# Apache mod_xsendfile / lighttpd.
+MEDIA_OFFLOAD = None
+MEDIA_ACCEL_REDIRECT_PREFIX = '/protected-media/'
+
+# Covers and avatars are stored once per distinct content (books/storage.py)
+STORAGES = {
+    "default": {
+        "BACKEND": "books.storage.ContentAddressedStorage",
+    },
+    "staticfiles": {
+        "BACKEND": "books.staticfiles.CompressedManifestStaticFilesStorage",
+    },
+}
+
+# "default" holds state every server process must agree on (sessions,
+# cached users, page and taxonomy versions), so it is not per-process
+# LocMem: it is files under CACHE_DIR on local disk, shared by every
+# worker on the host and read without any SQL (books/filecache.py). On
+# more than one host point it at Memcached or Redis, so that a logout or
+# an invalidation reaches all of them.
+# Rendered book cards (books/cards.py) stay in process: LocMemCache evicts
+# least recently used entries past MAX_ENTRIES.
+CACHE_DIR = BASE_DIR / 'cache'
+CACHES = {
+    "default": {
+        "BACKEND": "books.filecache.FileCache",
+        "LOCATION": CACHE_DIR,
+        "OPTIONS": {"MAX_ENTRIES": 100000, "CULL_FREQUENCY": 4},
+    },
+    "cards": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "book-cards",
+        "TIMEOUT": 60 * 60 * 24,
+        "OPTIONS": {"MAX_ENTRIES": 5000, "CULL_FREQUENCY": 10},
+    },
+}
+# tests get scratch caches, emptied before each test (bookexchangesystem/test_runner.py)
+TEST_RUNNER = 'bookexchangesystem.test_runner.DiscoverRunner'
+
+# Anonymous whole-page cache (books/pagecache.py); signals retire pages
+# early when their categories or book change
+PAGE_CACHE_SECONDS = 300
+
+# Token-bucket budgets for @rate_limited views (books/ratelimit.py), per
+# user and per client IP. The page scripts poll /books/check/ every 5s and
+# each exchange badge every 4s, so "poll" leaves room for a few tabs.
+RATE_LIMITS = {
+    "poll": {"user": "60/m", "ip": "300/m"},
+    "exchange_request": {"user": "10/m", "ip": "30/m"},
+}
+# Reverse proxies in front of the app that append to X-Forwarded-For
+# (1 behind nginx). Leave 0 only when clients connect directly: behind a
+# proxy REMOTE_ADDR is the proxy, and every client would share one bucket.
+RATE_LIMIT_TRUSTED_PROXIES = 0
+# The bucket table every worker on this host maps (1.5 MB). A path on a
+# tmpfs such as /dev/shm keeps it off the disk; None keeps it per process.
+RATE_LIMIT_PATH = BASE_DIR / 'ratelimit.buckets'
+
+# Stream the explore / requests / exchanged lists (books/streaming.py): the
+# page header goes out first and rows follow from a chunked cursor. Turn
+# off behind a proxy that buffers whole responses anyway.
+STREAM_LIST_PAGES = True
+
+# Per-request SQL profiling (books/sqlprofile.py). A sampled request that
+# takes longer than SQL_PROFILE_SLOW_MS or runs more than
+# SQL_PROFILE_SLOW_QUERIES queries goes to SQL_PROFILE_LOG as a JSON line;
+# staff browse the worst at /admin/slow-requests/. Keep the sample small
+# in production: a profiled query pays for a stack walk.
+SQL_PROFILE_SAMPLE_RATE = 1.0 if DEBUG else 0.05
+SQL_PROFILE_SLOW_MS = 500
+SQL_PROFILE_SLOW_QUERIES = 50
+SQL_PROFILE_LOG = BASE_DIR / 'slow_requests.log'
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        # rotation is per process: with several workers point this at a
+        # WatchedFileHandler and let logrotate rotate it
+        'slow_requests': {
+            'class': 'logging.handlers.RotatingFileHandler',
+            'filename': SQL_PROFILE_LOG,
+            'maxBytes': 10 * 1024 * 1024,
+            'backupCount': 5,
+            'delay': True,
+        },
+    },
+    'loggers': {
+        'books.sqlprofile': {
+            'handlers': ['slow_requests'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}
+
+# Background thumbnail / EXIF processing for covers and avatars
+IMAGE_PROCESSING_WORKERS = 2
@@ -0,0 +1,64 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.filebased import FileBasedCache
+from django.test.runner import DiscoverRunner as BaseDiscoverRunner
+from django.test.utils import override_settings
+from django.utils.module_loading import import_string
+
+from books import ratelimit
+
+
+def _clearing(result_class):
+    class Result(result_class):
+        def startTest(self, test):
+            # caches are files, not tables: no transaction rolls them back
+            for cache in caches.all():
+                cache.clear()
+            ratelimit.close()
+            super().startTest(test)
+
+    return Result
+
+
+class DiscoverRunner(BaseDiscoverRunner):
+    """Django's runner with the caches moved to a scratch directory.
+
+    Users, sessions and pages cached by the tests never reach the real
+    cache files, rate limits use a private bucket table, and every test
+    starts with all of them empty. Static files are served by name, so the
+    suite runs on a fresh clone without a collectstatic build.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.cache_dir = tempfile.mkdtemp(prefix="test-cache-")
+        scratch = {
+            alias: (
+                {**config, "LOCATION": os.path.join(self.cache_dir, alias)}
+                if issubclass(import_string(config["BACKEND"]), FileBasedCache) else config
+            )
+            for alias, config in settings.CACHES.items()
+        }
+        self.scratch = override_settings(
+            CACHES=scratch,
+            RATE_LIMIT_PATH=None,
+            # the hashed-name manifest is collectstatic output; tests must not need it
+            STORAGES={
+                **settings.STORAGES,
+                "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+            },
+        )
+        self.scratch.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.scratch.disable()
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+        super().teardown_test_environment(**kwargs)
+
+    def get_resultclass(self):
+        return _clearing(super().get_resultclass() or unittest.TextTestResult)
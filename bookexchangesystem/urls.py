@@ -15,13 +15,16 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
 from .import views
-from django.conf.urls.static import static
 from django.conf import settings
+from books.admin import slow_requests_view
+from books.media import serve_media
+import re
 # from django.views.generic import TemplateView
 
 urlpatterns = [
+    path('admin/slow-requests/', admin.site.admin_view(slow_requests_view), name='slow_requests'),
     path('admin/', admin.site.urls),
     path('',views.homepage, name='Home'),
     path('services/',views.services),
@@ -30,4 +33,7 @@ urlpatterns = [
     # path('contactus/', views.contactus, name='Contact Us'),
 ]
 
-urlpatterns += static(settings.MEDIA_URL, document_root = settings.MEDIA_ROOT)
\ No newline at end of file
+# Covers/avatars with ETag + Range; see MEDIA_OFFLOAD in settings
+urlpatterns += [
+    re_path(r"^%s(?P<path>.*)$" % re.escape(settings.MEDIA_URL.lstrip("/")), serve_media),
+]
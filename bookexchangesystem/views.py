@@ -3,7 +3,11 @@ from django.shortcuts import render, redirect
 from django.contrib.auth import login
 # from .forms import LoginForm
 from books.models import Category
+from books.pagecache import cache_anonymous
+from books.routers import replica_reads
 
+@cache_anonymous("taxonomy")
+@replica_reads
 def homepage(request):
     # Get the first 10 categories (excluding 'Others')
     categories = Category.objects.exclude(name="Others")[:10]
@@ -12,10 +16,12 @@ def homepage(request):
         'categories': categories,
     })
 
+@cache_anonymous("static")
 def services(request):
     #return HttpResponse("This is services page.")
     return render(request,'services.html')
 
+@cache_anonymous("static")
 def contactus(request):
     #return HttpResponse("This is services page.")
     return render(request,'contactus.html')
@@ -1,5 +1,7 @@
 from django.contrib import admin
-from .models import Book, Category, Genre, Inventory, ExchangeRequest
+from django.template.response import TemplateResponse
+from . import sqlprofile
+from .models import Book, Category, Genre, Inventory, ExchangeRequest, MediaBlob
 
 
 @admin.register(Book)
@@ -88,3 +90,34 @@ class ExchangeRequestAdmin(admin.ModelAdmin):
     readonly_fields = ("created_at",)
 
     ordering = ("-created_at",)
+
+
+@admin.register(MediaBlob)
+class MediaBlobAdmin(admin.ModelAdmin):
+    list_display = ("name", "refcount", "created_at")
+    search_fields = ("name",)
+    readonly_fields = ("name", "refcount", "created_at")
+
+
+# Slow requests from the SQL profiler's log (books/sqlprofile.py); routed
+# in bookexchangesystem/urls.py through admin.site.admin_view
+SLOW_REQUEST_ORDERS = {"ms": "Total time", "sql_ms": "SQL time", "queries": "Queries", "at": "Most recent"}
+
+
+def slow_requests_view(request):
+    order = request.GET.get("o")
+    if order not in SLOW_REQUEST_ORDERS:
+        order = "ms"
+    entries = sqlprofile.recent()
+    view = request.GET.get("view")
+    if view:
+        entries = [e for e in entries if e["view"] == view]
+    entries.sort(key=lambda e: e[order], reverse=True)
+    return TemplateResponse(request, "admin/slow_requests.html", {
+        **admin.site.each_context(request),
+        "title": "Slow requests",
+        "entries": entries[:100],
+        "orders": SLOW_REQUEST_ORDERS,
+        "order": order,
+        "view": view,
+    })
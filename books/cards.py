@@ -0,0 +1,101 @@
+import threading
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ObjectDoesNotExist
+from . import taxonomy
+from .models import Category, Genre
+
+# Rendered book cards, keyed by row version: a card is only re-rendered
+# when its book is saved (updated_at moves, as it also does once the
+# cover's thumbnails are written), its inventory status changes or the
+# category/genre names it prints change (the taxonomy versions, shared by
+# every worker process), so there is nothing to invalidate and no worker
+# can keep serving an old card. Entries live in the per-process "cards"
+# cache alias, which bounds its size (MAX_ENTRIES) on its own.
+CACHE_ALIAS = "cards"
+
+_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0}
+
+
+def get_cache():
+    return caches[CACHE_ALIAS]
+
+
+def _inventory_status(book):
+    try:
+        return book.inventory.status
+    except ObjectDoesNotExist:
+        return "none"
+
+
+def card_key(book, variant):
+    version = book.updated_at.timestamp() if book.updated_at else 0
+    names = f"{taxonomy.get_taxonomy(Category).version}.{taxonomy.get_taxonomy(Genre).version}"
+    return f"card:{variant}:{book.pk}:{version}:{_inventory_status(book)}:{names}"
+
+
+def count(hit):
+    with _lock:
+        _stats["hits" if hit else "misses"] += 1
+
+
+def stats():
+    with _lock:
+        hits, misses = _stats["hits"], _stats["misses"]
+    total = hits + misses
+    return {
+        "backend": settings.CACHES[CACHE_ALIAS]["BACKEND"],
+        "hits": hits,
+        "misses": misses,
+        "hit_rate": round(hits / total, 3) if total else None,
+    }
+
+
+def reset_stats():
+    with _lock:
+        _stats["hits"] = _stats["misses"] = 0
+
+
+# Card projections: only the columns list pages show, so descriptions,
+# ISBNs and the like stay in the database. Reading a deferred field costs
+# a query per row: a row template that starts showing a new field needs
+# it added here.
+BOOK_CARD_FIELDS = (
+    "title", "author", "slug", "price", "condition", "location",
+    "cover_image", "updated_at", "owner",
+)
+USER_CARD_FIELDS = ("username", "email", "profile__phone", "profile__avatar")
+EXCHANGE_CARD_FIELDS = (
+    "requester", "owner", "book", "expected_book", "status", "created_at",
+    "requester_wants_cash", "is_cash", "cash_amount",
+    "requester_confirmed", "owner_confirmed",
+    "reject_reason", "rejected_by__username",
+    "cancel_reason", "cancelled_by__username",
+)
+
+
+def _under(prefix, fields):
+    return [f"{prefix}__{field}" for field in fields]
+
+
+def book_cards(queryset):
+    """``queryset`` of books narrowed to what a book card renders."""
+    return queryset.select_related("category", "genre", "inventory").only(
+        *BOOK_CARD_FIELDS, "category__name", "genre__name", "inventory__status",
+    )
+
+
+def exchange_cards(queryset):
+    """``queryset`` of exchange requests with both books and both users
+    joined in, each narrowed to its card fields."""
+    return queryset.select_related(
+        "book", "expected_book", "requester__profile", "owner__profile", "rejected_by", "cancelled_by",
+    ).only(
+        *EXCHANGE_CARD_FIELDS,
+        *_under("book", BOOK_CARD_FIELDS),
+        *_under("expected_book", BOOK_CARD_FIELDS),
+        *_under("requester", USER_CARD_FIELDS),
+        *_under("owner", USER_CARD_FIELDS),
+    )
@@ -0,0 +1,19 @@
+from django.core.cache.backends.filebased import FileBasedCache
+
+# FileBasedCache lists its whole directory on every set to see whether it
+# is over MAX_ENTRIES: about 15 ms per write at 10,000 entries. Sessions
+# and cached users are written far more often than the cache fills up,
+# so count the entries only every CULL_EVERY writes of an instance
+# (instances are per thread); reads never list the directory.
+CULL_EVERY = 100
+
+
+class FileCache(FileBasedCache):
+    """FileBasedCache that checks its size every CULL_EVERY writes, not on each one."""
+
+    _writes = 0
+
+    def _cull(self):
+        self._writes += 1
+        if self._writes % CULL_EVERY == 1:
+            super()._cull()
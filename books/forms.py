@@ -1,6 +1,28 @@
 from django import forms
+from django.core.exceptions import ValidationError
 from .models import Book, Category, Genre
-from django.db.models import Case, When, Value, IntegerField
+from .taxonomy import display_name, get_taxonomy
+
+
+class TaxonomyChoiceField(forms.ModelChoiceField):
+    """ModelChoiceField served from the process-wide taxonomy cache (no queries)."""
+
+    def to_python(self, value):
+        if value in self.empty_values:
+            return None
+        key = str(getattr(value, "pk", value))
+        obj = get_taxonomy(self.queryset.model).by_id.get(key)
+        if obj is None:
+            # possibly added by another worker since our copy was checked
+            obj = get_taxonomy(self.queryset.model, fresh=True).by_id.get(key)
+        if obj is None:
+            raise ValidationError(
+                self.error_messages["invalid_choice"],
+                code="invalid_choice",
+                params={"value": value},
+            )
+        return obj
+
 
 class BookForm(forms.ModelForm):
 
@@ -56,32 +78,20 @@ class BookForm(forms.ModelForm):
             "condition": forms.Select(attrs={"class": "form-control placeholder-select"}),
         }
 
+        field_classes = {
+            "category": TaxonomyChoiceField,
+            "genre": TaxonomyChoiceField,
+        }
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
-        # Only first 10 records
-        self.fields["category"].queryset = Category.objects.all()
-        self.fields["genre"].queryset = Genre.objects.all()
-
-        self.fields["category"].queryset = Category.objects.annotate(
-            is_other=Case(
-                When(name="Others", then=Value(1)),
-                default=Value(0),
-                output_field=IntegerField(),
-            )
-        ).order_by("is_other", "name")
-
-        self.fields["genre"].queryset = Genre.objects.annotate(
-            is_other=Case(
-                When(name="Others", then=Value(1)),
-                default=Value(0),
-                output_field=IntegerField(),
-            )
-        ).order_by("is_other", "name")
+        self.categories = get_taxonomy(Category)
+        self.genres = get_taxonomy(Genre)
 
-        # Placeholder
-        self.fields["category"].choices = [("", "Category")] + list(self.fields["category"].choices)
-        self.fields["genre"].choices = [("", "Genre")] + list(self.fields["genre"].choices)
+        # Placeholder ("Others" is already ordered last)
+        self.fields["category"].choices = [("", "Category")] + self.categories.choices
+        self.fields["genre"].choices = [("", "Genre")] + self.genres.choices
 
         # Condition placeholder
         self.fields["condition"].choices = [("", "Condition")] + list(
@@ -92,6 +102,11 @@ class BookForm(forms.ModelForm):
     # Validation
     # =====================
 
+    def _get_validation_exclusions(self):
+        # category/genre are already checked against the taxonomy cache;
+        # the model's FK validation would query for them again
+        return super()._get_validation_exclusions() | {"category", "genre"}
+
     def clean(self):
         cleaned = super().clean()
         category = cleaned.get("category")
@@ -116,9 +131,9 @@ class BookForm(forms.ModelForm):
                 self.add_error("custom_category", "Please enter a custom category")
             else:
                 # Normalize (Trim space and capitalize like 'Fiction')
-                normalized_cat = custom_cat.strip().title()
+                normalized_cat = display_name(custom_cat)
                 # Check if this already exists in the database
-                if Category.objects.filter(name__iexact=normalized_cat).exclude(name="Others").exists():
+                if self.categories.lookup(normalized_cat):
                     self.add_error("custom_category", f"'{normalized_cat}' already exists in the list. Please select it from the dropdown.")
 
         # Logic for "Others" Genre & Uniqueness Check
@@ -127,9 +142,33 @@ class BookForm(forms.ModelForm):
                 self.add_error("custom_genre", "Please enter a custom genre")
             else:
                 # Normalize
-                normalized_gen = custom_gen.strip().title()
+                normalized_gen = display_name(custom_gen)
                 # Check existence
-                if Genre.objects.filter(name__iexact=normalized_gen).exclude(name="Others").exists():
+                if self.genres.lookup(normalized_gen):
                     self.add_error("custom_genre", f"'{normalized_gen}' already exists. Please select it from the dropdown.")
 
-        return cleaned
\ No newline at end of file
+        return cleaned
+
+class BookImportForm(forms.ModelForm):
+    """Row validation for ``import_books``.
+
+    Same field rules as BookForm, but category/genre come in by name and
+    are resolved in batches by the command, so validating a row runs no
+    queries.
+    """
+
+    category = forms.CharField(max_length=100)
+    genre = forms.CharField(max_length=100)
+
+    class Meta:
+        model = Book
+        fields = [
+            "title", "author", "description", "isbn",
+            "language", "condition", "location", "price"
+        ]
+
+    def clean_category(self):
+        return display_name(self.cleaned_data["category"])
+
+    def clean_genre(self):
+        return display_name(self.cleaned_data["genre"])
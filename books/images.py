@@ -0,0 +1,160 @@
+import io
+import logging
+import posixpath
+from concurrent.futures import ThreadPoolExecutor
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from PIL import Image, ImageOps
+from . import pagecache
+
+logger = logging.getLogger(__name__)
+
+# Fixed thumbnail boxes (width, height) per upload folder.
+# Book covers are 2:3, avatars are square; the second size is the 2x variant.
+VARIANT_SIZES = {
+    "book_covers": [(200, 300), (400, 600)],
+    "profiles": [(64, 64), (128, 128)],
+}
+
+VARIANT_FORMATS = {
+    "webp": ("WEBP", {"quality": 80, "method": 4}),
+    "jpg": ("JPEG", {"quality": 82, "optimize": True, "progressive": True}),
+}
+
+_executor = None
+
+# Names whose thumbnails are known to be written, so srcset renders and
+# Book/Profile saves skip the stat. Thumbnails only go away together with
+# their blob (storage.release), which forgets the name here (another
+# worker may answer "ready" for a deleted blob uploaded again until its
+# thumbnails are rewritten moments later); cleared past READY_MEMO_SIZE.
+READY_MEMO_SIZE = 50000
+_ready = set()
+
+
+def variant_sizes(name):
+    folder = name.split("/", 1)[0]
+    return VARIANT_SIZES.get(folder, [])
+
+
+def variant_name(name, width, ext):
+    folder, filename = posixpath.split(name)
+    stem = posixpath.splitext(filename)[0]
+    return posixpath.join(folder, "thumbs", f"{stem}_{width}.{ext}")
+
+
+def variants_ready(name, storage=None):
+    sizes = variant_sizes(name)
+    if not sizes:
+        return True
+    memo = storage is None or storage is default_storage
+    if memo and name in _ready:
+        return True
+    storage = storage or default_storage
+    # the largest jpg is written last, so it marks a finished run
+    ready = storage.exists(variant_name(name, sizes[-1][0], "jpg"))
+    if ready and memo:
+        if len(_ready) >= READY_MEMO_SIZE:
+            _ready.clear()
+        _ready.add(name)
+    return ready
+
+
+def forget_variants(name):
+    _ready.discard(name)
+
+
+def _encode(img, fmt, options):
+    if fmt == "JPEG" and img.mode != "RGB":
+        img = img.convert("RGB")
+    buf = io.BytesIO()
+    img.save(buf, fmt, **options)
+    return buf.getvalue()
+
+
+def _replace(storage, name, data):
+    if storage.exists(name):
+        storage.delete(name)
+    storage.save(name, ContentFile(data))
+
+
+def _replace_original(storage, name, data):
+    if not getattr(storage, "content_addressed", False):
+        _replace(storage, name, data)
+        return name
+    # blobs may be shared, so the stripped copy gets its own hash and rows move to it
+    from .storage import repoint
+
+    new_name = storage.save(name, ContentFile(data))
+    if new_name != name:
+        repoint(name, new_name, storage)
+    return new_name
+
+
+def process_image(name, storage=None, force=False):
+    """Auto-orient, strip EXIF and write WebP/JPEG thumbnails for ``name``."""
+    storage = storage or default_storage
+    sizes = variant_sizes(name)
+    if not sizes or (not force and variants_ready(name, storage)):
+        return False
+
+    with storage.open(name, "rb") as f:
+        img = Image.open(f)
+        img.load()
+
+    original_format = img.format
+    has_exif = bool(img.getexif())
+    img = ImageOps.exif_transpose(img)
+    if img.mode not in ("RGB", "RGBA"):
+        img = img.convert("RGBA" if "transparency" in img.info else "RGB")
+
+    # rewrite the original only when it actually carries EXIF
+    if has_exif and original_format:
+        options = {"quality": 90} if original_format == "JPEG" else {}
+        name = _replace_original(storage, name, _encode(img, original_format, options))
+
+    for width, height in sizes:
+        thumb = ImageOps.fit(img, (width, height), Image.Resampling.LANCZOS)
+        for ext in ("webp", "jpg"):
+            fmt, options = VARIANT_FORMATS[ext]
+            _replace(storage, variant_name(name, width, ext), _encode(thumb, fmt, options))
+
+    if name.startswith("book_covers/"):
+        # cached cards and public book pages embed the cover URL: refresh them
+        Book = apps.get_model("books", "Book")
+        books = Book.objects.filter(cover_image=name)
+        books.update(updated_at=timezone.now())
+        pagecache.invalidate(*(f"book:{slug}" for slug in books.values_list("slug", flat=True)))
+
+    return True
+
+
+def _process_safely(name):
+    try:
+        process_image(name)
+    except Exception:
+        logger.exception("Image processing failed for %s", name)
+    finally:
+        close_old_connections()
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=getattr(settings, "IMAGE_PROCESSING_WORKERS", 2),
+            thread_name_prefix="images",
+        )
+    return _executor
+
+
+def schedule(name):
+    """Process ``name`` in the worker pool once the upload is committed."""
+    if not name or not variant_sizes(name):
+        return
+    transaction.on_commit(lambda: get_executor().submit(_process_safely, name))
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+from books.models import ExchangeRequest
+from books.points import exchange_entries
+from users.ledger import post_many
+
+
+class Command(BaseCommand):
+    help = "Award completion points for historical exchanges (safe to re-run)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+
+        batch_size = options["batch_size"]
+        completed = (
+            ExchangeRequest.objects.filter(status="completed")
+            .only("id", "status", "owner_id", "requester_id", "book_id")
+            .order_by("id")
+        )
+
+        entries, applied, exchanges = [], 0, 0
+        for r in completed.iterator(chunk_size=batch_size):
+            exchanges += 1
+            entries.extend(exchange_entries(r, "approved"))
+            if len(entries) >= batch_size:
+                applied += post_many(entries, batch_size)
+                entries = []
+
+        if entries:
+            applied += post_many(entries, batch_size)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{exchanges} completed exchanges, {applied} ledger entries added"
+        ))
@@ -0,0 +1,168 @@
+import io
+import json
+import statistics
+import time
+from datetime import timedelta
+from pathlib import Path
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+from books.forms import BookForm
+from books.models import Book, Category, ExchangeRequest, Genre
+from books.utils import unique_slug
+from books.views import explore_queryset
+from .seed_benchmark_data import PREFIX, TIERS
+
+# Per-function timings of the ORM hot paths on an in-memory SQLite copy of
+# the seed_benchmark_data fixture. Each run is compared against the
+# committed baseline: a benchmark fails when its median time grows past
+# --tolerance or it runs more queries than --query-tolerance allows.
+# Times below NOISE_MS apart are never a regression (timer jitter).
+BASELINE = Path(__file__).resolve().parents[2] / "bench_baseline.json"
+NOISE_MS = 0.05
+
+
+class Command(BaseCommand):
+    help = "Time the ORM hot paths on an in-memory database and compare them with the committed baseline."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--tier", choices=TIERS, default="1k", help="seed_benchmark_data tier for the fixture")
+        parser.add_argument("--iterations", type=int, default=50)
+        parser.add_argument("--baseline", default=str(BASELINE))
+        parser.add_argument("--tolerance", type=float, default=0.5,
+                            help="allowed slowdown as a fraction of the baseline time")
+        parser.add_argument("--query-tolerance", type=int, default=0,
+                            help="allowed extra queries per call")
+        parser.add_argument("--update-baseline", action="store_true",
+                            help="Write this run's results as the new baseline.")
+
+    def handle(self, *args, **options):
+        # the test runner's database: in memory for SQLite
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            call_command("seed_benchmark_data", tier=options["tier"], stdout=io.StringIO())
+            results = self.run(options["iterations"])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        if options["update_baseline"]:
+            with open(options["baseline"], "w") as f:
+                json.dump({"tier": options["tier"], "results": results}, f, indent=2, sort_keys=True)
+                f.write("\n")
+            self.stdout.write(f"Wrote {options['baseline']}")
+            return
+        self.compare(results, options)
+
+    def scenarios(self):
+        """(name, setup) pairs; setup() prepares one call and returns it."""
+        viewer = User.objects.filter(username__startswith=PREFIX).order_by("pk").first()
+        category = Category.objects.order_by("pk").values_list("pk", flat=True).first()
+        pending = ExchangeRequest.objects.filter(status="pending").order_by("pk")
+        approved = ExchangeRequest.objects.filter(status="approved").order_by("pk")
+        book = Book.objects.exclude(owner=viewer).order_by("pk").first()
+        form_data = {
+            "title": "The Silent River", "author": "Anita Rao", "description": "A story.",
+            "isbn": "9780000000000", "category": category,
+            "genre": Genre.objects.order_by("pk").values_list("pk", flat=True).first(),
+            "language": "English", "condition": "good", "location": "Pune", "price": "120",
+        }
+
+        def explore_build(**filters):
+            return lambda: lambda: explore_queryset(viewer, **filters).query.sql_with_params()
+
+        def explore_evaluate(**filters):
+            return lambda: lambda: list(explore_queryset(viewer, **filters))
+
+        def save_as(queryset, status):
+            def setup():
+                r = queryset.first()
+                r.status = status
+                if status == "completed":
+                    r.owner_confirmed = r.requester_confirmed = True
+                return r.save
+            return setup
+
+        def save_new():
+            r = ExchangeRequest(requester=viewer, owner_id=book.owner_id, book=book)
+            return r.save
+
+        def expire_requests():
+            # 20 more past their deadline, on top of the seeded approved
+            # requests whose 48 hours already ran out
+            ids = list(pending.values_list("pk", flat=True)[:20])
+            ExchangeRequest.objects.filter(pk__in=ids).update(
+                expires_at=timezone.now() - timedelta(hours=1)
+            )
+            return lambda: call_command("expire_requests")
+
+        return [
+            ("explore.build", explore_build()),
+            ("explore.build_filtered", explore_build(category=category, location="Pune", query="Lost")),
+            ("explore.evaluate", explore_evaluate()),
+            ("explore.evaluate_search", explore_evaluate(query="Lost")),
+            ("exchange.save_new", save_new),
+            ("exchange.save_approved", save_as(pending, "approved")),
+            ("exchange.save_rejected", save_as(pending, "rejected")),
+            ("exchange.save_cancelled", save_as(pending, "cancelled")),
+            ("exchange.save_expired", save_as(pending, "expired")),
+            ("exchange.save_completed", save_as(approved, "completed")),
+            ("upload.unique_slug", lambda: lambda: unique_slug("The Lost House")),
+            ("bookform.init_clean", lambda: lambda: BookForm(form_data).is_valid()),
+            ("expire_requests", expire_requests),
+        ]
+
+    def run(self, iterations):
+        queries = 0
+
+        def count(execute, sql, params, many, context):
+            nonlocal queries
+            queries += 1
+            return execute(sql, params, many, context)
+
+        results = {}
+        self.stdout.write(f"{'benchmark':28} {'median ms':>10} {'queries':>8}")
+        for name, setup in self.scenarios():
+            times = []
+            for n in range(iterations + 3):
+                # every call starts from the fixture as seeded
+                with transaction.atomic():
+                    call = setup()
+                    queries = 0
+                    with connection.execute_wrapper(count):
+                        start = time.perf_counter()
+                        call()
+                        elapsed = time.perf_counter() - start
+                    transaction.set_rollback(True)
+                # the first calls warm caches and compiled regexes
+                if n >= 3:
+                    times.append(elapsed)
+            results[name] = {"ms": round(statistics.median(times) * 1000, 4), "queries": queries}
+            self.stdout.write(f"{name:28} {results[name]['ms']:10.3f} {queries:8}")
+        return results
+
+    def compare(self, results, options):
+        try:
+            with open(options["baseline"]) as f:
+                baseline = json.load(f)
+        except FileNotFoundError:
+            raise CommandError(f"No baseline at {options['baseline']}; run with --update-baseline.")
+        if baseline["tier"] != options["tier"]:
+            raise CommandError(f"The baseline was measured on tier {baseline['tier']}, not {options['tier']}.")
+
+        regressions = []
+        for name, result in results.items():
+            base = baseline["results"].get(name)
+            if base is None:
+                continue
+            if result["queries"] > base["queries"] + options["query_tolerance"]:
+                regressions.append(f"{name}: {base['queries']} -> {result['queries']} queries")
+            limit = base["ms"] * (1 + options["tolerance"])
+            if result["ms"] > limit and result["ms"] - base["ms"] > NOISE_MS:
+                regressions.append(f"{name}: {base['ms']:.3f} -> {result['ms']:.3f} ms")
+
+        if regressions:
+            raise CommandError("Regressed against the baseline:\n  " + "\n  ".join(regressions))
+        self.stdout.write(self.style.SUCCESS("No regressions against the baseline."))
@@ -0,0 +1,221 @@
+import asyncio
+import io
+import os
+import resource
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+from multiprocessing import get_context
+
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+# The stacks are driven in-process, without a real server or sockets:
+# "wsgi" pushes environs through WSGIHandler from a fixed thread pool (a
+# threaded WSGI server); "asgi" awaits Django's ASGIHandler from one event
+# loop with a coroutine per client. Both serve the same async polling
+# views behind the full middleware stack. Each mode runs in its own
+# process so its peak RSS is its own.
+HOST = "testserver"
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))] * 1000
+
+
+def _paths(exchange_ids, requests):
+    # what an open book page does: the notification poll plus its badge
+    for n in range(requests):
+        if n % 2:
+            yield f"/books/exchange-status/{exchange_ids[n % len(exchange_ids)]}/"
+        else:
+            yield "/books/check/"
+
+
+def _run_wsgi(cookie, exchange_ids, clients, requests, threads):
+    from django.core.handlers.wsgi import WSGIHandler
+    app = WSGIHandler()
+    latencies = []
+
+    def client(n):
+        for path in _paths(exchange_ids, requests):
+            environ = {
+                "REQUEST_METHOD": "GET", "PATH_INFO": path, "QUERY_STRING": "",
+                "SERVER_NAME": HOST, "SERVER_PORT": "80", "SERVER_PROTOCOL": "HTTP/1.1",
+                "REMOTE_ADDR": f"10.0.{n // 250}.{n % 250}", "HTTP_HOST": HOST,
+                "HTTP_COOKIE": cookie, "wsgi.input": io.BytesIO(), "wsgi.url_scheme": "http",
+                "wsgi.errors": io.StringIO(),
+            }
+            start = time.perf_counter()
+            response = app(environ, lambda status, headers: None)
+            b"".join(response)
+            response.close()
+            latencies.append(time.perf_counter() - start)
+
+    with ThreadPoolExecutor(threads) as pool:
+        list(pool.map(client, range(clients)))
+    return latencies
+
+
+def _run_asgi(cookie, exchange_ids, clients, requests, threads):
+    from django.core.handlers.asgi import ASGIHandler
+    app = ASGIHandler()
+    latencies = []
+
+    async def call(path, n):
+        scope = {
+            "type": "http", "method": "GET", "path": path, "query_string": b"",
+            "headers": [(b"host", HOST.encode()), (b"cookie", cookie.encode())],
+            "client": (f"10.0.{n // 250}.{n % 250}", 1234), "server": (HOST, 80),
+            "scheme": "http", "http_version": "1.1", "root_path": "",
+        }
+        done = asyncio.Event()
+        received = False
+
+        async def receive():
+            nonlocal received
+            if not received:
+                received = True
+                return {"type": "http.request", "body": b"", "more_body": False}
+            await done.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            if message["type"] == "http.response.body" and not message.get("more_body"):
+                done.set()
+
+        await app(scope, receive, send)
+
+    async def client(n):
+        for path in _paths(exchange_ids, requests):
+            start = time.perf_counter()
+            await call(path, n)
+            latencies.append(time.perf_counter() - start)
+
+    async def main():
+        await asyncio.gather(*(client(n) for n in range(clients)))
+
+    asyncio.run(main())
+    return latencies
+
+
+def _mode(args):
+    mode, cookie, exchange_ids, clients, requests, threads = args
+    run = {
+        "wsgi": _run_wsgi,
+        "asgi": _run_asgi,
+    }[mode]
+    # warm up: imports, URL resolver, cached session and user
+    run(cookie, exchange_ids, 1, 4, 1)
+    base_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    peak_threads = [threading.active_count()]
+    stop = threading.Event()
+
+    def watch():
+        while not stop.wait(0.01):
+            peak_threads[0] = max(peak_threads[0], threading.active_count())
+
+    watcher = threading.Thread(target=watch, daemon=True)
+    watcher.start()
+    start = time.perf_counter()
+    latencies = run(cookie, exchange_ids, clients, requests, threads)
+    elapsed = time.perf_counter() - start
+    stop.set()
+    watcher.join()
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    connections.close_all()
+    return {
+        "rps": len(latencies) / elapsed,
+        "p50": percentile(latencies, 50),
+        "p99": percentile(latencies, 99),
+        "rss_mb": peak_rss / 1024,
+        "rss_growth_mb": (peak_rss - base_rss) / 1024,
+        "threads": peak_threads[0] - 1,
+    }
+
+
+class Command(BaseCommand):
+    help = "Load-test the async polling endpoints under WSGI with a thread pool and under ASGI (on a scratch copy of the database)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--clients", type=int, default=200)
+        parser.add_argument("--requests", type=int, default=20, help="sequential polls per client")
+        parser.add_argument("--threads", type=int, default=32, help="WSGI server threads")
+        parser.add_argument("--modes", default="wsgi,asgi")
+
+    def handle(self, *args, **options):
+        # production-like request handling; limits off, this measures serving
+        settings.DEBUG = False
+        settings.ALLOWED_HOSTS = [HOST]
+        settings.RATE_LIMITS = {rule: {} for rule in settings.RATE_LIMITS}
+
+        source = str(settings.DATABASES["default"]["NAME"])
+        tmp = tempfile.mkdtemp(prefix="bench-polling-")
+        try:
+            path = os.path.join(tmp, "db.sqlite3")
+            connections.close_all()
+            with closing(sqlite3.connect(source)) as src, closing(sqlite3.connect(path)) as dst:
+                src.backup(dst)
+            connections["default"].settings_dict["NAME"] = path
+            # sessions and users cached under the scratch pks stay out of the real cache
+            settings.CACHES["default"]["LOCATION"] = os.path.join(tmp, "cache")
+            call_command("migrate", verbosity=0)
+            cookie, exchange_ids = self.seed()
+            connections.close_all()
+
+            self.stdout.write(
+                f"{options['clients']} concurrent clients x {options['requests']} polls, "
+                f"WSGI pool of {options['threads']} threads\n"
+            )
+            self.stdout.write(
+                f"{'mode':10} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} "
+                f"{'peak RSS MB':>12} {'RSS growth MB':>14} {'threads':>8}"
+            )
+            ctx = get_context("fork")
+            for mode in options["modes"].split(","):
+                job = (mode, cookie, exchange_ids, options["clients"], options["requests"], options["threads"])
+                with ctx.Pool(1) as pool:
+                    result = pool.apply(_mode, (job,))
+                self.stdout.write(
+                    f"{mode:10} {result['rps']:8.0f} {result['p50']:8.1f} {result['p99']:8.1f} "
+                    f"{result['rss_mb']:12.1f} {result['rss_growth_mb']:14.1f} {result['threads']:8}"
+                )
+        finally:
+            connections.close_all()
+            shutil.rmtree(tmp, ignore_errors=True)
+
+    def seed(self):
+        from books.models import Book, Category, ExchangeRequest, Genre, Inventory
+        from importlib import import_module
+
+        owner = User.objects.create_user("bench-poll-owner", password="bench")
+        requester = User.objects.create_user("bench-poll-requester", password="bench")
+        category = Category.objects.create(name="Bench")
+        genre = Genre.objects.create(name="Bench")
+        exchange_ids = []
+        for n in range(20):
+            book = Book.objects.create(
+                title=f"Bench poll {n}", author="Bench", slug=f"bench-poll-{n}", owner=owner,
+                price=10, location="Pune", language="English", condition="good",
+                category=category, genre=genre,
+            )
+            Inventory.objects.create(book=book, status="available", location=book.location)
+            exchange_ids.append(
+                ExchangeRequest.objects.create(requester=requester, owner=owner, book=book).pk
+            )
+
+        session = import_module(settings.SESSION_ENGINE).SessionStore()
+        session[SESSION_KEY] = str(owner.pk)
+        session[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+        session[HASH_SESSION_KEY] = owner.get_session_auth_hash()
+        session.create()
+        return f"{settings.SESSION_COOKIE_NAME}={session.session_key}", exchange_ids
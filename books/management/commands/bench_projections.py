@@ -0,0 +1,140 @@
+import time
+import tracemalloc
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Prefetch, Q
+from django.template.loader import get_template
+from django.test import override_settings
+from books import cards
+from books.models import Book, Category, ExchangeRequest, Genre, Inventory
+from .bench_streaming import NO_CARD_CACHE
+
+
+def _pages(owner, viewer):
+    """(page, template, name, per row, full-row queryset, card queryset).
+
+    Per-row templates get one object as ``name``; the others get the
+    whole queryset.
+    """
+    explore = Book.objects.exclude(owner=viewer).exclude(
+        Q(exchange_requests__status__in=["approved", "completed"]) |
+        Q(expected_for__status__in=["approved", "completed"])
+    )
+    mine = Book.objects.filter(owner=owner).order_by("-created_at")
+    received = ExchangeRequest.objects.filter(owner=owner).order_by("-created_at")
+    sent = ExchangeRequest.objects.filter(requester=viewer).order_by("-created_at")
+    exchanged = ExchangeRequest.objects.filter(status="completed").filter(
+        Q(requester=owner) | Q(owner=owner)
+    ).order_by("-created_at")
+    return [
+        ("explore_books", "books/rows/explore_book.html", "book", True,
+         explore.select_related("category", "genre", "inventory"),
+         cards.book_cards(explore)),
+        ("my_uploaded_books", "books/my_uploaded_books.html", "books", False,
+         mine.select_related("inventory"),
+         cards.book_cards(mine)),
+        ("notifications", "books/rows/notification.html", "r", True,
+         received.select_related("book", "expected_book", "requester__profile")
+         .prefetch_related("requester__books"),
+         cards.exchange_cards(received).prefetch_related(
+             Prefetch("requester__books", queryset=cards.book_cards(Book.objects.all()))
+         )),
+        ("view_requested_books", "books/rows/requested.html", "r", True,
+         sent.select_related("book", "expected_book", "owner"),
+         cards.exchange_cards(sent)),
+        ("view_exchanged_books", "books/rows/exchanged.html", "r", True,
+         exchanged.select_related("book"),
+         cards.exchange_cards(exchanged)),
+    ]
+
+
+class Command(BaseCommand):
+    help = "Compare memory/time of loading list pages with full rows vs card projections (runs in a rolled-back transaction)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=10000)
+        parser.add_argument("--description-bytes", type=int, default=1500)
+
+    def handle(self, *args, **options):
+        with transaction.atomic(), override_settings(CACHES=NO_CARD_CACHE):
+            self.run(options["rows"], options["description_bytes"])
+            transaction.set_rollback(True)
+
+    def run(self, rows, description_bytes):
+        owner = User.objects.create(username="bench-cards-owner", email="owner@example.com")
+        viewer = User.objects.create(username="bench-cards-viewer", email="viewer@example.com")
+        category = Category.objects.create(name="Bench")
+        genre = Genre.objects.create(name="Bench")
+        books = Book.objects.bulk_create(
+            Book(
+                title=f"Bench book {n}", author="Bench", slug=f"bench-cards-{n}",
+                owner=owner if n < rows else viewer, price=10, location="Pune",
+                language="English", condition="good", category=category, genre=genre,
+                description="x" * description_bytes, isbn="9780000000000",
+                cover_image="book_covers/bench.jpg",
+            )
+            # a few books of the requester's own to offer back
+            for n in range(rows + 10)
+        )
+        Inventory.objects.bulk_create(
+            Inventory(book=book, status="available", location=book.location) for book in books
+        )
+        offered = books[rows:]
+        ExchangeRequest.objects.bulk_create(
+            ExchangeRequest(
+                requester=viewer, owner=owner, book=book,
+                expected_book=offered[n % len(offered)] if n % 3 == 0 else None,
+                status="completed" if n % 2 else "pending",
+            )
+            for n, book in enumerate(books[:rows])
+        )
+
+        self.stdout.write(f"{rows} rows, {description_bytes}-byte descriptions\n")
+        self.stdout.write(
+            f"{'page':22} {'rows':6} {'load ms':>8} {'peak MB':>8} {'render ms':>10} {'queries':>8}"
+        )
+        for page, template, name, per_row, *querysets in _pages(owner, viewer):
+            user = viewer if page == "explore_books" else owner
+            for label, queryset in zip(("full", "cards"), querysets):
+                load_time, peak = self.load(queryset)
+                render_time, queries = self.render(queryset, template, name, per_row, user)
+                self.stdout.write(
+                    f"{page:22} {label:6} {load_time * 1000:8.0f} {peak / 2**20:8.1f} "
+                    f"{render_time * 1000:10.0f} {queries:8}"
+                )
+
+    def load(self, queryset):
+        # timed untraced (tracemalloc slows allocation-heavy code unevenly)
+        elapsed = float("inf")
+        for _ in range(3):
+            start = time.perf_counter()
+            list(queryset.all())
+            elapsed = min(elapsed, time.perf_counter() - start)
+        tracemalloc.start()
+        list(queryset.all())
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return elapsed, peak
+
+    def render(self, queryset, template_name, name, per_row, user):
+        """Time to load and render every row, and the queries it took."""
+        template = get_template(template_name)
+        context = {"user": user, "csrf_token": "bench"}
+        queries = 0
+
+        def count(execute, sql, params, many, context):
+            nonlocal queries
+            queries += 1
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(count):
+            start = time.perf_counter()
+            if per_row:
+                for obj in queryset.all():
+                    template.render({**context, name: obj})
+            else:
+                template.render({**context, name: queryset.all()})
+            elapsed = time.perf_counter() - start
+        return elapsed, queries
@@ -0,0 +1,85 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.forms.models import model_to_dict
+from django.test.utils import CaptureQueriesContext
+from books.forms import BookForm
+from books.models import Book, Category, ExchangeRequest, Genre, Inventory
+
+
+class Command(BaseCommand):
+    help = "Compare queries/time of tracked saves against full-row saves (runs in a rolled-back transaction)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=200)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            self.run(options["iterations"])
+            transaction.set_rollback(True)
+
+    def run(self, iterations):
+        owner = User.objects.create(username="bench-owner")
+        requester = User.objects.create(username="bench-requester")
+        category = Category.objects.create(name="Bench")
+        genre = Genre.objects.create(name="Bench")
+        book = Book.objects.create(
+            title="Bench", author="Bench", slug="bench-saves", owner=owner, price=10,
+            location="Pune", language="English", condition="good",
+            category=category, genre=genre,
+        )
+        Inventory.objects.create(book=book, status="available", location=book.location)
+        exchange = ExchangeRequest.objects.create(requester=requester, owner=owner, book=book)
+
+        def edit_unchanged(tracked):
+            b = Book.objects.get(pk=book.pk)
+            data = model_to_dict(b, exclude=["cover_image"])
+            form = BookForm(data, instance=b)
+            form.is_valid()
+            return lambda: self.save(form.instance, tracked, form.save)
+
+        def edit_location(tracked):
+            b = Book.objects.get(pk=book.pk)
+            b.location = "Mumbai" if b.location == "Pune" else "Pune"
+            return lambda: self.save(b, tracked, b.save)
+
+        def exchange_status(tracked):
+            r = ExchangeRequest.objects.get(pk=exchange.pk)
+            r.status = "pending" if r.status == "rejected" else "rejected"
+            return lambda: self.save(r, tracked, r.save)
+
+        def exchange_confirm(tracked):
+            r = ExchangeRequest.objects.get(pk=exchange.pk)
+            r.owner_confirmed = not r.owner_confirmed
+            return lambda: self.save(r, tracked, r.save)
+
+        scenarios = [
+            ("edit_book, nothing changed", edit_unchanged),
+            ("edit_book, location changed", edit_location),
+            ("ExchangeRequest status change", exchange_status),
+            ("ExchangeRequest confirm flag", exchange_confirm),
+        ]
+
+        self.stdout.write(f"{'scenario':34} {'full q':>7} {'tracked q':>10} {'full ms':>9} {'tracked ms':>11}")
+        for label, setup in scenarios:
+            row = []
+            for tracked in (False, True):
+                queries, elapsed = 0, 0.0
+                for _ in range(iterations):
+                    run = setup(tracked)
+                    with CaptureQueriesContext(connection) as ctx:
+                        start = time.perf_counter()
+                        run()
+                        elapsed += time.perf_counter() - start
+                    queries += len(ctx.captured_queries)
+                row.append((queries / iterations, elapsed / iterations * 1000))
+            (fq, fms), (tq, tms) = row
+            self.stdout.write(f"{label:34} {fq:7.1f} {tq:10.1f} {fms:9.3f} {tms:11.3f}")
+
+    def save(self, instance, tracked, save):
+        if not tracked:
+            # forget the loaded values: every column is written and validated
+            instance._loaded_values = None
+        save()
@@ -0,0 +1,104 @@
+import os
+import random
+import shutil
+import sqlite3
+import tempfile
+import time
+from contextlib import closing
+from multiprocessing import Pool
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+# What each worker does: mostly explore-style reads, some inventory writes
+# the way confirm/accept flows touch the table.
+READ_SQL = """
+    SELECT b.id, b.title, b.author, b.slug, i.status
+    FROM books_book b JOIN books_inventory i ON i.book_id = b.id
+    WHERE i.status = 'available'
+    ORDER BY b.created_at DESC LIMIT 50
+"""
+WRITE_SQL = "UPDATE books_inventory SET updated_at = ? WHERE id = ?"
+
+# "before": what the bare DATABASES entry gave us (rollback journal, FULL
+# sync, deferred BEGIN). "after": settings.SQLITE_PRAGMAS + BEGIN IMMEDIATE.
+BARE = {"journal_mode": "DELETE", "synchronous": "FULL"}
+
+
+def _worker(args):
+    path, pragmas, begin, seconds, write_ratio, seed = args
+    rng = random.Random(seed)
+    conn = sqlite3.connect(path, timeout=5, isolation_level=None)
+    for name, value in pragmas.items():
+        conn.execute(f"PRAGMA {name} = {value}")
+    ids = [row[0] for row in conn.execute("SELECT id FROM books_inventory")] or [0]
+
+    reads = writes = locked = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        try:
+            if rng.random() < write_ratio:
+                conn.execute(begin)
+                conn.execute(WRITE_SQL, (time.time(), rng.choice(ids)))
+                conn.execute("COMMIT")
+                writes += 1
+            else:
+                conn.execute("BEGIN")
+                conn.execute(READ_SQL).fetchall()
+                conn.execute("COMMIT")
+                reads += 1
+        except sqlite3.OperationalError:
+            locked += 1
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+    conn.close()
+    return reads, writes, locked
+
+
+class Command(BaseCommand):
+    help = "Measure SQLite read/write throughput with N concurrent workers, bare config vs the production PRAGMAs."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=8)
+        parser.add_argument("--seconds", type=float, default=5)
+        parser.add_argument("--write-ratio", type=float, default=0.2)
+
+    def handle(self, *args, **options):
+        source = str(settings.DATABASES["default"]["NAME"])
+        tuned = dict(getattr(settings, "SQLITE_PRAGMAS", {}))
+        profiles = [
+            ("bare", BARE, "BEGIN"),
+            ("production", tuned, "BEGIN IMMEDIATE"),
+        ]
+
+        # workers are forked; don't hand them our open DB connection
+        connections.close_all()
+
+        tmp = tempfile.mkdtemp(prefix="bench-sqlite-")
+        try:
+            self.stdout.write(
+                f"{options['workers']} workers, {options['seconds']}s, "
+                f"{options['write_ratio']:.0%} writes\n"
+            )
+            self.stdout.write(f"{'profile':12} {'reads/s':>9} {'writes/s':>9} {'locked':>7}")
+            for label, pragmas, begin in profiles:
+                path = os.path.join(tmp, f"{label}.sqlite3")
+                # backup() copies committed WAL content too
+                with closing(sqlite3.connect(source)) as src, closing(sqlite3.connect(path)) as dst:
+                    src.backup(dst)
+
+                jobs = [
+                    (path, pragmas, begin, options["seconds"], options["write_ratio"], n)
+                    for n in range(options["workers"])
+                ]
+                with Pool(options["workers"]) as pool:
+                    results = pool.map(_worker, jobs)
+
+                reads, writes, locked = (sum(col) for col in zip(*results))
+                seconds = options["seconds"]
+                self.stdout.write(
+                    f"{label:12} {reads / seconds:9.0f} {writes / seconds:9.0f} {locked:7}"
+                )
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
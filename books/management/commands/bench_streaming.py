@@ -0,0 +1,96 @@
+import time
+import tracemalloc
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import RequestFactory, override_settings
+from django.urls import reverse
+from books import views
+from books.models import Book, Category, ExchangeRequest, Genre, Inventory
+
+PAGES = [
+    ("explore_books", views.explore_books, "viewer"),
+    ("notifications", views.notifications, "owner"),
+    ("view_requested_books", views.view_requested_books, "viewer"),
+    ("view_exchanged_books", views.view_exchanged_books, "owner"),
+]
+
+# the card cache would keep every rendered row alive in both modes and
+# hide what the rendering itself costs
+NO_CARD_CACHE = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+    "cards": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"},
+}
+
+
+class Command(BaseCommand):
+    help = "Compare peak memory and time to first byte of the list pages, render() vs streaming (runs in a rolled-back transaction)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=10000)
+
+    def handle(self, *args, **options):
+        with transaction.atomic(), override_settings(CACHES=NO_CARD_CACHE):
+            self.run(options["rows"])
+            transaction.set_rollback(True)
+
+    def run(self, rows):
+        users = {
+            "owner": User.objects.create(username="bench-stream-owner"),
+            "viewer": User.objects.create(username="bench-stream-viewer"),
+        }
+        category = Category.objects.create(name="Bench")
+        genre = Genre.objects.create(name="Bench")
+        books = Book.objects.bulk_create(
+            Book(
+                title=f"Bench book {n}", author="Bench", slug=f"bench-stream-{n}",
+                owner=users["owner"], price=10, location="Pune", language="English",
+                condition="good", category=category, genre=genre,
+                cover_image="book_covers/bench.jpg",
+            )
+            for n in range(rows)
+        )
+        Inventory.objects.bulk_create(
+            Inventory(book=book, status="available", location=book.location) for book in books
+        )
+        ExchangeRequest.objects.bulk_create(
+            ExchangeRequest(
+                requester=users["viewer"], owner=users["owner"], book=book,
+                status="completed" if n % 2 else "pending",
+            )
+            for n, book in enumerate(books)
+        )
+
+        factory = RequestFactory()
+        self.stdout.write(f"{rows} rows per page\n")
+        self.stdout.write(
+            f"{'page':22} {'mode':7} {'peak MB':>8} {'first byte ms':>14} {'total ms':>9} {'KB':>8}"
+        )
+        for name, view, who in PAGES:
+            for stream in (False, True):
+                request = factory.get(reverse(name))
+                request.user = users[who]
+                with override_settings(STREAM_LIST_PAGES=stream):
+                    peak, first, total, size = self.measure(view, request)
+                mode = "stream" if stream else "render"
+                self.stdout.write(
+                    f"{name:22} {mode:7} {peak / 2**20:8.1f} {first * 1000:14.1f} "
+                    f"{total * 1000:9.1f} {size / 1024:8.0f}"
+                )
+
+    def measure(self, view, request):
+        tracemalloc.start()
+        start = time.perf_counter()
+        response = view(request)
+        first = None
+        size = 0
+        # what the WSGI server does: take each chunk, send it, drop it
+        for chunk in response if response.streaming else [response.content]:
+            if first is None:
+                first = time.perf_counter() - start
+            size += len(chunk)
+        total = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return peak, first, total, size
@@ -0,0 +1,137 @@
+import csv
+import json
+import os
+import time
+from itertools import islice
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from books.forms import BookImportForm
+from books import taxonomy
+from books.models import Book, Category, Genre, Inventory
+from books.utils import unique_slugs
+
+
+def read_rows(path, fmt):
+    with open(path, newline="", encoding="utf-8") as f:
+        if fmt == "csv":
+            for line_no, row in enumerate(csv.DictReader(f), start=2):
+                yield line_no, row
+        else:
+            for line_no, line in enumerate(f, start=1):
+                if line.strip():
+                    yield line_no, json.loads(line)
+
+
+def load_names(model):
+    # taxonomy tables are small: load once, keyed case-insensitively
+    return {taxonomy.name_key(obj.name): obj for obj in model.objects.all()}
+
+
+def resolve_names(model, names, cache):
+    """Create the names missing from ``cache`` in one bulk insert."""
+    missing = {taxonomy.name_key(n): n for n in names if taxonomy.name_key(n) not in cache}
+    if not missing:
+        return
+
+    # a concurrent writer may have added some of them; keep theirs
+    model.objects.bulk_create(
+        [model(name=n) for n in missing.values()], ignore_conflicts=True
+    )
+    # read the table back rather than match the names in SQL, where
+    # LOWER() only folds ASCII
+    cache.update(load_names(model))
+    # bulk_create sends no signals
+    transaction.on_commit(lambda: taxonomy.invalidate(model))
+
+
+class Command(BaseCommand):
+    help = "Bulk import books for one owner from a CSV or JSONL file."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument("--owner", required=True, help="Username that will own the books.")
+        parser.add_argument("--format", choices=["csv", "jsonl"])
+        parser.add_argument("--chunk-size", type=int, default=1000)
+        parser.add_argument("--checkpoint", help="Defaults to <path>.checkpoint")
+        parser.add_argument("--resume", action="store_true",
+                            help="Skip the rows already committed by a previous run.")
+
+    def handle(self, *args, **options):
+
+        path = options["path"]
+        fmt = options["format"] or ("csv" if path.lower().endswith(".csv") else "jsonl")
+        chunk_size = options["chunk_size"]
+        checkpoint_path = options["checkpoint"] or f"{path}.checkpoint"
+
+        try:
+            owner = User.objects.get(username=options["owner"])
+        except User.DoesNotExist:
+            raise CommandError(f"No user named {options['owner']!r}.")
+
+        state = {"rows": 0, "imported": 0, "invalid": 0}
+        if options["resume"] and os.path.exists(checkpoint_path):
+            with open(checkpoint_path) as f:
+                state.update(json.load(f))
+            self.stdout.write(f"Resuming after row {state['rows']}")
+
+        rows = islice(read_rows(path, fmt), state["rows"], None)
+        categories, genres = load_names(Category), load_names(Genre)
+        started = time.monotonic()
+        imported_this_run = 0
+
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                break
+
+            valid = []
+            for line_no, row in chunk:
+                form = BookImportForm(row)
+                if form.is_valid():
+                    valid.append(form)
+                else:
+                    state["invalid"] += 1
+                    self.stderr.write(f"line {line_no}: {form.errors.as_json()}")
+
+            with transaction.atomic():
+                resolve_names(Category, {f.cleaned_data["category"] for f in valid}, categories)
+                resolve_names(Genre, {f.cleaned_data["genre"] for f in valid}, genres)
+
+                books = []
+                slugs = unique_slugs([f.cleaned_data["title"] for f in valid])
+                for form, slug in zip(valid, slugs):
+                    book = form.save(commit=False)
+                    book.owner = owner
+                    book.slug = slug
+                    book.category = categories[taxonomy.name_key(form.cleaned_data["category"])]
+                    book.genre = genres[taxonomy.name_key(form.cleaned_data["genre"])]
+                    books.append(book)
+
+                Book.objects.bulk_create(books, batch_size=500)
+                Inventory.objects.bulk_create(
+                    [Inventory(book=b, status="available", location=b.location) for b in books],
+                    batch_size=500,
+                )
+
+            state["rows"] += len(chunk)
+            state["imported"] += len(books)
+            imported_this_run += len(books)
+
+            # written only after the chunk committed, so a rerun never duplicates rows
+            with open(checkpoint_path, "w") as f:
+                json.dump(state, f)
+
+            # a coarse clock can report no time for a fast first chunk
+            elapsed = max(time.monotonic() - started, 1e-9)
+            self.stdout.write(
+                f"{state['rows']} rows read, {state['imported']} imported "
+                f"({imported_this_run / elapsed:.0f} rows/s)"
+            )
+
+        rate = imported_this_run / max(time.monotonic() - started, 1e-9)
+        self.stdout.write(self.style.SUCCESS(
+            f"Done: {state['imported']} imported, {state['invalid']} invalid, "
+            f"{rate:.0f} rows/s"
+        ))
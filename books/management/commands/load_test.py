@@ -0,0 +1,274 @@
+import random
+import threading
+import time
+from collections import defaultdict
+from http.cookiejar import CookieJar
+from multiprocessing import get_context
+from urllib.error import HTTPError, URLError
+from urllib.parse import urlencode
+from urllib.request import HTTPCookieProcessor, HTTPRedirectHandler, Request, build_opener
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler
+from django.core.wsgi import get_wsgi_application
+from django.db import connections
+from django.urls import reverse
+from books.models import Book, Category, ExchangeRequest, Genre
+from .bench_polling import percentile
+from .seed_benchmark_data import ADJECTIVES, LOCATIONS, NOUNS, PASSWORD, PREFIX
+
+# Replays logged-in traffic against the seed_benchmark_data users over real
+# HTTP. Each virtual user drives two accounts, a requester browsing and
+# polling and the owner of the books it asks for, so the exchange flow
+# (request -> approve -> accept -> confirm x2) runs end to end. Without
+# --url the command serves the project itself from a forked threaded WSGI
+# server with DEBUG and rate limits off (run collectstatic first: pages
+# need the static manifest once DEBUG is off).
+MIX = {
+    "explore": 30,
+    "book_detail": 25,
+    "check": 20,
+    "exchange_status": 10,
+    "flow": 15,
+}
+
+
+class QuietHandler(WSGIRequestHandler):
+
+    def log_message(self, format, *args):
+        pass
+
+
+class NoRedirect(HTTPRedirectHandler):
+
+    # a redirect is the answer being measured, not a second request
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+
+def _serve(server):
+    settings.DEBUG = False
+    settings.ALLOWED_HOSTS = [*settings.ALLOWED_HOSTS, "127.0.0.1"]
+    settings.RATE_LIMITS = {rule: {} for rule in settings.RATE_LIMITS}
+    server.set_app(get_wsgi_application())
+    server.serve_forever()
+
+
+class Client:
+    """One logged-in browser: a cookie jar plus the CSRF token to post with."""
+
+    def __init__(self, base, stats):
+        self.base = base
+        self.stats = stats
+        self.jar = CookieJar()
+        self.opener = build_opener(HTTPCookieProcessor(self.jar), NoRedirect)
+
+    def login(self, username):
+        self.fetch("Login", reverse("Login"), record=False)
+        status = self.fetch("Login", reverse("Login"), {
+            "username": username, "password": PASSWORD,
+        }, record=False)
+        if status != 302:
+            raise CommandError(f"Could not log in as {username!r} (HTTP {status}).")
+
+    def csrf_token(self):
+        return next((c.value for c in self.jar if c.name == settings.CSRF_COOKIE_NAME), "")
+
+    def fetch(self, name, path, data=None, record=True):
+        if data is not None:
+            data = urlencode({**data, "csrfmiddlewaretoken": self.csrf_token()}).encode()
+        request = Request(self.base + path, data=data)
+        start = time.perf_counter()
+        try:
+            with self.opener.open(request) as response:
+                response.read()
+                status = response.status
+        except HTTPError as e:
+            e.read()
+            status = e.code
+        except URLError:
+            status = 0
+        if record:
+            self.stats.record(name, time.perf_counter() - start, status)
+        return status
+
+
+class Stats:
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    def record(self, name, elapsed, status):
+        with self.lock:
+            self.latencies[name].append(elapsed)
+            # views answer with a page or a redirect; anything else failed
+            if not 200 <= status < 400:
+                self.errors[name] += 1
+
+
+class VirtualUser:
+
+    def __init__(self, base, stats, rng, requester, owner, dataset):
+        self.rng = rng
+        self.requester, self.owner = requester, owner
+        self.dataset = dataset
+        self.browser = Client(base, stats)
+        self.owner_browser = Client(base, stats)
+        self.browser.login(requester.username)
+        self.owner_browser.login(owner.username)
+        # books the flow may still ask for / offer back
+        self.wanted = list(
+            Book.objects.filter(owner=owner, inventory__status="available")
+            .values_list("slug", flat=True)
+        )
+        self.offered = list(
+            Book.objects.filter(owner=requester, inventory__status="available")
+            .values_list("pk", flat=True)
+        )
+        self.exchanges = list(
+            ExchangeRequest.objects.filter(requester=requester).values_list("pk", flat=True)[:20]
+        )
+
+    def run(self, deadline):
+        actions = list(MIX)
+        weights = list(MIX.values())
+        while time.monotonic() < deadline:
+            action = self.rng.choices(actions, weights)[0]
+            getattr(self, action)()
+
+    def explore(self):
+        params = {}
+        choice = self.rng.randrange(5)
+        if choice == 1:
+            params["category"] = self.rng.choice(self.dataset["categories"])
+        elif choice == 2:
+            params["genre"] = self.rng.choice(self.dataset["genres"])
+        elif choice == 3:
+            params["location"] = self.rng.choice(LOCATIONS)
+        elif choice == 4:
+            params["q"] = self.rng.choice(ADJECTIVES + NOUNS)
+        path = reverse("explore_books")
+        if params:
+            path += "?" + urlencode(params)
+        self.browser.fetch("explore_books", path)
+
+    def book_detail(self):
+        slug = self.rng.choice(self.dataset["slugs"])
+        self.browser.fetch("book_detail", reverse("book_detail", args=[slug]))
+
+    def check(self):
+        self.browser.fetch("check", reverse("check"))
+
+    def exchange_status(self):
+        if not self.exchanges:
+            return self.check()
+        pk = self.rng.choice(self.exchanges)
+        self.browser.fetch("exchange_status", reverse("exchange_status", args=[pk]))
+
+    def flow(self):
+        if not self.wanted or not self.offered:
+            return self.book_detail()
+        slug = self.wanted.pop()
+        if self.browser.fetch("request_exchange", reverse("request_exchange", args=[slug])) != 302:
+            return
+        exchange = (
+            ExchangeRequest.objects.filter(requester=self.requester, book__slug=slug, status="pending")
+            .values_list("pk", flat=True).last()
+        )
+        if exchange is None:
+            return
+        self.exchanges.append(exchange)
+        steps = [
+            (self.owner_browser, "approve_request", {"expected": self.offered.pop()}),
+            (self.browser, "accept_deal", {}),
+            (self.owner_browser, "confirm_exchange", {}),
+            (self.browser, "confirm_exchange", {}),
+        ]
+        for browser, name, data in steps:
+            if browser.fetch(name, reverse(name, args=[exchange]), data) != 302:
+                return
+
+
+class Command(BaseCommand):
+    help = "Replay a mix of logged-in traffic against seed_benchmark_data users and report latency per URL name."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--url", help="Server to load (default: serve this project on a local port).")
+        parser.add_argument("--users", type=int, default=10, help="concurrent virtual users")
+        parser.add_argument("--duration", type=float, default=30, help="seconds")
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        accounts = list(User.objects.filter(username__startswith=PREFIX).order_by("pk")[:options["users"] * 2])
+        if len(accounts) < options["users"] * 2:
+            raise CommandError(
+                f"Need {options['users'] * 2} seeded users; run seed_benchmark_data with a bigger tier."
+            )
+        dataset = {
+            "categories": list(Category.objects.values_list("pk", flat=True)),
+            "genres": list(Genre.objects.values_list("pk", flat=True)),
+            # a fixed sample: the same pages stay hot across runs, like real traffic
+            "slugs": list(
+                Book.objects.filter(owner__username__startswith=PREFIX)
+                .order_by("pk").values_list("slug", flat=True)[:2000]
+            ),
+        }
+
+        server = None
+        base = options["url"]
+        if base is None:
+            ThreadedWSGIServer.daemon_threads = True
+            server = ThreadedWSGIServer(("127.0.0.1", 0), QuietHandler)
+            base = f"http://127.0.0.1:{server.server_address[1]}"
+            # the child must not share this process's database connections
+            connections.close_all()
+            process = get_context("fork").Process(target=_serve, args=(server,), daemon=True)
+            process.start()
+            server.socket.close()
+        base = base.rstrip("/")
+
+        try:
+            stats = Stats()
+            self.stdout.write(f"Logging in {options['users']} virtual users against {base}")
+            users = [
+                VirtualUser(base, stats, random.Random(options["seed"] * 1000 + n),
+                            accounts[2 * n], accounts[2 * n + 1], dataset)
+                for n in range(options["users"])
+            ]
+            deadline = time.monotonic() + options["duration"]
+            start = time.monotonic()
+            threads = [threading.Thread(target=u.run, args=(deadline,)) for u in users]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            elapsed = time.monotonic() - start
+        finally:
+            if server is not None:
+                process.terminate()
+                process.join()
+
+        self.report(stats, elapsed)
+
+    def report(self, stats, elapsed):
+        self.stdout.write(
+            f"\n{'url name':20} {'requests':>9} {'errors':>7} {'req/s':>7} "
+            f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}"
+        )
+        total = []
+        for name, latencies in sorted(stats.latencies.items()):
+            total += latencies
+            self.stdout.write(
+                f"{name:20} {len(latencies):9} {stats.errors[name]:7} {len(latencies) / elapsed:7.1f} "
+                f"{percentile(latencies, 50):8.1f} {percentile(latencies, 95):8.1f} "
+                f"{percentile(latencies, 99):8.1f}"
+            )
+        if total:
+            self.stdout.write(
+                f"{'total':20} {len(total):9} {sum(stats.errors.values()):7} {len(total) / elapsed:7.1f} "
+                f"{percentile(total, 50):8.1f} {percentile(total, 95):8.1f} {percentile(total, 99):8.1f}"
+            )
@@ -0,0 +1,74 @@
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from books.images import variant_name, variant_sizes
+from books.models import MediaBlob
+from books.storage import is_blob_name, media_fields, rebuild_refcounts, unreferenced_files
+
+
+class Command(BaseCommand):
+    help = "Move existing covers/avatars into the content-addressed media store."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--delete-originals", action="store_true",
+                            help="Remove the old files (and their thumbnails) once moved.")
+        parser.add_argument("--delete-unreferenced", action="store_true",
+                            help="Remove blobs no row points at (left by rolled-back saves) "
+                                 "once they are a day old.")
+        parser.add_argument("--dry-run", action="store_true")
+
+    def handle(self, *args, **options):
+
+        storage = default_storage
+        if not getattr(storage, "content_addressed", False):
+            raise CommandError("Default storage is not books.storage.ContentAddressedStorage.")
+
+        moved = missing = 0
+        originals = []
+
+        for model, field_name in media_fields():
+            names = (
+                model.objects.exclude(**{field_name: ""})
+                .exclude(**{f"{field_name}__isnull": True})
+                .values_list(field_name, flat=True)
+                .distinct()
+            )
+
+            for old in names.iterator():
+                if is_blob_name(old):
+                    continue
+                if not storage.exists(old):
+                    missing += 1
+                    self.stderr.write(f"missing: {old}")
+                    continue
+                if options["dry_run"]:
+                    moved += 1
+                    continue
+
+                with storage.open(old, "rb") as f:
+                    new = storage.save(old, File(f, name=old))
+                model.objects.filter(**{field_name: old}).update(**{field_name: new})
+                originals.append(old)
+                moved += 1
+
+        if options["dry_run"]:
+            self.stdout.write(f"{moved} files would be moved, {missing} missing")
+            return
+
+        rebuild_refcounts()
+        unreferenced = list(unreferenced_files(storage))
+
+        deleted = list(originals) if options["delete_originals"] else []
+        if options["delete_unreferenced"]:
+            deleted += unreferenced
+            MediaBlob.objects.filter(name__in=unreferenced, refcount__lte=0).delete()
+        for old in deleted:
+            storage.delete(old)
+            for width, _ in variant_sizes(old):
+                for ext in ("webp", "jpg"):
+                    storage.delete(variant_name(old, width, ext))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{moved} files moved, {missing} missing, "
+            f"{len(unreferenced)} unreferenced blobs"
+        ))
@@ -0,0 +1,56 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from books.images import process_image, variant_sizes
+from books.models import Book
+from users.models import Profile
+
+
+def _run(name, force):
+    try:
+        return name, process_image(name, force=force), None
+    except Exception as exc:
+        return name, False, str(exc)
+
+
+class Command(BaseCommand):
+    help = "Generate thumbnails and strip EXIF for existing covers and avatars."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=4)
+        parser.add_argument("--force", action="store_true",
+                            help="Re-process images that already have variants.")
+
+    def handle(self, *args, **options):
+
+        names = set(
+            Book.objects.exclude(cover_image="").exclude(cover_image__isnull=True)
+            .values_list("cover_image", flat=True)
+        )
+        names |= set(
+            Profile.objects.exclude(avatar="").exclude(avatar__isnull=True)
+            .values_list("avatar", flat=True)
+        )
+        names = sorted(n for n in names if variant_sizes(n))
+
+        # workers are forked; don't hand them our open DB connection
+        connections.close_all()
+
+        processed = skipped = failed = 0
+
+        with ProcessPoolExecutor(max_workers=options["workers"]) as pool:
+            futures = [pool.submit(_run, n, options["force"]) for n in names]
+            for future in as_completed(futures):
+                name, done, error = future.result()
+                if error:
+                    failed += 1
+                    self.stderr.write(f"{name}: {error}")
+                elif done:
+                    processed += 1
+                else:
+                    skipped += 1
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{processed} processed, {skipped} already done, {failed} failed"
+        ))
@@ -0,0 +1,189 @@
+import random
+import time
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.text import slugify
+from books import taxonomy
+from books.models import Book, Category, ExchangeRequest, Genre, Inventory
+from users.models import Profile, UserPoints
+
+# Synthetic data for load tests (manage.py load_test). Every seeded user is
+# "<prefix><n>" with password PASSWORD, so the driver can log in as any of
+# them; the same --seed always produces the same rows.
+PREFIX = "bench"
+PASSWORD = "bench"
+
+TIERS = {
+    "1k": {"books": 1_000, "users": 100},
+    "100k": {"books": 100_000, "users": 5_000},
+    "1m": {"books": 1_000_000, "users": 50_000},
+}
+
+CATEGORIES = ["Fiction", "Non-fiction", "Science", "History", "Children", "Comics",
+              "Textbooks", "Biography", "Poetry", "Self-help", "Others"]
+GENRES = ["Fantasy", "Mystery", "Romance", "Thriller", "Sci-fi", "Horror",
+          "Adventure", "Drama", "Humour", "Classic", "Others"]
+LOCATIONS = ["Pune", "Mumbai", "Bengaluru", "Delhi", "Chennai", "Hyderabad",
+             "Kolkata", "Ahmedabad", "Jaipur", "Mangaluru", "Udupi", "Mysuru"]
+LANGUAGES = ["English", "English", "English", "Hindi", "Kannada", "Marathi", "Tamil"]
+ADJECTIVES = ["Silent", "Hidden", "Broken", "Golden", "Last", "Distant", "Burning",
+              "Forgotten", "Crimson", "Endless", "Wild", "Quiet", "Secret", "Lost"]
+NOUNS = ["River", "Garden", "Empire", "Letter", "Mountain", "Storm", "House",
+         "Kingdom", "Voyage", "Island", "Library", "Window", "Promise", "Road"]
+FIRST = ["Anita", "Rahul", "Meera", "Arjun", "Kavya", "Vikram", "Sara", "John",
+         "Priya", "Daniel", "Leela", "Omar"]
+LAST = ["Rao", "Sharma", "Iyer", "Shetty", "Khan", "Das", "Smith", "Nair", "Pai", "Gupta"]
+
+# how a book's request history ends (books without requests: NO_REQUESTS)
+NO_REQUESTS = 0.5
+FINAL_STATUS = {"pending": 30, "approved": 10, "completed": 25,
+                "rejected": 15, "cancelled": 10, "expired": 10}
+# earlier requests for the same book were turned down one way or another
+CLOSED_STATUS = ["rejected", "cancelled", "expired"]
+INVENTORY_STATUS = {"approved": "requested", "completed": "exchanged"}
+
+
+class Command(BaseCommand):
+    help = "Generate a deterministic synthetic dataset (users, books, inventory, exchange histories) for load tests."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--tier", choices=TIERS, default="1k")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--chunk-size", type=int, default=5000)
+        parser.add_argument("--replace", action="store_true",
+                            help="Delete previously seeded data first.")
+
+    def handle(self, *args, **options):
+        tier = TIERS[options["tier"]]
+        rng = random.Random(options["seed"])
+        chunk_size = options["chunk_size"]
+
+        seeded = User.objects.filter(username__startswith=PREFIX)
+        if seeded.exists():
+            if not options["replace"]:
+                raise CommandError("Benchmark data already exists; pass --replace to regenerate it.")
+            start = time.monotonic()
+            # cascades to their books, inventory and exchange requests
+            seeded.delete()
+            self.stdout.write(f"Deleted the previous data in {time.monotonic() - start:.0f}s")
+
+        start = time.monotonic()
+        categories = self.taxonomy(Category, CATEGORIES)
+        genres = self.taxonomy(Genre, GENRES)
+        users = self.seed_users(tier["users"])
+        self.stdout.write(f"{len(users)} users")
+
+        books = requests = 0
+        for offset in range(0, tier["books"], chunk_size):
+            count = min(chunk_size, tier["books"] - offset)
+            with transaction.atomic():
+                b, r = self.seed_books(rng, offset, count, users, categories, genres)
+            books += b
+            requests += r
+            self.stdout.write(f"\r{books} books, {requests} exchange requests", ending="")
+            self.stdout.flush()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"\nSeeded tier {options['tier']} in {time.monotonic() - start:.0f}s"
+        ))
+
+    def taxonomy(self, model, names):
+        existing = {obj.name.lower(): obj for obj in model.objects.all()}
+        model.objects.bulk_create(
+            [model(name=n) for n in names if n.lower() not in existing]
+        )
+        # bulk_create sends no signals
+        taxonomy.invalidate(model)
+        by_name = {obj.name.lower(): obj for obj in model.objects.all()}
+        return [by_name[n.lower()] for n in names]
+
+    def seed_users(self, count):
+        # one hash for everyone; PBKDF2 per user would dominate the run
+        password = make_password(PASSWORD, salt="benchmarkseed")
+        users = User.objects.bulk_create(
+            User(username=f"{PREFIX}{n}", email=f"{PREFIX}{n}@example.com",
+                 first_name=FIRST[n % len(FIRST)], last_name=LAST[n % len(LAST)],
+                 password=password)
+            for n in range(count)
+        )
+        # what the create_profile signal does for a single signup
+        Profile.objects.bulk_create(Profile(user=u) for u in users)
+        UserPoints.objects.bulk_create(UserPoints(user=u) for u in users)
+        return users
+
+    def seed_books(self, rng, offset, count, users, categories, genres):
+        now = timezone.now()
+        books = []
+        for n in range(offset, offset + count):
+            title = f"The {rng.choice(ADJECTIVES)} {rng.choice(NOUNS)}"
+            books.append(Book(
+                title=title,
+                author=f"{rng.choice(FIRST)} {rng.choice(LAST)}",
+                slug=f"{slugify(title)}-{PREFIX}-{n}",
+                owner=users[n % len(users)],
+                price=rng.randrange(50, 1000),
+                location=rng.choice(LOCATIONS),
+                description=f"A {rng.choice(ADJECTIVES).lower()} story. " * rng.randrange(2, 30),
+                isbn=f"978{rng.randrange(10**10):010d}",
+                category=rng.choice(categories),
+                genre=rng.choice(genres),
+                language=rng.choice(LANGUAGES),
+                condition=rng.choice(Book.CONDITION_CHOICES)[0],
+            ))
+        books = Book.objects.bulk_create(books)
+
+        # each book's history: some turned-down requests, then its final one
+        requests = []
+        finals = {}
+        for book in books:
+            if rng.random() < NO_REQUESTS:
+                continue
+            history = [rng.choice(CLOSED_STATUS) for _ in range(rng.randrange(3))]
+            history.append(rng.choices(list(FINAL_STATUS), weights=list(FINAL_STATUS.values()))[0])
+            for status in history:
+                i = rng.randrange(len(users))
+                if users[i].pk == book.owner_id:
+                    i = (i + 1) % len(users)
+                requester = users[i]
+                # open requests are recent enough not to have expired yet
+                age = rng.randrange(1, 48 if status == "pending" else 24 * 90)
+                request = ExchangeRequest(
+                    requester=requester, owner_id=book.owner_id, book=book,
+                    requester_wants_cash=rng.random() < 0.2,
+                    status=status, expires_at=now - timedelta(hours=age - 48),
+                )
+                if status in ("approved", "completed"):
+                    request.owner_confirmed = status == "completed" or rng.random() < 0.5
+                    request.requester_confirmed = status == "completed"
+                elif status == "rejected":
+                    request.rejected_by_id = book.owner_id
+                    request.reject_reason = "Not interested."
+                elif status == "cancelled":
+                    request.cancelled_by = requester
+                    request.cancel_reason = "Changed my mind."
+                requests.append(request)
+            finals[book.pk] = requests[-1]
+        if requests:
+            ExchangeRequest.objects.bulk_create(requests)
+            # auto_now_add stamped them all "now"; date them 48h before expiry
+            ExchangeRequest.objects.filter(
+                pk__gte=requests[0].pk, pk__lte=requests[-1].pk
+            ).update(created_at=F("expires_at") - timedelta(hours=48))
+
+        inventory = []
+        for book in books:
+            final = finals.get(book.pk)
+            status = final.status if final else None
+            inventory.append(Inventory(
+                book=book, location=book.location,
+                status=INVENTORY_STATUS.get(status, "available"),
+                locked_exchange=final if status == "approved" else None,
+            ))
+        Inventory.objects.bulk_create(inventory)
+        return len(books), len(requests)
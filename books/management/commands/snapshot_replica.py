@@ -0,0 +1,35 @@
+import sqlite3
+import time
+from contextlib import closing
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = "Copy the primary SQLite database into the local read replica, once or every --interval seconds."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--interval", type=float, default=0,
+                            help="Keep refreshing every N seconds (default: copy once).")
+
+    def handle(self, *args, **options):
+        source = str(settings.DATABASES["default"]["NAME"])
+        target = str(settings.REPLICA_PATH)
+        created = not settings.REPLICA_PATH.exists()
+
+        while True:
+            start = time.perf_counter()
+            # the backup API copies a consistent snapshot, WAL included, and
+            # replaces the replica's pages in one transaction, so readers
+            # with open connections see either the old or the new copy
+            with closing(sqlite3.connect(source)) as src, closing(sqlite3.connect(target, timeout=30)) as dst:
+                src.backup(dst)
+            self.stdout.write(f"replica refreshed in {(time.perf_counter() - start) * 1000:.0f} ms")
+
+            if created:
+                self.stdout.write(self.style.WARNING("New replica file: restart the server to start using it."))
+                created = False
+            if not options["interval"]:
+                break
+            time.sleep(options["interval"])
@@ -0,0 +1,55 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.error import HTTPError, URLError
+from urllib.request import Request, urlopen
+
+from django.core.management.base import BaseCommand
+from django.urls import reverse
+from books.models import Book
+
+
+class Command(BaseCommand):
+    help = "Fill the anonymous page cache of a running server (homepage and public book pages)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--base-url", default="http://127.0.0.1:8000",
+                            help="Server to warm; its pages are rendered by its own settings and templates.")
+        parser.add_argument("--books", type=int, default=500,
+                            help="How many of the newest books to warm (0 for none).")
+        parser.add_argument("--workers", type=int, default=8)
+
+    def handle(self, *args, **options):
+        paths = [reverse("Home")]
+        if options["books"]:
+            slugs = (
+                Book.objects.order_by("-created_at")
+                .values_list("slug", flat=True)[:options["books"]]
+            )
+            paths += [reverse("book_public", args=[slug]) for slug in slugs]
+
+        base = options["base_url"].rstrip("/")
+
+        def fetch(path):
+            try:
+                # no cookies: exactly what an anonymous visitor sends
+                with urlopen(Request(base + path), timeout=10) as response:
+                    return path, response.status, response.headers.get("X-Page-Cache")
+            except HTTPError as exc:
+                return path, exc.code, None
+            except URLError as exc:
+                return path, None, str(exc.reason)
+
+        start = time.perf_counter()
+        counts = {"miss": 0, "hit": 0, "failed": 0}
+        with ThreadPoolExecutor(max_workers=options["workers"]) as pool:
+            for path, status, state in pool.map(fetch, paths):
+                if status == 200 and state in counts:
+                    counts[state] += 1
+                else:
+                    counts["failed"] += 1
+                    self.stderr.write(f"{path}: {status or state}")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(paths)} pages in {time.perf_counter() - start:.1f}s: "
+            f"{counts['miss']} cached now, {counts['hit']} already cached, {counts['failed']} failed"
+        ))
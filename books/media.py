@@ -0,0 +1,162 @@
+import mimetypes
+import os
+import posixpath
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from .storage import is_blob_name
+
+# Serves MEDIA_ROOT in production. Conditional GETs are answered here;
+# the bytes are either handed to the front proxy (MEDIA_OFFLOAD) or
+# streamed through the WSGI file wrapper, which servers such as gunicorn
+# turn into os.sendfile() calls. Only then is the copy zero-copy: under
+# ASGI, or a WSGI server without wsgi.file_wrapper, Django reads the file
+# and writes it out in CHUNK_SIZE blocks, so serve large media through
+# MEDIA_OFFLOAD there.
+IMMUTABLE = "public, max-age=31536000, immutable"
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+# thumbnails of a blob are named after its hash (books/images.py)
+HASHED_THUMB_RE = re.compile(r"^[\w-]+/([0-9a-f]{2})/thumbs/\1[0-9a-f]{62}_\d+\.\w+$")
+# read size when the server has no file wrapper (FileResponse reads 4 KiB)
+CHUNK_SIZE = 256 * 1024
+
+
+class _FileSlice:
+    """``length`` bytes of ``f`` from its current position.
+
+    Keeps ``fileno`` so the server can still sendfile() the slice: it
+    starts at the descriptor's offset and stops at Content-Length.
+    """
+
+    def __init__(self, f, length):
+        self.f = f
+        self.remaining = length
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b""
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.f.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.f.fileno()
+
+    def close(self):
+        self.f.close()
+
+
+def _immutable(name):
+    """Whether the bytes under ``name`` can never change: blobs and their thumbnails."""
+    return is_blob_name(name) or bool(HASHED_THUMB_RE.match(name))
+
+
+def _etag(name, stat):
+    if is_blob_name(name):
+        # content-addressed: the name already is the sha256 of the bytes
+        return '"%s"' % posixpath.splitext(posixpath.basename(name))[0]
+    return '"%x-%x"' % (stat.st_mtime_ns, stat.st_size)
+
+
+def _byte_range(header, size):
+    """``(start, end)`` inclusive for a single satisfiable range, ``None``
+    to send the whole file, or ``False`` when it can't be satisfied."""
+    m = RANGE_RE.match(header.replace(" ", ""))
+    if not m:
+        # malformed or multiple ranges: the full body is a valid answer
+        return None
+    first, last = m.groups()
+    if not first:
+        if not last or int(last) == 0:
+            return False
+        return max(size - int(last), 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or (last and int(last) < start):
+        return False
+    return start, end
+
+
+def _offload(response, name, path):
+    mode = getattr(settings, "MEDIA_OFFLOAD", None)
+    if mode == "x-accel-redirect":
+        prefix = getattr(settings, "MEDIA_ACCEL_REDIRECT_PREFIX", "/protected-media/")
+        response["X-Accel-Redirect"] = prefix + quote(name)
+    elif mode == "x-sendfile":
+        response["X-Sendfile"] = path
+    else:
+        return False
+    return True
+
+
+def serve_media(request, path):
+    name = posixpath.normpath(path).lstrip("/")
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, name)
+    except SuspiciousFileOperation:
+        raise Http404
+    try:
+        stat = os.stat(full_path)
+    except OSError:
+        raise Http404
+    if not os.path.isfile(full_path):
+        raise Http404
+
+    etag = _etag(name, stat)
+    headers = {
+        "ETag": etag,
+        "Last-Modified": http_date(stat.st_mtime),
+        "Cache-Control": IMMUTABLE if _immutable(name) else "public, no-cache",
+    }
+    not_modified = get_conditional_response(
+        request, etag=etag, last_modified=int(stat.st_mtime)
+    )
+    if not_modified is not None:
+        for header, value in headers.items():
+            not_modified[header] = value
+        return not_modified
+
+    content_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+
+    response = HttpResponse(content_type=content_type)
+    if _offload(response, name, full_path):
+        # the proxy sends the bytes and handles Range itself
+        for header, value in headers.items():
+            response[header] = value
+        return response
+
+    size = stat.st_size
+    byte_range = None
+    range_header = request.META.get("HTTP_RANGE")
+    if range_header and request.META.get("HTTP_IF_RANGE", etag) == etag:
+        byte_range = _byte_range(range_header, size)
+
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response["Content-Range"] = f"bytes */{size}"
+        return response
+
+    f = open(full_path, "rb")
+    if byte_range is None:
+        response = FileResponse(f, content_type=content_type)
+        response["Content-Length"] = size
+    else:
+        start, end = byte_range
+        f.seek(start)
+        response = FileResponse(_FileSlice(f, end - start + 1), content_type=content_type, status=206)
+        response["Content-Range"] = f"bytes {start}-{end}/{size}"
+        response["Content-Length"] = end - start + 1
+
+    response.block_size = CHUNK_SIZE
+    response["Accept-Ranges"] = "bytes"
+    for header, value in headers.items():
+        response[header] = value
+    return response
@@ -0,0 +1,250 @@
+import mimetypes
+import os
+import posixpath
+from urllib.parse import unquote
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, HttpResponseNotModified
+from django.utils._os import safe_join
+from django.utils.http import http_date
+from django.views.static import was_modified_since
+from . import ratelimit, routers, sqlprofile
+from .staticfiles import ENCODINGS
+
+STICKY_COOKIE = "primary_pin"
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+
+class HybridMiddleware:
+    """Base for middleware that runs natively under both WSGI and ASGI.
+
+    Under ASGI Django runs everything below a sync-only middleware in a
+    thread (async_to_sync), so a single one makes each async view hold a
+    thread for its whole request. Subclasses implement ``handle`` and
+    ``ahandle``; in async mode ``aprocess_view`` stands in for
+    ``process_view``, which Django would otherwise also run in a thread.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+            if hasattr(self, "aprocess_view"):
+                self.process_view = self.aprocess_view
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.ahandle(request)
+        return self.handle(request)
+
+
+class ReplicaMiddleware(HybridMiddleware):
+    """Per-request state for books.routers.ReplicaRouter.
+
+    The state is a context variable, which sync_to_async carries into the
+    thread an async view's queries run in.
+    """
+
+    def handle(self, request):
+        token = routers.begin(pinned=STICKY_COOKIE in request.COOKIES)
+        try:
+            response = self.get_response(request)
+        finally:
+            state = routers.end(token)
+        return self.pin(response, state)
+
+    async def ahandle(self, request):
+        token = routers.begin(pinned=STICKY_COOKIE in request.COOKIES)
+        try:
+            response = await self.get_response(request)
+        finally:
+            state = routers.end(token)
+        return self.pin(response, state)
+
+    def pin(self, response, state):
+        if state["wrote"]:
+            response.set_cookie(
+                STICKY_COOKIE, "1",
+                max_age=getattr(settings, "REPLICA_STICKY_SECONDS", 30),
+                httponly=True, samesite="Lax",
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        routers.use_replica(getattr(view_func, "replica_reads", False))
+
+    async def aprocess_view(self, request, view_func, view_args, view_kwargs):
+        routers.use_replica(getattr(view_func, "replica_reads", False))
+
+
+class SQLProfileMiddleware(HybridMiddleware):
+    """Profile the SQL of a sample of requests (books.sqlprofile).
+
+    The profile of a streamed page stays on until its content is exhausted
+    or closed, so the rows it queries while it is being sent are counted too.
+    """
+
+    def handle(self, request):
+        if not sqlprofile.sampled():
+            return self.get_response(request)
+
+        profile = sqlprofile.Profile()
+        try:
+            response = self.get_response(request)
+        except BaseException:
+            profile.stop()
+            raise
+        profile.watch(request, response)
+        return response
+
+    async def ahandle(self, request):
+        if not sqlprofile.sampled():
+            return await self.get_response(request)
+
+        # an async view's queries run in the request's thread-sensitive
+        # thread, so the profile wraps that thread's connections
+        profile = await sync_to_async(sqlprofile.Profile)()
+        try:
+            response = await self.get_response(request)
+        except BaseException:
+            profile.stop()
+            raise
+        profile.watch(request, response)
+        return response
+
+
+class RateLimitMiddleware(HybridMiddleware):
+    """Enforce books.ratelimit rules on views marked ``@rate_limited``.
+
+    Runs after AuthenticationMiddleware so user buckets can be told
+    apart; a throttled request never reaches the view or the database.
+    """
+
+    def handle(self, request):
+        return self.get_response(request)
+
+    async def ahandle(self, request):
+        return await self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        rule = getattr(view_func, "rate_limit", None)
+        if rule is None:
+            return None
+        wait = ratelimit.check(request, rule)
+        if wait:
+            return ratelimit.too_many_requests(wait)
+        return None
+
+    async def aprocess_view(self, request, view_func, view_args, view_kwargs):
+        rule = getattr(view_func, "rate_limit", None)
+        if rule is None:
+            return None
+        wait = await ratelimit.acheck(request, rule)
+        if wait:
+            return ratelimit.too_many_requests(wait)
+        return None
+
+
+def _accepted_encodings(header):
+    accepted = set()
+    for part in header.split(","):
+        coding, _, params = part.strip().partition(";")
+        q = params.strip()
+        if q.startswith("q="):
+            try:
+                if float(q[2:]) == 0:
+                    continue
+            except ValueError:
+                continue
+        accepted.add(coding.strip().lower())
+    return accepted
+
+
+class StaticAssetMiddleware(HybridMiddleware):
+    """Serve collected static files without a front proxy.
+
+    Hashed names from the collectstatic manifest never change, so they get
+    a year-long immutable Cache-Control; other names must revalidate. The
+    .br/.gz variants written by books.staticfiles are picked according
+    to Accept-Encoding. Under runserver with DEBUG the staticfiles handler
+    answers first and this never runs.
+    """
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.prefix = "/" + settings.STATIC_URL.lstrip("/")
+        self.root = settings.STATIC_ROOT
+        self._hashed = None
+        self._variants = {}
+
+    def handle(self, request):
+        response = self.static_response(request)
+        if response is not None:
+            return response
+        return self.get_response(request)
+
+    async def ahandle(self, request):
+        # a stat and an open of a local file: cheaper inline than a thread hop
+        response = self.static_response(request)
+        if response is not None:
+            return response
+        return await self.get_response(request)
+
+    def static_response(self, request):
+        if self.root and request.method in ("GET", "HEAD") and request.path.startswith(self.prefix):
+            return self.serve(request, request.path[len(self.prefix):])
+        return None
+
+    def hashed_names(self):
+        if self._hashed is None:
+            self._hashed = set(getattr(staticfiles_storage, "hashed_files", {}).values())
+        return self._hashed
+
+    def variants(self, path):
+        # which precompressed siblings exist; fixed for the life of a deploy
+        if path not in self._variants:
+            self._variants[path] = [
+                (encoding, path + suffix)
+                for encoding, suffix in ENCODINGS.items()
+                if os.path.isfile(path + suffix)
+            ]
+        return self._variants[path]
+
+    def serve(self, request, name):
+        name = posixpath.normpath(unquote(name)).lstrip("/")
+        try:
+            path = safe_join(self.root, name)
+        except SuspiciousFileOperation:
+            return None
+        if not os.path.isfile(path):
+            return None
+
+        stat = os.stat(path)
+        immutable = name in self.hashed_names()
+        if not immutable and not was_modified_since(
+            request.META.get("HTTP_IF_MODIFIED_SINCE"), stat.st_mtime
+        ):
+            return HttpResponseNotModified()
+
+        variants = self.variants(path)
+        accepted = _accepted_encodings(request.META.get("HTTP_ACCEPT_ENCODING", ""))
+        encoding, serve_path = next(
+            ((e, p) for e, p in variants if e in accepted), (None, path)
+        )
+
+        content_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+        response = FileResponse(open(serve_path, "rb"), content_type=content_type)
+        if encoding:
+            response["Content-Encoding"] = encoding
+        if variants:
+            response["Vary"] = "Accept-Encoding"
+        response["Last-Modified"] = http_date(stat.st_mtime)
+        response["Cache-Control"] = IMMUTABLE if immutable else "public, no-cache"
+        return response
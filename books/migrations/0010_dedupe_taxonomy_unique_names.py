@@ -0,0 +1,42 @@
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+def merge_duplicates(apps, schema_editor):
+    Book = apps.get_model('books', 'Book')
+
+    for model_name, fk in (('Category', 'category_id'), ('Genre', 'genre_id')):
+        model = apps.get_model('books', model_name)
+
+        # the oldest row of each case-insensitive name is kept
+        keep = {}
+        repoint = {}
+        for pk, name in model.objects.order_by('pk').values_list('pk', 'name'):
+            key = name.strip().lower()
+            if key in keep:
+                repoint.setdefault(keep[key], []).append(pk)
+            else:
+                keep[key] = pk
+
+        for keep_pk, dup_pks in repoint.items():
+            Book.objects.filter(**{f'{fk}__in': dup_pks}).update(**{fk: keep_pk})
+            model.objects.filter(pk__in=dup_pks).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0009_mediablob'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='category',
+            constraint=models.UniqueConstraint(django.db.models.functions.text.Lower('name'), name='unique_category_name_ci', violation_error_message='A category with this name already exists.'),
+        ),
+        migrations.AddConstraint(
+            model_name='genre',
+            constraint=models.UniqueConstraint(django.db.models.functions.text.Lower('name'), name='unique_genre_name_ci', violation_error_message='A genre with this name already exists.'),
+        ),
+    ]
@@ -1,13 +1,97 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models.functions import Lower
 from django.core.exceptions import ValidationError
 from django.contrib.auth.models import User
 from django.utils import timezone
 from datetime import timedelta
 
+
+#Change tracking
+#(remembers the values a row was loaded with so save() only writes changed columns)
+class DirtyFieldsMixin:
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._snapshot()
+        return instance
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+        # what was just read is the loaded state of those columns; other
+        # pending changes (e.g. when a deferred field loads itself) stay dirty
+        loaded = self.__dict__.setdefault("_loaded_values", {})
+        for f in self._meta.concrete_fields:
+            if (fields is None or f.name in fields or f.attname in fields) and f.attname in self.__dict__:
+                loaded[f.attname] = self._tracked_value(f)
+
+    def _tracked_value(self, field):
+        value = self.__dict__[field.attname]
+        if isinstance(field, models.FileField):
+            # a fresh upload is always a change
+            if not getattr(value, "_committed", True):
+                return object()
+            return getattr(value, "name", value) or ""
+        return value
+
+    def _snapshot(self):
+        self._loaded_values = {
+            f.attname: self._tracked_value(f)
+            for f in self._meta.concrete_fields
+            if f.attname in self.__dict__
+        }
+
+    def get_dirty_fields(self):
+        """Names of changed fields, or None when nothing is known (new rows)."""
+        loaded = getattr(self, "_loaded_values", None)
+        if self._state.adding or loaded is None:
+            return None
+        # a field deferred at load time and assigned since has no
+        # snapshot entry: it is a change
+        return [
+            f.name for f in self._meta.concrete_fields
+            if f.attname in self.__dict__
+            and (f.attname not in loaded or self._tracked_value(f) != loaded[f.attname])
+        ]
+
+    def has_changed(self, name):
+        dirty = self.get_dirty_fields()
+        return dirty is None or name in dirty
+
+    def get_loaded_value(self, attname):
+        """Value ``attname`` had when the row was loaded (None for new rows)."""
+        return (getattr(self, "_loaded_values", None) or {}).get(attname)
+
+    def save(self, *args, **kwargs):
+        if not args and kwargs.get("update_fields") is None and not kwargs.get("force_insert"):
+            dirty = self.get_dirty_fields()
+            if dirty is not None:
+                if not dirty:
+                    return
+                auto_now = [
+                    f.name for f in self._meta.concrete_fields
+                    if getattr(f, "auto_now", False) and f.name not in dirty
+                ]
+                kwargs["update_fields"] = dirty + auto_now
+
+        super().save(*args, **kwargs)
+        self._snapshot()
+
+
 #Category
 class Category(models.Model):
     name = models.CharField(max_length=100)
 
+    class Meta:
+        constraints = [
+            # indexed, case-insensitive canonical key ("fiction" == "Fiction")
+            models.UniqueConstraint(
+                Lower("name"),
+                name="unique_category_name_ci",
+                violation_error_message="A category with this name already exists.",
+            ),
+        ]
+
     def __str__(self):
         return self.name
 
@@ -16,12 +100,21 @@ class Category(models.Model):
 class Genre(models.Model):
     name = models.CharField(max_length=100)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                Lower("name"),
+                name="unique_genre_name_ci",
+                violation_error_message="A genre with this name already exists.",
+            ),
+        ]
+
     def __str__(self):
         return self.name
 
 
 #Book
-class Book(models.Model):
+class Book(DirtyFieldsMixin, models.Model):
     CONDITION_CHOICES = [
         ('new', 'New'),
         ('like_new', 'Like New'),
@@ -64,13 +157,20 @@ class Book(models.Model):
         return self.title
 
     def save(self, *args, **kwargs):
+        # new books get their Inventory afterwards, so only existing rows sync
+        sync_location = not self._state.adding and self.has_changed("location")
+
         super().save(*args, **kwargs)
-        if hasattr(self, "inventory"):
-            self.inventory.location = self.location
-            self.inventory.save(update_fields=["location"])
+
+        if sync_location:
+            Inventory.objects.filter(book=self).update(location=self.location)
+            inventory = self._state.fields_cache.get("inventory")
+            if inventory is not None:
+                inventory.location = self.location
+                inventory._snapshot()
     
 #Book Inventory
-class Inventory(models.Model):
+class Inventory(DirtyFieldsMixin, models.Model):
     STATUS_CHOICES = [
         ('available', 'Available'),
         ('requested', 'Requested'),
@@ -131,7 +231,7 @@ class Inventory(models.Model):
 #         return f"{self.user.username} → {self.book.title}"
 
 #ExchangeRequest
-class ExchangeRequest(models.Model):
+class ExchangeRequest(DirtyFieldsMixin, models.Model):
 
     STATUS_CHOICES = [
         ('pending', 'Pending'),
@@ -228,12 +328,32 @@ class ExchangeRequest(models.Model):
 
     def save(self, *args, **kwargs):
 
-        self.full_clean()  # enforce validation
+        # enforce validation (only re-check the fields that changed;
+        # unchanged foreign keys would each cost an existence query)
+        dirty = self.get_dirty_fields()
+        if dirty is None:
+            self.full_clean()
+        else:
+            self.full_clean(exclude=[
+                f.name for f in self._meta.concrete_fields if f.name not in dirty
+            ])
 
         if not self.pk:
             self.expires_at = timezone.now() + timedelta(hours=48)
 
-        super().save(*args, **kwargs)
+        status_changed = dirty is None or "status" in dirty
+        previous_status = self.get_loaded_value("status")
+
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+            if status_changed:
+                # 🏆 points for completion / cancellation / expiry
+                from .points import award_exchange_points
+                award_exchange_points(self, previous_status)
+
+        if not status_changed:
+            return
 
         # ✅ COMPLETED → mark books exchanged
         if self.status == "completed":
@@ -265,6 +385,13 @@ class ExchangeRequest(models.Model):
         return f"{self.book.title} → {self.requester.username} ({self.status})"
 
 
+#MediaBlob
+#(one row per content-addressed file in MEDIA_ROOT, see books/storage.py)
+class MediaBlob(models.Model):
+    name = models.CharField(max_length=255, unique=True)
+    refcount = models.IntegerField(default=0)
 
+    created_at = models.DateTimeField(auto_now_add=True)
 
-
+    def __str__(self):
+        return f"{self.name} ({self.refcount})"
@@ -0,0 +1,85 @@
+import hashlib
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+from . import versions
+
+# Whole-page cache for anonymous visitors. A page belongs to one or more
+# groups ("taxonomy", "book:<slug>"); its key embeds each group's current
+# version, so invalidate(group) retires every cached URL of the group at
+# once, query-string variants included. Versions and pages live in the
+# "default" cache, which every worker process shares (settings.CACHES), so
+# an invalidation in one worker retires the page in all of them; a hit
+# reads two cache files and runs no SQL. Requests that carry a session or
+# messages cookie always reach the view.
+CACHE_ALIAS = "default"
+BYPASS_COOKIES = ("sessionid", "messages")
+
+
+def _cache():
+    return caches[CACHE_ALIAS]
+
+
+def _version_key(group):
+    return f"pagever:{group}"
+
+
+def invalidate(*groups):
+    versions.bump(_cache(), *map(_version_key, groups))
+
+
+def _is_anonymous(request):
+    cookies = request.COOKIES
+    return not any(
+        name in cookies
+        for name in (settings.SESSION_COOKIE_NAME, *BYPASS_COOKIES)
+    )
+
+
+def cache_anonymous(*groups, timeout=None):
+    """Serve the view from the page cache for anonymous GET/HEAD requests.
+
+    ``groups`` are strings; callables get the view kwargs, for groups that
+    depend on the URL (``lambda slug: f"book:{slug}"``).
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ("GET", "HEAD") or not _is_anonymous(request):
+                response = view(request, *args, **kwargs)
+                patch_vary_headers(response, ("Cookie",))
+                return response
+
+            names = [g(**kwargs) if callable(g) else g for g in groups]
+            stamps = ":".join(f"{name}={versions.get(_cache(), _version_key(name))}" for name in names)
+            path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+            key = f"page:{stamps}:{path}"
+
+            cached = _cache().get(key)
+            if cached is not None:
+                status, content_type, content = cached
+                response = HttpResponse(content, status=status, content_type=content_type)
+                response["X-Page-Cache"] = "hit"
+            else:
+                response = view(request, *args, **kwargs)
+                # only plain 200s that set no cookies (no CSRF token, no session)
+                if (
+                    response.status_code == 200
+                    and not response.streaming
+                    and not response.cookies
+                    and not request.META.get("CSRF_COOKIE_NEEDS_UPDATE")
+                ):
+                    _cache().set(
+                        key,
+                        (response.status_code, response["Content-Type"], response.content),
+                        timeout if timeout is not None else getattr(settings, "PAGE_CACHE_SECONDS", 300),
+                    )
+                response["X-Page-Cache"] = "miss"
+
+            patch_vary_headers(response, ("Cookie",))
+            return response
+        return wrapper
+    return decorator
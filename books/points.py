@@ -0,0 +1,62 @@
+from users import ledger
+
+# Points for the exchange lifecycle. Every entry is keyed on the exchange
+# id, so re-saving an exchange or re-running the backfill never pays twice.
+COMPLETION_POINTS = 10   # each party, when both confirmed
+CANCEL_PENALTY = 5       # whoever backs out of an approved deal
+EXPIRY_PENALTY = 5       # each party that hadn't confirmed an approved deal
+
+
+def exchange_entries(r, previous_status):
+    """Ledger entries owed for exchange ``r`` moving out of ``previous_status``."""
+    entries = []
+
+    if r.status == "completed":
+        for user_id in (r.owner_id, r.requester_id):
+            entries.append({
+                "user_id": user_id,
+                "amount": COMPLETION_POINTS,
+                "transaction_type": "earn",
+                "reason": f"Completed exchange #{r.pk}",
+                "related_book_id": r.book_id,
+                "idempotency_key": f"exchange:{r.pk}:earn:{user_id}",
+                "completed_exchange": True,
+            })
+
+    elif r.status == "cancelled" and previous_status == "approved" and r.cancelled_by_id:
+        entries.append({
+            "user_id": r.cancelled_by_id,
+            "amount": CANCEL_PENALTY,
+            "transaction_type": "spend",
+            "reason": f"Cancelled approved exchange #{r.pk}",
+            "related_book_id": r.book_id,
+            "idempotency_key": f"exchange:{r.pk}:cancel",
+        })
+
+    elif r.status == "expired" and previous_status == "approved":
+        for user_id, confirmed in ((r.owner_id, r.owner_confirmed),
+                                   (r.requester_id, r.requester_confirmed)):
+            if not confirmed:
+                entries.append({
+                    "user_id": user_id,
+                    "amount": EXPIRY_PENALTY,
+                    "transaction_type": "spend",
+                    "reason": f"Approved exchange #{r.pk} expired",
+                    "related_book_id": r.book_id,
+                    "idempotency_key": f"exchange:{r.pk}:expired:{user_id}",
+                })
+
+    return entries
+
+
+def award_exchange_points(r, previous_status):
+    for entry in exchange_entries(r, previous_status):
+        ledger.post(
+            entry["user_id"],
+            entry["amount"],
+            entry["transaction_type"],
+            entry["reason"],
+            idempotency_key=entry["idempotency_key"],
+            related_book=entry["related_book_id"],
+            completed_exchange=entry.get("completed_exchange", False),
+        )
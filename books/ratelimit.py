@@ -0,0 +1,223 @@
+import functools
+import hashlib
+import math
+import mmap
+import os
+import struct
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.http import HttpResponse
+
+try:
+    import fcntl
+except ImportError:  # Windows: the table is then only locked per process
+    fcntl = None
+
+# Token buckets for views that are cheap to call and costly to answer
+# (polling endpoints, request creation). A limited view names a rule in
+# settings.RATE_LIMITS, which budgets "count/period" per user and per
+# client IP: a bucket holds up to count tokens, refills at count/period,
+# and each request takes one or gets a 429 with Retry-After.
+#
+# Buckets live in a table of fixed-size slots in a memory-mapped file
+# (settings.RATE_LIMIT_PATH) that every worker process on the host maps,
+# so the budget is global rather than per worker. A slot is the 8-byte
+# hash of the bucket's key and the time the bucket is full again; a check
+# locks the file, reads and debits its slots in place and unlocks it, so
+# it is atomic across processes, takes microseconds and writes nothing to
+# a database. With RATE_LIMIT_PATH None the table is private to the process.
+PERIODS = {"s": 1, "m": 60, "h": 3600}
+SLOT = struct.Struct("<Qd")
+SLOTS = 1 << 16
+# slots tried from a key's home slot before an idle one is reused
+PROBES = 8
+
+_lock = threading.Lock()
+_throttled = {}
+_table = None
+
+
+def rate_limited(rule):
+    """Mark ``view`` as limited by ``settings.RATE_LIMITS[rule]``."""
+    def decorator(view):
+        view.rate_limit = rule
+        return view
+    return decorator
+
+
+@functools.lru_cache(maxsize=None)
+def parse_rate(rate):
+    """``"30/m"`` -> ``(30, 60)``: bucket size and seconds to refill it."""
+    count, _, period = rate.partition("/")
+    return int(count), PERIODS[period]
+
+
+def client_ip(request):
+    """The address of the client, not of the reverse proxies in front of us.
+
+    Each of the RATE_LIMIT_TRUSTED_PROXIES proxies appends the address it
+    was called from to X-Forwarded-For, so the client is that many entries
+    from the right; anything further left was sent by the client itself.
+    """
+    proxies = getattr(settings, "RATE_LIMIT_TRUSTED_PROXIES", 0)
+    if not proxies:
+        return request.META.get("REMOTE_ADDR", "")
+    forwarded = [a.strip() for a in request.META.get("HTTP_X_FORWARDED_FOR", "").split(",")]
+    if len(forwarded) < proxies or not forwarded[-proxies]:
+        # reached us around the proxies: only the peer address is known
+        return request.META.get("REMOTE_ADDR", "")
+    return forwarded[-proxies]
+
+
+class BucketTable:
+    """SLOTS (key hash, full at) records in a shared memory map."""
+
+    def __init__(self, path=None):
+        self.path = path
+        size = SLOTS * SLOT.size
+        if path is None:
+            self.fd = None
+            self.map = mmap.mmap(-1, size)
+        else:
+            self.fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+            if os.fstat(self.fd).st_size < size:
+                os.ftruncate(self.fd, size)
+            self.map = mmap.mmap(self.fd, size)
+        # fcntl locks belong to the process: threads queue on this one first
+        self.threads = threading.Lock()
+
+    @contextmanager
+    def locked(self):
+        with self.threads:
+            if self.fd is None or fcntl is None:
+                yield
+                return
+            fcntl.lockf(self.fd, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.lockf(self.fd, fcntl.LOCK_UN)
+
+    def find(self, key_hash, now, taken=()):
+        """``(offset, full_at)`` of the slot for ``key_hash``; call with the table locked.
+
+        A key without a slot gets the first idle one among its PROBES (a
+        full bucket is the same as no bucket); when all of them are busy,
+        the one closest to full is taken over and its bucket starts again.
+        """
+        home = key_hash % SLOTS
+        idle = busy = None
+        for i in range(PROBES):
+            offset = (home + i) % SLOTS * SLOT.size
+            if offset in taken:
+                continue
+            slot_hash, full_at = SLOT.unpack_from(self.map, offset)
+            if slot_hash == key_hash:
+                return offset, full_at
+            if full_at <= now:
+                idle = offset if idle is None else idle
+            elif busy is None or full_at < busy[1]:
+                busy = (offset, full_at)
+        return (idle if idle is not None else busy[0]), 0.0
+
+    def close(self):
+        self.map.close()
+        if self.fd is not None:
+            os.close(self.fd)
+
+
+def _get_table():
+    global _table
+    if _table is None:
+        with _lock:
+            if _table is None:
+                _table = BucketTable(getattr(settings, "RATE_LIMIT_PATH", None))
+    return _table
+
+
+def close():
+    """Unmap the table; the next check opens RATE_LIMIT_PATH again."""
+    global _table
+    with _lock:
+        table, _table = _table, None
+    if table is not None:
+        table.close()
+
+
+def key_hash(key):
+    # Python's hash() differs per process; 0 marks an empty slot
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "little") or 1
+
+
+def check(request, rule):
+    """Seconds the request must wait under ``rule``, or 0 to let it through."""
+    return take(rule, request.user, client_ip(request))
+
+
+async def acheck(request, rule):
+    """check() for async middleware; the table is in memory, so only the user is awaited."""
+    return take(rule, await request.auser(), client_ip(request))
+
+
+def take(rule, user, ip):
+    """Debit one token from each of the rule's buckets for ``user`` and ``ip``.
+
+    Every bucket is checked before any is debited, with the table locked
+    throughout: a request one bucket refuses costs nothing from the
+    others, and concurrent requests never spend the same token twice.
+    """
+    limits = settings.RATE_LIMITS[rule]
+    buckets = []
+    if "user" in limits and user is not None and user.is_authenticated:
+        buckets.append(("user", f"rl:{rule}:user:{user.pk}", limits["user"]))
+    if "ip" in limits:
+        buckets.append(("ip", f"rl:{rule}:ip:{ip}", limits["ip"]))
+    if not buckets:
+        return 0
+
+    hashes = [key_hash(key) for scope, key, rate in buckets]
+    table = _get_table()
+    wait = 0
+    refused = []
+    with table.locked():
+        now = time.time()
+        slots = {}
+        for (scope, key, rate), h in zip(buckets, hashes):
+            offset, full_at = table.find(h, now, slots)
+            capacity, period = parse_rate(rate)
+            # one token's worth of refill time
+            interval = period / capacity
+            backlog = max(full_at - now, 0)
+            # room for one more token; the slack absorbs float rounding
+            over = backlog + interval - period
+            if over > 1e-9:
+                wait = max(wait, over)
+                refused.append(scope)
+            slots[offset] = (h, now + backlog + interval)
+        if not wait:
+            for offset, (h, full_at) in slots.items():
+                SLOT.pack_into(table.map, offset, h, full_at)
+
+    if refused:
+        with _lock:
+            for scope in refused:
+                _throttled[(rule, scope)] = _throttled.get((rule, scope), 0) + 1
+    return wait
+
+
+def too_many_requests(wait):
+    response = HttpResponse("Too many requests.", status=429, content_type="text/plain")
+    response["Retry-After"] = max(1, math.ceil(wait))
+    return response
+
+
+def stats():
+    with _lock:
+        counts = dict(_throttled)
+    return {
+        "table": str(getattr(settings, "RATE_LIMIT_PATH", None) or "per process"),
+        "throttled": {f"{rule}:{scope}": n for (rule, scope), n in sorted(counts.items())},
+    }
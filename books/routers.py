@@ -0,0 +1,72 @@
+import contextvars
+
+from django.conf import settings
+from django.db import connections
+
+# Read/write splitting. Views decorated with @replica_reads read the
+# books/users tables from the "replica" alias; everything else, every
+# write, and sessions/auth always use "default". ReplicaMiddleware
+# (books/middleware.py) holds the per-request state and pins a browser
+# to the primary for REPLICA_STICKY_SECONDS after it writes, so users
+# see their own changes before the replica catches up.
+REPLICA = "replica"
+REPLICA_APPS = {"books", "users"}
+
+_state = contextvars.ContextVar("replica_state", default=None)
+
+
+def replica_reads(view):
+    """Mark ``view`` as read-only: its queries may be served by the replica."""
+    view.replica_reads = True
+    return view
+
+
+def has_replica():
+    return REPLICA in settings.DATABASES
+
+
+def begin(pinned):
+    return _state.set({"reads": False, "pinned": pinned, "wrote": False})
+
+
+def end(token):
+    state = _state.get()
+    _state.reset(token)
+    return state
+
+
+def use_replica(enabled=True):
+    state = _state.get()
+    if state is not None:
+        state["reads"] = enabled
+
+
+class ReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if (
+            state
+            and state["reads"]
+            and not state["pinned"]
+            and not state["wrote"]
+            and model._meta.app_label in REPLICA_APPS
+            and has_replica()
+            and not connections["default"].in_atomic_block
+        ):
+            return REPLICA
+        return "default"
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None and model._meta.app_label in REPLICA_APPS:
+            # later reads in this request, and the next few requests, use the primary
+            state["wrote"] = True
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        # the replica is a copy of the primary, never migrated on its own
+        return db != REPLICA
@@ -0,0 +1,47 @@
+from django.core.signals import setting_changed
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from . import pagecache, ratelimit, sqlite, taxonomy
+from .images import schedule, variants_ready
+from .models import Book, Category, Genre
+from .storage import track_media_field
+
+
+@receiver(post_save, sender=Book)
+def process_cover_image(sender, instance, **kwargs):
+    if instance.cover_image and not variants_ready(instance.cover_image.name):
+        schedule(instance.cover_image.name)
+
+
+@receiver(post_save, sender=Book)
+@receiver(post_delete, sender=Book)
+def invalidate_book_page(sender, instance, **kwargs):
+    groups = [f"book:{slug}" for slug in {instance.slug, instance.get_loaded_value("slug")} if slug]
+    # after commit, or a request in between could cache the old row again
+    transaction.on_commit(lambda: pagecache.invalidate(*groups))
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Genre)
+@receiver(post_delete, sender=Genre)
+def invalidate_taxonomy(sender, **kwargs):
+    taxonomy.invalidate(sender)
+    # cards are keyed by the taxonomy versions invalidate() moves
+    transaction.on_commit(lambda: pagecache.invalidate("taxonomy"))
+
+
+@receiver(connection_created)
+def configure_sqlite(sender, connection, **kwargs):
+    sqlite.configure(connection)
+
+
+@receiver(setting_changed)
+def reopen_rate_limits(setting, **kwargs):
+    if setting == "RATE_LIMIT_PATH":
+        ratelimit.close()
+
+
+track_media_field(Book, "cover_image")
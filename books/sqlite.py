@@ -0,0 +1,21 @@
+from django.conf import settings
+from .routers import REPLICA
+
+# PRAGMAs that change the database file or how writes reach it. The
+# replica is a snapshot only read from, so it keeps what it was given.
+WRITE_PRAGMAS = {"journal_mode", "synchronous"}
+
+
+def configure(connection):
+    """Run ``settings.SQLITE_PRAGMAS`` on a freshly opened SQLite connection
+    when ``settings.SQLITE_TUNING`` is on."""
+    if connection.vendor != "sqlite" or not getattr(settings, "SQLITE_TUNING", True):
+        return
+    pragmas = getattr(settings, "SQLITE_PRAGMAS", {})
+    if connection.alias == REPLICA:
+        pragmas = {name: value for name, value in pragmas.items() if name not in WRITE_PRAGMAS}
+    if not pragmas:
+        return
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name} = {value}")
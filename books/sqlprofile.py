@@ -0,0 +1,180 @@
+import json
+import logging
+import os
+import random
+import sys
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+
+# Per-request SQL profiles (SQLProfileMiddleware). A sampled request wraps
+# every database connection: each query is timed and tagged with the
+# project frames that issued it. When the response is sent (after the
+# last streamed row) a request slower than SQL_PROFILE_SLOW_MS, or running
+# more than SQL_PROFILE_SLOW_QUERIES queries, is logged as one JSON line
+# to the "books.sqlprofile" logger, which settings.LOGGING rotates into
+# SQL_PROFILE_LOG. Unsampled requests cost one random() call.
+logger = logging.getLogger(__name__)
+
+PROJECT_DIR = str(settings.BASE_DIR) + os.sep
+TOP_STATEMENTS = 5
+# the same statement this many times in one request is the N+1 signature
+REPEATED = 3
+SQL_PREVIEW = 1000
+CALL_SITE_FRAMES = 3
+
+
+def sampled():
+    rate = getattr(settings, "SQL_PROFILE_SAMPLE_RATE", 0)
+    return rate >= 1 or (rate > 0 and random.random() < rate)
+
+
+def call_site():
+    """Innermost project frames of the current stack, Django and libraries skipped."""
+    sites = []
+    frame = sys._getframe(2)
+    while frame is not None and len(sites) < CALL_SITE_FRAMES:
+        filename = frame.f_code.co_filename
+        if (filename.startswith(PROJECT_DIR) and "site-packages" not in filename
+                and filename != __file__):
+            sites.append(f"{filename[len(PROJECT_DIR):]}:{frame.f_lineno} in {frame.f_code.co_name}")
+        frame = frame.f_back
+    return sites
+
+
+class Profile:
+    """Queries run by one request on this thread's connections."""
+
+    def __init__(self):
+        self.queries = []
+        self.start = time.perf_counter()
+        self.connections = [connections[alias] for alias in connections]
+        for connection in self.connections:
+            connection.execute_wrappers.append(self)
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((sql, time.perf_counter() - start, call_site()))
+
+    def stop(self):
+        for connection in self.connections:
+            if self in connection.execute_wrappers:
+                connection.execute_wrappers.remove(self)
+        return time.perf_counter() - self.start
+
+    def watch(self, request, response):
+        """Finish once ``response`` is sent: now, or when its stream ends or is closed."""
+        if not response.streaming or getattr(response, "file_to_stream", None) is not None:
+            # a file is sent without queries; keep the server's file_wrapper path
+            self.finish(request, response)
+            return
+        stream = _AsyncStream if response.is_async else _Stream
+        response.streaming_content = stream(
+            response.streaming_content, lambda: self.finish(request, response)
+        )
+
+    def finish(self, request, response):
+        elapsed = self.stop()
+        if (elapsed * 1000 < settings.SQL_PROFILE_SLOW_MS
+                and len(self.queries) <= settings.SQL_PROFILE_SLOW_QUERIES):
+            return
+        logger.info(json.dumps(self.entry(request, response, elapsed)))
+
+    def entry(self, request, response, elapsed):
+        # statements are grouped by their SQL text, placeholders unfilled
+        shapes = defaultdict(lambda: [0, 0.0, None])
+        for sql, duration, sites in self.queries:
+            shape = shapes[sql]
+            shape[0] += 1
+            shape[1] += duration
+            shape[2] = shape[2] or sites
+        repeated = sorted(
+            ((sql, n, total, sites) for sql, (n, total, sites) in shapes.items() if n >= REPEATED),
+            key=lambda s: -s[1],
+        )
+        slowest = sorted(self.queries, key=lambda q: -q[1])[:TOP_STATEMENTS]
+        match = getattr(request, "resolver_match", None)
+        return {
+            "at": timezone.now().isoformat(timespec="seconds"),
+            "method": request.method,
+            "path": request.get_full_path(),
+            "view": match.view_name if match else None,
+            "status": response.status_code,
+            "ms": round(elapsed * 1000, 1),
+            "sql_ms": round(sum(q[1] for q in self.queries) * 1000, 1),
+            "queries": len(self.queries),
+            "duplicates": len(self.queries) - len(shapes),
+            "sample_rate": settings.SQL_PROFILE_SAMPLE_RATE,
+            "slowest": [
+                {"sql": sql[:SQL_PREVIEW], "ms": round(duration * 1000, 2), "where": sites}
+                for sql, duration, sites in slowest
+            ],
+            "repeated": [
+                {"sql": sql[:SQL_PREVIEW], "count": n, "ms": round(total * 1000, 2), "where": sites}
+                for sql, n, total, sites in repeated[:TOP_STATEMENTS]
+            ],
+        }
+
+
+class _Followed:
+    """Streamed content that calls ``done`` once, when exhausted or closed.
+
+    The response closes it even if the server never started iterating,
+    which a plain generator's ``finally`` would miss.
+    """
+
+    def __init__(self, content, done):
+        self.content = content
+        self.done = done
+
+    def close(self):
+        done, self.done = self.done, None
+        if done is not None:
+            done()
+
+
+class _Stream(_Followed):
+
+    def __iter__(self):
+        try:
+            yield from self.content
+        finally:
+            self.close()
+
+
+class _AsyncStream(_Followed):
+
+    async def __aiter__(self):
+        try:
+            async for chunk in self.content:
+                yield chunk
+        finally:
+            self.close()
+
+
+def recent(max_bytes=4 * 1024 * 1024):
+    """Entries from the tail of the current slow log (all worker processes)."""
+    try:
+        with open(settings.SQL_PROFILE_LOG, "rb") as f:
+            f.seek(0, os.SEEK_END)
+            size = f.tell()
+            f.seek(max(0, size - max_bytes))
+            lines = f.read().splitlines()
+    except FileNotFoundError:
+        return []
+    if size > max_bytes:
+        # the first line was cut in half
+        lines = lines[1:]
+    entries = []
+    for line in lines:
+        try:
+            entries.append(json.loads(line))
+        except ValueError:
+            continue
+    return entries
@@ -0,0 +1,88 @@
+import gzip
+import os
+import re
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+
+try:
+    import brotli
+except ImportError:  # .br variants are skipped without the brotli package
+    brotli = None
+
+# Precompressed variants are written next to each hashed file, and only
+# kept when they are actually smaller.
+COMPRESSIBLE = (".css", ".js", ".svg", ".txt", ".json", ".map", ".html")
+ENCODINGS = {"br": ".br", "gzip": ".gz"}
+
+_CSS_TOKENS = re.compile(
+    r"""("(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*')"""  # strings: kept as is
+    r"|(/\*.*?\*/)"                               # comments: dropped
+    r"|\s*([{};,])\s*"                            # punctuation: no padding
+    r"|(\s+)",                                    # other whitespace: one space
+    re.S,
+)
+
+
+def minify_css(text):
+    def replace(m):
+        string, comment, punct, space = m.groups()
+        if string is not None:
+            return string
+        if comment is not None:
+            return ""
+        if punct is not None:
+            return punct
+        return " "
+    return _CSS_TOKENS.sub(replace, text).strip()
+
+
+# JavaScript is left as written: a safe minifier needs a real tokenizer
+# (regex literals, ASI, template literals), and gzip/brotli take most of
+# what it would save.
+MINIFIERS = {".css": minify_css}
+
+
+def compress(data, encoding):
+    if encoding == "gzip":
+        # mtime=0 keeps the output identical between builds
+        return gzip.compress(data, compresslevel=9, mtime=0)
+    if encoding == "br" and brotli is not None:
+        return brotli.compress(data, quality=11)
+    return None
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """collectstatic writes content-hashed files (CSS minified) plus .gz/.br variants.
+
+    Unhashed CSS copies are minified too, so both names serve the same bytes.
+    """
+
+    def _save(self, name, content):
+        stem, ext = os.path.splitext(name)
+        minify = MINIFIERS.get(ext)
+        if minify and not stem.endswith(".min"):
+            # post_process hands over files it has already read for hashing
+            content.seek(0)
+            text = content.read().decode("utf-8")
+            content = ContentFile(minify(text).encode("utf-8"))
+        return super()._save(name, content)
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+
+        for hashed in sorted(set(self.hashed_files.values())):
+            if not hashed.endswith(COMPRESSIBLE):
+                continue
+            with self.open(hashed) as f:
+                data = f.read()
+            for encoding, suffix in ENCODINGS.items():
+                compressed = compress(data, encoding)
+                if compressed is None or len(compressed) >= len(data):
+                    continue
+                if self.exists(hashed + suffix):
+                    self.delete(hashed + suffix)
+                super()._save(hashed + suffix, ContentFile(compressed))
+                yield hashed + suffix, hashed + suffix, True
@@ -0,0 +1,239 @@
+import hashlib
+import os
+import posixpath
+import re
+import tempfile
+import time
+
+from django.apps import apps
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.db import transaction
+from django.db.models import Count, F
+from django.db.models.signals import post_delete, post_init, post_save
+
+# (model, field) pairs whose files live in the content-addressed store
+MEDIA_FIELDS = [
+    ("books.Book", "cover_image"),
+    ("users.Profile", "avatar"),
+]
+
+HASHED_FOLDERS = {"book_covers", "profiles"}
+
+# seconds an unreferenced blob file is left alone: its row may still commit
+ORPHAN_MIN_AGE = 24 * 60 * 60
+
+BLOB_NAME_RE = re.compile(r"^[\w-]+/([0-9a-f]{2})/\1[0-9a-f]{62}(\.\w+)?$")
+
+
+def is_hashed_name(name):
+    """Whether a file saved under ``name`` goes into the content-addressed store."""
+    parts = name.split("/")
+    return len(parts) > 1 and parts[0] in HASHED_FOLDERS and "thumbs" not in parts
+
+
+def is_blob_name(name):
+    """Whether ``name`` already is a ``<folder>/<h[:2]>/<sha256><ext>`` blob."""
+    return bool(BLOB_NAME_RE.match(name))
+
+
+def media_fields():
+    for label, field_name in MEDIA_FIELDS:
+        yield apps.get_model(label), field_name
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """Stores covers/avatars as ``<folder>/<h[:2]>/<sha256><ext>``.
+
+    Identical uploads share one file. References are counted on the
+    matching ``MediaBlob`` by the rows that point at it (see
+    ``track_media_field``), inside their own transactions, so a save that
+    rolls back leaves no count behind; ``release`` drops one and deletes
+    the file (and its thumbnails) once nothing points at it. The file of
+    a rolled-back save stays on disk until ``migrate_media
+    --delete-unreferenced`` sweeps it.
+    """
+
+    content_addressed = True
+
+    def get_available_name(self, name, max_length=None):
+        if is_hashed_name(name):
+            # the real name is decided from the content in _save
+            return name
+        return super().get_available_name(name, max_length)
+
+    def _save(self, name, content):
+        if not is_hashed_name(name):
+            return super()._save(name, content)
+
+        folder = name.split("/", 1)[0]
+        ext = posixpath.splitext(name)[1].lower()
+        directory = self.path(folder)
+        os.makedirs(directory, exist_ok=True)
+
+        # hash while writing so large uploads are never held in memory
+        digest = hashlib.sha256()
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as out:
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    out.write(chunk)
+
+            h = digest.hexdigest()
+            final = posixpath.join(folder, h[:2], h + ext)
+            full_path = self.path(final)
+
+            if os.path.exists(full_path):
+                os.remove(tmp_path)
+                # in use again: not an orphan for unreferenced_files()
+                os.utime(full_path)
+            else:
+                os.makedirs(os.path.dirname(full_path), exist_ok=True)
+                os.replace(tmp_path, full_path)
+                if self.file_permissions_mode is not None:
+                    os.chmod(full_path, self.file_permissions_mode)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        return final
+
+
+def add_reference(name, count=1):
+    from .models import MediaBlob
+
+    if not MediaBlob.objects.filter(name=name).update(refcount=F("refcount") + count):
+        blob, created = MediaBlob.objects.get_or_create(
+            name=name, defaults={"refcount": count}
+        )
+        if not created:
+            MediaBlob.objects.filter(pk=blob.pk).update(refcount=F("refcount") + count)
+
+
+def release(name, storage=None, count=1):
+    """Drop references to ``name`` and garbage-collect it when unreferenced."""
+    from .images import forget_variants, variant_name, variant_sizes
+    from .models import MediaBlob
+
+    storage = storage or default_storage
+    if not name or not getattr(storage, "content_addressed", False):
+        return False
+
+    with transaction.atomic():
+        MediaBlob.objects.filter(name=name).update(refcount=F("refcount") - count)
+        deleted, _ = MediaBlob.objects.filter(name=name, refcount__lte=0).delete()
+
+    if not deleted:
+        return False
+
+    def _remove():
+        forget_variants(name)
+        storage.delete(name)
+        for width, _ in variant_sizes(name):
+            for ext in ("webp", "jpg"):
+                storage.delete(variant_name(name, width, ext))
+
+    transaction.on_commit(_remove)
+    return True
+
+
+def repoint(old, new, storage=None):
+    """Move every row from ``old`` to ``new`` after a file was rewritten."""
+    moved = 0
+    for model, field_name in media_fields():
+        moved += model.objects.filter(**{field_name: old}).update(**{field_name: new})
+    if moved:
+        # queryset updates send no signals: move the references by hand
+        add_reference(new, moved)
+        release(old, storage, count=moved)
+
+
+def rebuild_refcounts():
+    """Recount references from the model rows (used after migrations)."""
+    from .models import MediaBlob
+
+    counts = {}
+    for model, field_name in media_fields():
+        rows = (
+            model.objects.exclude(**{field_name: ""})
+            .exclude(**{f"{field_name}__isnull": True})
+            .values(field_name)
+            .annotate(n=Count("pk"))
+        )
+        for row in rows:
+            name = row[field_name]
+            if is_blob_name(name):
+                counts[name] = counts.get(name, 0) + row["n"]
+
+    with transaction.atomic():
+        existing = {b.name: b for b in MediaBlob.objects.all()}
+        to_update = []
+        for name, blob in existing.items():
+            blob.refcount = counts.pop(name, 0)
+            to_update.append(blob)
+        MediaBlob.objects.bulk_update(to_update, ["refcount"], batch_size=500)
+        MediaBlob.objects.bulk_create(
+            [MediaBlob(name=n, refcount=c) for n, c in counts.items()],
+            batch_size=500,
+        )
+
+    return MediaBlob.objects.filter(refcount__lte=0).values_list("name", flat=True)
+
+
+def unreferenced_files(storage=None, min_age=ORPHAN_MIN_AGE):
+    """Blob files no row references, last written over ``min_age`` seconds ago.
+
+    Left behind by saves whose transaction rolled back; the age keeps
+    uploads whose row is not committed yet off the list.
+    """
+    from .models import MediaBlob
+
+    storage = storage or default_storage
+    referenced = set(MediaBlob.objects.filter(refcount__gt=0).values_list("name", flat=True))
+    cutoff = time.time() - min_age
+    for folder in sorted(HASHED_FOLDERS):
+        for dirpath, dirnames, filenames in os.walk(storage.path(folder)):
+            dirnames[:] = [d for d in dirnames if d != "thumbs"]
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                name = os.path.relpath(path, storage.location).replace(os.sep, "/")
+                if is_blob_name(name) and name not in referenced and os.path.getmtime(path) < cutoff:
+                    yield name
+
+
+# ==========================
+# Reference tracking on models
+# ==========================
+
+def track_media_field(model, field_name):
+    """Release a model's old file when it is replaced, cleared or deleted."""
+    attname = model._meta.get_field(field_name).attname
+    key = f"_original_{attname}"
+
+    def _name(instance):
+        # only look at loaded values; deferred fields would cost a query
+        value = instance.__dict__.get(attname)
+        return getattr(value, "name", value) or ""
+
+    def remember(sender, instance, **kwargs):
+        instance.__dict__[key] = _name(instance)
+
+    def on_save(sender, instance, **kwargs):
+        old = instance.__dict__.get(key, "")
+        new = _name(instance)
+        if new != old:
+            # in the row's transaction: rolled back together with it
+            if new and is_blob_name(new):
+                add_reference(new)
+            if old:
+                release(old)
+        instance.__dict__[key] = new
+
+    def on_delete(sender, instance, **kwargs):
+        release(_name(instance))
+
+    uid = f"media-{model._meta.label}-{field_name}"
+    post_init.connect(remember, sender=model, weak=False, dispatch_uid=uid)
+    post_save.connect(on_save, sender=model, weak=False, dispatch_uid=uid)
+    post_delete.connect(on_delete, sender=model, weak=False, dispatch_uid=uid)
@@ -0,0 +1,78 @@
+import logging
+from itertools import chain
+
+from django.conf import settings
+from django.http import HttpResponse, StreamingHttpResponse
+from django.middleware.csrf import get_token
+from django.template import RequestContext
+from django.template.loader import get_template, render_to_string
+from django.utils.crypto import get_random_string
+from django.utils.safestring import mark_safe
+
+# List pages render in three parts: everything before {{ rows }} (sent
+# with the first chunk of rows), the rows, rendered from a server-side
+# cursor and sent CHUNK_SIZE at a time, and everything after. Each row template gets its
+# row as ``row_name``, and is rendered once with it set to None when the
+# list is empty, which is where the "nothing here" markup lives.
+CHUNK_SIZE = 100
+
+logger = logging.getLogger(__name__)
+
+
+def _rows(request, context, rows, row_name, row_template, chunk_size):
+    template = get_template(row_template).template
+    ctx = RequestContext(request, context)
+    # run the context processors once, not once per row
+    with ctx.bind_template(template):
+        buffer, empty = [], True
+        for obj in rows:
+            empty = False
+            with ctx.push(**{row_name: obj}):
+                buffer.append(template.render(ctx))
+            if len(buffer) >= chunk_size:
+                yield "".join(buffer)
+                buffer = []
+        if empty:
+            with ctx.push(**{row_name: None}):
+                buffer.append(template.render(ctx))
+        if buffer:
+            yield "".join(buffer)
+
+
+def _logged(request, body):
+    # the 200 and the head are already on the wire: the status cannot change.
+    # Log the error and let it propagate, so the server aborts the response
+    # (no final chunk) rather than end a truncated page as if it were whole.
+    try:
+        yield from body
+    except Exception:
+        logger.exception("Error while streaming %s", request.path)
+        raise
+
+
+def stream_render(request, template_name, context, *, rows, row_name, row_template,
+                  chunk_size=CHUNK_SIZE):
+    """Render a list page, streaming ``rows`` (a queryset) into its ``{{ rows }}``.
+
+    With STREAM_LIST_PAGES off the whole queryset is loaded and the page
+    built in memory, like render() does.
+
+    The query and the first chunk of rows run before the response is
+    returned, so a broken query or row template is an ordinary 500. An
+    error in a later chunk is logged and aborts the stream.
+    """
+    marker = f"<!--rows:{get_random_string(16)}-->"
+    page = render_to_string(template_name, {**context, "rows": mark_safe(marker)}, request)
+    head, tail = page.split(marker, 1)
+
+    if not getattr(settings, "STREAM_LIST_PAGES", True):
+        body = _rows(request, context, rows, row_name, row_template, chunk_size)
+        return HttpResponse(head + "".join(body) + tail)
+
+    # rows render after the middleware has run: set the CSRF cookie now for
+    # their forms, and keep the database the router picked for this view
+    get_token(request)
+    rows = rows.using(rows.db).iterator(chunk_size=chunk_size)
+    body = _rows(request, context, rows, row_name, row_template, chunk_size)
+    first = next(body, "")
+    return StreamingHttpResponse(chain([head, first], _logged(request, body), [tail]))
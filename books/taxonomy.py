@@ -0,0 +1,120 @@
+import threading
+import time
+
+from django.core.cache import caches
+from django.db import IntegrityError, transaction
+from django.db.models import Case, IntegerField, Value, When
+from . import versions
+
+# Process-wide cache of the Category/Genre tables used by BookForm.
+# Both tables are tiny and change rarely; books/signals.py drops an entry
+# whenever a row is saved or deleted. Each table also has a version in
+# the shared "default" cache, bumped when such a change commits: a
+# worker compares its copy's version at most every CHECK_SECONDS (and
+# whenever a form is given an id it does not know), so rows added through
+# another process show up here too.
+CACHE_ALIAS = "default"
+CHECK_SECONDS = 1
+
+_cache = {}
+_generation = 0
+_lock = threading.Lock()
+
+
+def display_name(name):
+    """How a typed-in name is stored: whitespace collapsed, title case."""
+    return " ".join(name.split()).title()
+
+
+def name_key(name):
+    """Case-insensitive key of ``name``; every spelling display_name() merges shares it."""
+    return " ".join(name.split()).casefold()
+
+
+class Taxonomy:
+
+    def __init__(self, objects, version):
+        self.objects = objects
+        self.version = version
+        # time.monotonic() of the last comparison with the shared version
+        self.checked = time.monotonic()
+        self.choices = [(obj.pk, obj.name) for obj in objects]
+        self.by_id = {str(obj.pk): obj for obj in objects}
+        self.by_name = {}
+        for obj in objects:
+            self.by_name.setdefault(name_key(obj.name), obj)
+
+    def lookup(self, name):
+        """Existing row matching ``name`` case-insensitively (never "Others")."""
+        obj = self.by_name.get(name_key(name))
+        if obj is None or obj.name == "Others":
+            return None
+        return obj
+
+
+def ordered(model):
+    # "Others" always goes last
+    return model.objects.annotate(
+        is_other=Case(
+            When(name="Others", then=Value(1)),
+            default=Value(0),
+            output_field=IntegerField(),
+        )
+    ).order_by("is_other", "name")
+
+
+def _version_key(model):
+    return f"taxonomy:{model._meta.label_lower}"
+
+
+def get_taxonomy(model, fresh=False):
+    """The cached rows of ``model``; ``fresh`` checks the shared version now."""
+    taxonomy = _cache.get(model)
+    if taxonomy is not None and not fresh and time.monotonic() - taxonomy.checked < CHECK_SECONDS:
+        return taxonomy
+    version = versions.get(caches[CACHE_ALIAS], _version_key(model))
+    if taxonomy is not None and taxonomy.version == version:
+        taxonomy.checked = time.monotonic()
+        return taxonomy
+    generation = _generation
+    taxonomy = Taxonomy(list(ordered(model)), version)
+    with _lock:
+        # don't store a list that was invalidated while we were loading it
+        if _generation == generation:
+            _cache[model] = taxonomy
+    return taxonomy
+
+
+def invalidate(*models):
+    """Drop the rows of ``models`` (all cached, if none) here now and elsewhere on commit."""
+    global _generation
+    with _lock:
+        _generation += 1
+        if not models:
+            models = list(_cache)
+            _cache.clear()
+        for model in models:
+            _cache.pop(model, None)
+    # other processes reload once the change is visible to them
+    keys = [_version_key(model) for model in models]
+    transaction.on_commit(lambda: versions.bump(caches[CACHE_ALIAS], *keys))
+
+
+def get_or_create(model, name):
+    """Row for ``name`` (matched case-insensitively), created if missing.
+
+    Safe under concurrent uploads: the case-insensitive unique constraint
+    rejects the losing insert and we read the winner's row instead.
+    """
+    name = display_name(name)
+    obj = get_taxonomy(model).by_name.get(name_key(name))
+    if obj is not None:
+        return obj
+    try:
+        with transaction.atomic():
+            return model.objects.create(name=name)
+    except IntegrityError:
+        # SQLite's LOWER() in the constraint and its LIKE behind iexact
+        # fold the same (ASCII) letters, so this finds the row it clashed
+        # with; Python's lower() would not for a name like "Écrits"
+        return model.objects.get(name__iexact=name)
@@ -0,0 +1,41 @@
+from django import template
+from .. import cards
+
+register = template.Library()
+
+
+class CardCacheNode(template.Node):
+
+    def __init__(self, nodelist, book, variant):
+        self.nodelist = nodelist
+        self.book = book
+        self.variant = variant
+
+    def render(self, context):
+        book = self.book.resolve(context)
+        key = cards.card_key(book, self.variant.resolve(context))
+        cache = cards.get_cache()
+
+        html = cache.get(key)
+        cards.count(html is not None)
+        if html is None:
+            html = self.nodelist.render(context)
+            cache.set(key, html)
+        return html
+
+
+@register.tag
+def cardcache(parser, token):
+    """Cache the enclosed card markup per book version.
+
+        {% cardcache book "explore" %} ... {% endcardcache %}
+
+    The block must only depend on the book itself: anything per user or
+    per request (csrf_token, request.user) belongs outside it.
+    """
+    bits = token.split_contents()
+    if len(bits) != 3:
+        raise template.TemplateSyntaxError(f"'{bits[0]}' takes a book and a card name")
+    nodelist = parser.parse(("endcardcache",))
+    parser.delete_first_token()
+    return CardCacheNode(nodelist, parser.compile_filter(bits[1]), parser.compile_filter(bits[2]))
@@ -0,0 +1,23 @@
+from django import template
+from django.core.files.storage import default_storage
+from ..images import variant_name, variant_sizes, variants_ready
+
+register = template.Library()
+
+
+@register.simple_tag
+def srcset(image, ext="jpg"):
+    """``srcset`` value listing the processed thumbnails of ``image``.
+
+    Empty until the worker has written the variants, so the browser
+    falls back to the ``src`` original.
+    """
+    if not image:
+        return ""
+    name = image.name
+    if not variants_ready(name):
+        return ""
+    return ", ".join(
+        f"{default_storage.url(variant_name(name, width, ext))} {width}w"
+        for width, _ in variant_sizes(name)
+    )
@@ -1,3 +1,923 @@
-from django.test import TestCase
+import csv
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+from contextlib import ExitStack
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.files.base import ContentFile
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management import call_command
+from django.core.cache import caches
+from django.db import IntegrityError, connection, connections, router, transaction
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.template import Context, Template
+from django.template.loader import get_template
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from users import leaderboard, sessions
+from users.models import PointsTransaction, UserPoints
+from . import cards, images, ratelimit, routers, sqlite, sqlprofile, storage, streaming, taxonomy, utils, versions
+from .images import variant_name
+from .media import serve_media
+from .middleware import STICKY_COOKIE, ReplicaMiddleware, SQLProfileMiddleware
+from .forms import TaxonomyChoiceField
+from .models import Book, Category, ExchangeRequest, Genre, Inventory, MediaBlob
+
+
+def make_book(owner, slug="book", **kwargs):
+    category, _ = Category.objects.get_or_create(name="Fiction")
+    genre, _ = Genre.objects.get_or_create(name="Drama")
+    fields = {
+        "title": "A Book", "author": "Someone", "price": 10, "location": "Pune",
+        "language": "English", "condition": "good", "category": category, "genre": genre,
+        **kwargs,
+    }
+    book = Book.objects.create(owner=owner, slug=slug, **fields)
+    Inventory.objects.create(book=book, location=book.location)
+    return book
+
+
+class DirtyFieldsTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user("owner")
+        self.book = make_book(self.owner, description="old")
+
+    def test_unchanged_save_writes_nothing(self):
+        book = Book.objects.get(pk=self.book.pk)
+        with CaptureQueriesContext(connection) as ctx:
+            book.save()
+        self.assertEqual(len(ctx.captured_queries), 0)
+
+    def test_only_changed_columns_are_written(self):
+        book = Book.objects.get(pk=self.book.pk)
+        book.title = "New title"
+        self.assertEqual(book.get_dirty_fields(), ["title"])
+        book.save()
+        self.assertEqual(Book.objects.get(pk=book.pk).title, "New title")
+
+    def test_assigning_a_deferred_field_is_saved(self):
+        book = Book.objects.only("title").get(pk=self.book.pk)
+        book.description = "new"
+        self.assertEqual(book.get_dirty_fields(), ["description"])
+        book.save()
+        self.assertEqual(Book.objects.get(pk=book.pk).description, "new")
+
+    def test_loading_a_deferred_field_keeps_other_changes(self):
+        book = Book.objects.only("title").get(pk=self.book.pk)
+        book.title = "New title"
+        self.assertEqual(book.description, "old")
+        self.assertEqual(book.get_dirty_fields(), ["title"])
+
+    def test_refresh_from_db_resets_the_snapshot(self):
+        book = Book.objects.get(pk=self.book.pk)
+        Book.objects.filter(pk=book.pk).update(location="Mumbai")
+        book.refresh_from_db()
+        self.assertEqual(book.get_dirty_fields(), [])
+
+    def test_refresh_of_some_fields_keeps_other_changes(self):
+        book = Book.objects.get(pk=self.book.pk)
+        book.title = "New title"
+        book.refresh_from_db(fields=["location"])
+        self.assertEqual(book.get_dirty_fields(), ["title"])
+
+    def test_refreshed_exchange_does_not_rerun_status_side_effects(self):
+        requester = User.objects.create_user("requester")
+        exchange = ExchangeRequest.objects.create(requester=requester, owner=self.owner, book=self.book)
+        exchange.status = "completed"
+        exchange.save()
+        entries = PointsTransaction.objects.count()
+
+        exchange.refresh_from_db()
+        Inventory.objects.filter(book=self.book).update(status="available")
+        exchange.save()
+        self.assertEqual(PointsTransaction.objects.count(), entries)
+        self.assertEqual(Inventory.objects.get(book=self.book).status, "available")
+
+
+class SlugTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user("owner")
+
+    def add(self, *slugs):
+        for slug in slugs:
+            make_book(self.owner, slug=slug)
+
+    def test_first_slug_is_the_title(self):
+        self.assertEqual(utils.unique_slug("It"), "it")
+
+    def test_suffix_follows_the_highest_taken(self):
+        self.add("it", "it-3")
+        self.assertEqual(utils.unique_slug("It"), "it-4")
+
+    def test_other_titles_sharing_the_prefix_are_not_candidates(self):
+        self.add("it", "it-2", "it-story", "it-2-go", "item")
+        self.assertEqual(
+            sorted(Book.objects.filter(utils._candidates("it")).values_list("slug", flat=True)),
+            ["it", "it-2"],
+        )
+        self.assertEqual(utils.unique_slug("It"), "it-3")
+
+    def test_duplicate_titles_in_a_batch_get_distinct_slugs(self):
+        self.add("it")
+        with self.assertNumQueries(1):
+            slugs = utils.unique_slugs(["It", "Other", "It", "it"])
+        self.assertEqual(slugs, ["it-1", "other", "it-2", "it-3"])
+
+    def new_book(self):
+        template = make_book(self.owner, slug="template")
+        return Book(
+            owner=self.owner, title="It", author=template.author, price=template.price,
+            location=template.location, language=template.language,
+            condition=template.condition, category=template.category, genre=template.genre,
+        )
+
+    def test_save_retries_after_losing_the_race(self):
+        self.add("it")
+        book = self.new_book()
+        # the first allocation was computed before a concurrent upload took "it"
+        with mock.patch("books.utils.unique_slug", side_effect=["it", "it-1"]):
+            utils.save_with_unique_slug(book)
+        self.assertEqual(Book.objects.get(pk=book.pk).slug, "it-1")
+
+    def test_save_gives_up_after_its_retries(self):
+        self.add("it")
+        book = self.new_book()
+        with mock.patch("books.utils.unique_slug", return_value="it") as allocate:
+            with self.assertRaises(IntegrityError):
+                utils.save_with_unique_slug(book)
+        self.assertEqual(allocate.call_count, utils.SLUG_RETRIES)
+
+
+class PointsTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user("owner")
+        self.requester = User.objects.create_user("requester")
+        self.exchange = ExchangeRequest.objects.create(
+            requester=self.requester, owner=self.owner, book=make_book(self.owner), status="approved",
+        )
+        self.addCleanup(sessions.flush_pending)
+        self.addCleanup(leaderboard.invalidate)
+
+    def balances(self):
+        return {
+            user.username: UserPoints.objects.get(user=user).balance
+            for user in (self.owner, self.requester)
+        }
+
+    def confirm(self, user):
+        self.client.force_login(user)
+        self.client.get(f"/books/confirm/{self.exchange.pk}/")
+
+    def test_confirmed_by_both_pays_each_party_once(self):
+        self.confirm(self.owner)
+        self.assertEqual(self.balances(), {"owner": 0, "requester": 0})
+        self.confirm(self.requester)
+        self.assertEqual(self.balances(), {"owner": 10, "requester": 10})
+        self.assertEqual(UserPoints.objects.get(user=self.owner).completed_exchanges, 1)
+        # a late third click finds the deal no longer approved
+        self.confirm(self.owner)
+        self.assertEqual(PointsTransaction.objects.count(), 2)
+
+    def test_resaving_a_completed_exchange_pays_nothing(self):
+        self.exchange.status = "completed"
+        self.exchange.save()
+        ExchangeRequest.objects.get(pk=self.exchange.pk).save()
+        # a stale copy completing it again hits the same idempotency keys
+        stale = ExchangeRequest.objects.get(pk=self.exchange.pk)
+        stale.status = "approved"
+        stale.save()
+        stale.status = "completed"
+        stale.save()
+        self.assertEqual(self.balances(), {"owner": 10, "requester": 10})
+        self.assertEqual(PointsTransaction.objects.filter(amount__gt=0).count(), 2)
+
+    def test_cancelling_an_approved_deal_costs_the_canceller(self):
+        self.client.force_login(self.requester)
+        self.client.post(f"/books/cancel/{self.exchange.pk}/", {"reason": "changed my mind"})
+        self.assertEqual(self.balances(), {"owner": 0, "requester": -5})
+
+    def test_cancelling_a_pending_request_is_free(self):
+        ExchangeRequest.objects.filter(pk=self.exchange.pk).update(status="pending")
+        self.client.force_login(self.requester)
+        self.client.post(f"/books/cancel/{self.exchange.pk}/", {"reason": "changed my mind"})
+        self.assertEqual(ExchangeRequest.objects.get(pk=self.exchange.pk).status, "cancelled")
+        self.assertFalse(PointsTransaction.objects.exists())
+
+    def test_expiry_costs_whoever_had_not_confirmed(self):
+        ExchangeRequest.objects.filter(pk=self.exchange.pk).update(
+            owner_confirmed=True, expires_at=timezone.now() - timedelta(hours=1),
+        )
+        call_command("expire_requests")
+        call_command("expire_requests")
+        self.assertEqual(ExchangeRequest.objects.get(pk=self.exchange.pk).status, "expired")
+        self.assertEqual(self.balances(), {"owner": 0, "requester": -5})
+
+    def test_backfill_is_idempotent(self):
+        # completed before points existed: no ledger entries yet
+        ExchangeRequest.objects.filter(pk=self.exchange.pk).update(status="completed")
+        out = StringIO()
+        call_command("backfill_points", stdout=out)
+        self.assertIn("1 completed exchanges, 2 ledger entries added", out.getvalue())
+        out = StringIO()
+        call_command("backfill_points", stdout=out)
+        self.assertIn("1 completed exchanges, 0 ledger entries added", out.getvalue())
+        self.assertEqual(self.balances(), {"owner": 10, "requester": 10})
+
+
+@override_settings(RATE_LIMITS={"poll": {"user": "2/m", "ip": "3/m"}}, RATE_LIMIT_PATH=None)
+class RateLimitTests(TestCase):
+    def setUp(self):
+        # a fresh private bucket table per test
+        ratelimit.close()
+        self.addCleanup(ratelimit.close)
+        self.alice = User.objects.create_user("alice")
+        self.bob = User.objects.create_user("bob")
+
+    def request(self, user, ip="10.0.0.1", **meta):
+        request = RequestFactory().get("/books/check/", REMOTE_ADDR=ip, **meta)
+        request.user = user
+        return request
+
+    def test_bucket_refuses_once_empty(self):
+        self.assertEqual(ratelimit.check(self.request(self.alice), "poll"), 0)
+        self.assertEqual(ratelimit.check(self.request(self.alice), "poll"), 0)
+        self.assertAlmostEqual(ratelimit.check(self.request(self.alice), "poll"), 30, delta=1)
+
+    def test_bucket_refills_over_its_period(self):
+        # the limiter's clock only: the cache still expires entries in real time
+        start = time.time()
+        with mock.patch("books.ratelimit.time") as clock:
+            clock.time.return_value = start
+            ratelimit.check(self.request(self.alice), "poll")
+            ratelimit.check(self.request(self.alice), "poll")
+            clock.time.return_value = start + 30
+            self.assertEqual(ratelimit.check(self.request(self.alice), "poll"), 0)
+            self.assertGreater(ratelimit.check(self.request(self.alice), "poll"), 0)
+
+    def test_refused_request_costs_nothing_from_other_buckets(self):
+        for n in range(3):
+            ratelimit.check(self.request(AnonymousUser()), "poll")
+        # the IP bucket refuses these; alice's own bucket stays full
+        self.assertGreater(ratelimit.check(self.request(self.alice), "poll"), 0)
+        self.assertGreater(ratelimit.check(self.request(self.alice), "poll"), 0)
+        self.assertEqual(ratelimit.check(self.request(self.alice, ip="10.0.0.2"), "poll"), 0)
+        self.assertEqual(ratelimit.check(self.request(self.alice, ip="10.0.0.2"), "poll"), 0)
+
+    def test_anonymous_requests_share_the_ip_bucket(self):
+        for n in range(3):
+            self.assertEqual(ratelimit.check(self.request(AnonymousUser()), "poll"), 0)
+        self.assertGreater(ratelimit.check(self.request(AnonymousUser()), "poll"), 0)
+        self.assertEqual(ratelimit.check(self.request(AnonymousUser(), ip="10.0.0.2"), "poll"), 0)
+
+    @override_settings(RATE_LIMIT_TRUSTED_PROXIES=1)
+    def test_client_ip_behind_a_proxy(self):
+        request = self.request(None, ip="127.0.0.1", HTTP_X_FORWARDED_FOR="6.6.6.6, 10.0.0.7")
+        self.assertEqual(ratelimit.client_ip(request), "10.0.0.7")
+        self.assertEqual(ratelimit.client_ip(self.request(None, ip="127.0.0.1")), "127.0.0.1")
+
+    def test_client_ip_ignores_forwarded_for_without_proxies(self):
+        request = self.request(None, ip="10.0.0.7", HTTP_X_FORWARDED_FOR="6.6.6.6")
+        self.assertEqual(ratelimit.client_ip(request), "10.0.0.7")
+
+    def test_throttled_view_answers_429(self):
+        self.client.force_login(self.alice)
+        self.addCleanup(sessions.flush_pending)
+        self.client.get("/books/check/")
+        self.client.get("/books/check/")
+        response = self.client.get("/books/check/")
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response["Retry-After"], "30")
+
+    def test_buckets_are_shared_between_processes(self):
+        from multiprocessing import get_context
+
+        path = os.path.join(tempfile.mkdtemp(), "buckets")
+        self.addCleanup(shutil.rmtree, os.path.dirname(path))
+        with override_settings(RATE_LIMIT_PATH=path, RATE_LIMITS={"poll": {"ip": "50/m"}}):
+            with get_context("fork").Pool(4) as pool:
+                granted = sum(pool.map(_take_polls, [20] * 4))
+        # 80 attempts against one 50-token bucket, raced by four processes
+        self.assertEqual(granted, 50)
+
+    def test_idle_slots_are_reused(self):
+        with mock.patch.object(ratelimit, "SLOTS", 1), mock.patch.object(ratelimit, "PROBES", 1):
+            ratelimit.close()
+            self.assertEqual(ratelimit.check(self.request(AnonymousUser()), "poll"), 0)
+            # the one slot is busy: the other address takes it over, starting full
+            for n in range(3):
+                self.assertEqual(ratelimit.check(self.request(AnonymousUser(), ip="10.0.0.2"), "poll"), 0)
+            self.assertGreater(ratelimit.check(self.request(AnonymousUser(), ip="10.0.0.2"), "poll"), 0)
+
+
+def _take_polls(n):
+    return sum(not ratelimit.take("poll", None, "10.0.0.1") for i in range(n))
+
+
+class PageCacheTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user("owner")
+        self.book = make_book(self.owner, slug="first", title="First")
+        self.other = make_book(self.owner, slug="second", title="Second")
+
+    def get(self, book):
+        return self.client.get(f"/books/p/{book.slug}/")
+
+    def test_anonymous_page_is_served_from_the_cache(self):
+        self.assertEqual(self.get(self.book)["X-Page-Cache"], "miss")
+        # no query on any database: the cache is not one either
+        with ExitStack() as stack:
+            captured = [stack.enter_context(CaptureQueriesContext(connections[alias])) for alias in connections]
+            response = self.get(self.book)
+        self.assertEqual([q for c in captured for q in c.captured_queries], [])
+        self.assertEqual(response["X-Page-Cache"], "hit")
+        self.assertIn("Cookie", response["Vary"])
+
+    def test_saving_a_book_retires_only_its_page(self):
+        self.get(self.book)
+        self.get(self.other)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.book.title = "Renamed"
+            self.book.save()
+        response = self.get(self.book)
+        self.assertEqual(response["X-Page-Cache"], "miss")
+        self.assertContains(response, "Renamed")
+        self.assertEqual(self.get(self.other)["X-Page-Cache"], "hit")
+
+    def test_category_change_retires_every_book_page(self):
+        self.get(self.book)
+        with self.captureOnCommitCallbacks(execute=True):
+            Category.objects.create(name="Poetry")
+        self.assertEqual(self.get(self.book)["X-Page-Cache"], "miss")
+        self.assertEqual(self.get(self.other)["X-Page-Cache"], "miss")
+
+    def test_signed_in_visitors_bypass_the_cache(self):
+        self.get(self.book)
+        self.client.force_login(self.owner)
+        self.addCleanup(sessions.flush_pending)
+        self.assertNotIn("X-Page-Cache", self.get(self.book))
+
+
+class VersionTests(SimpleTestCase):
+    def test_version_is_stable_until_bumped(self):
+        cache = caches["default"]
+        version = versions.get(cache, "v")
+        self.assertEqual(versions.get(cache, "v"), version)
+        versions.bump(cache, "v")
+        self.assertNotEqual(versions.get(cache, "v"), version)
+
+    def test_lost_version_starts_a_new_one(self):
+        cache = caches["default"]
+        version = versions.get(cache, "v")
+        cache.delete("v")
+        self.assertNotEqual(versions.get(cache, "v"), version)
+
+
+class TaxonomyTests(TestCase):
+    def setUp(self):
+        taxonomy.invalidate()
+        self.fiction = Category.objects.create(name="Fiction")
+
+    def added_elsewhere(self, name):
+        # another worker's insert and, on its commit, its version bump
+        obj = Category.objects.bulk_create([Category(name=name)])[0]
+        versions.bump(caches["default"], taxonomy._version_key(Category))
+        return obj
+
+    def test_cached_rows_cost_no_queries(self):
+        taxonomy.get_taxonomy(Category)
+        with self.assertNumQueries(0):
+            self.assertEqual(taxonomy.get_taxonomy(Category).lookup("fiction"), self.fiction)
+
+    def test_form_accepts_a_row_added_by_another_worker(self):
+        taxonomy.get_taxonomy(Category)
+        poetry = self.added_elsewhere("Poetry")
+        field = TaxonomyChoiceField(queryset=Category.objects.all())
+        self.assertEqual(field.clean(str(poetry.pk)), poetry)
+
+    def test_copy_is_reloaded_once_the_version_moves(self):
+        taxonomy.get_taxonomy(Category)
+        self.added_elsewhere("Poetry")
+        with mock.patch("books.taxonomy.CHECK_SECONDS", 0):
+            self.assertIsNotNone(taxonomy.get_taxonomy(Category).lookup("poetry"))
+
+    def test_commit_bumps_the_shared_version(self):
+        version = taxonomy.get_taxonomy(Category).version
+        with self.captureOnCommitCallbacks(execute=True):
+            Category.objects.create(name="Poetry")
+        self.assertNotEqual(taxonomy.get_taxonomy(Category, fresh=True).version, version)
+
+    def test_names_are_unique_ignoring_case(self):
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Category.objects.create(name="FICTION")
+
+    def test_get_or_create_matches_existing_names(self):
+        self.assertEqual(taxonomy.get_or_create(Category, "  fiction "), self.fiction)
+        self.assertEqual(Category.objects.count(), 1)
+
+    def test_get_or_create_stores_the_display_name(self):
+        poetry = taxonomy.get_or_create(Category, "  modern   poetry ")
+        self.assertEqual(poetry.name, "Modern Poetry")
+        self.assertEqual(taxonomy.get_or_create(Category, "MODERN POETRY"), poetry)
+
+    def test_get_or_create_after_losing_the_insert_race(self):
+        # another upload created the rows after our copy was loaded
+        taxonomy.get_taxonomy(Category)
+        ecrits, thriller = Category.objects.bulk_create([Category(name="Écrits"), Category(name="thriller")])
+        self.assertEqual(taxonomy.get_or_create(Category, "écrits"), ecrits)
+        self.assertEqual(taxonomy.get_or_create(Category, "Thriller "), thriller)
+
+
+class ImportBooksTests(TestCase):
+    HEADER = ["title", "author", "language", "condition", "location", "price", "category", "genre"]
+
+    def setUp(self):
+        self.owner = User.objects.create_user("owner")
+        self.fiction = Category.objects.create(name="Science Fiction")
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+        self.addCleanup(taxonomy.invalidate)
+
+    def write(self, rows):
+        path = os.path.join(self.dir, "books.csv")
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(self.HEADER)
+            writer.writerows(rows)
+        return path
+
+    def row(self, title, condition="good", category="Science Fiction"):
+        return [title, "Someone", "English", condition, "Pune", "10", category, "Drama"]
+
+    def run_import(self, path, *args):
+        out, err = StringIO(), StringIO()
+        call_command("import_books", path, "--owner", "owner", *args, stdout=out, stderr=err)
+        return out.getvalue(), err.getvalue()
+
+    def test_rows_are_inserted_a_chunk_at_a_time(self):
+        path = self.write([self.row(f"Book {i}") for i in range(5)])
+        with self.captureOnCommitCallbacks(execute=True):
+            out, _ = self.run_import(path, "--chunk-size", "2")
+        self.assertEqual(out.count("rows read"), 3)
+        self.assertEqual(Book.objects.filter(owner=self.owner).count(), 5)
+        self.assertEqual(Inventory.objects.filter(book__owner=self.owner).count(), 5)
+
+    def test_names_are_stored_as_display_names(self):
+        path = self.write([
+            self.row("Dune", category="science  fiction"),
+            self.row("Emma", category=" modern   romance"),
+        ])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.run_import(path)
+        self.assertEqual(Book.objects.get(title="Dune").category, self.fiction)
+        self.assertEqual(
+            sorted(Category.objects.values_list("name", flat=True)), ["Modern Romance", "Science Fiction"]
+        )
+
+    def test_invalid_rows_are_reported_and_skipped(self):
+        path = self.write([self.row("Dune"), self.row("Emma", condition="mint"), self.row("")])
+        with self.captureOnCommitCallbacks(execute=True):
+            out, err = self.run_import(path)
+        self.assertIn("line 3:", err)
+        self.assertIn("line 4:", err)
+        self.assertIn("1 imported, 2 invalid", out)
+        self.assertEqual(list(Book.objects.values_list("title", flat=True)), ["Dune"])
+
+    def test_resume_continues_after_the_last_committed_chunk(self):
+        path = self.write([self.row(f"Book {i}") for i in range(4)])
+        real = utils.unique_slugs
+        calls = []
+
+        def fail_second_chunk(titles):
+            calls.append(titles)
+            if len(calls) == 2:
+                raise RuntimeError("interrupted")
+            return real(titles)
+
+        with mock.patch("books.management.commands.import_books.unique_slugs", side_effect=fail_second_chunk):
+            with self.assertRaises(RuntimeError):
+                self.run_import(path, "--chunk-size", "2")
+        self.assertEqual(Book.objects.count(), 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            out, _ = self.run_import(path, "--chunk-size", "2", "--resume")
+        self.assertIn("Resuming after row 2", out)
+        self.assertEqual(
+            sorted(Book.objects.values_list("title", flat=True)), [f"Book {i}" for i in range(4)]
+        )
+
+
+class CardCacheTests(TestCase):
+    card = Template('{% load book_cards %}{% cardcache book "explore" %}{{ book.title }} / {{ book.category }}{% endcardcache %}')
+
+    def setUp(self):
+        cards.get_cache().clear()
+        taxonomy.invalidate()
+        self.book = make_book(User.objects.create_user("owner"))
+
+    def render(self):
+        book = Book.objects.select_related("category", "inventory").get(pk=self.book.pk)
+        return self.card.render(Context({"book": book}))
+
+    def test_card_is_rendered_once_per_version(self):
+        self.assertEqual(self.render(), "A Book / Fiction")
+        Book.objects.filter(pk=self.book.pk).update(title="Changed behind the key")
+        self.assertEqual(self.render(), "A Book / Fiction")
+        self.book.title = "Renamed"
+        self.book.save()
+        self.assertEqual(self.render(), "Renamed / Fiction")
+
+    def test_category_renamed_by_another_worker(self):
+        self.render()
+        # that worker's update and, on its commit, its version bump
+        Category.objects.filter(pk=self.book.category_id).update(name="Novels")
+        versions.bump(caches["default"], taxonomy._version_key(Category))
+        with mock.patch("books.taxonomy.CHECK_SECONDS", 0):
+            self.assertEqual(self.render(), "A Book / Novels")
+
+
+class PollingViewTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user("owner")
+        requester = User.objects.create_user("requester")
+        self.exchange = ExchangeRequest.objects.create(
+            requester=requester, owner=self.owner, book=make_book(self.owner)
+        )
+        self.client.force_login(self.owner)
+        self.async_client.force_login(self.owner)
+        self.addCleanup(sessions.flush_pending)
+
+    def test_check_notifications(self):
+        self.assertEqual(self.client.get("/books/check/").json(), {"count": 1})
+
+    async def test_exchange_status_under_asgi(self):
+        response = await self.async_client.get(f"/books/exchange-status/{self.exchange.pk}/")
+        self.assertEqual(response.json()["status"], "pending")
+        self.assertEqual(response["X-Content-Type-Options"], "nosniff")
+
+    async def test_polls_need_a_login(self):
+        await self.async_client.alogout()
+        response = await self.async_client.get("/books/check/")
+        self.assertEqual(response.status_code, 302)
+
+
+class StreamRenderTests(TestCase):
+    def setUp(self):
+        owner = User.objects.create_user("owner")
+        for i in range(3):
+            make_book(owner, slug=f"book-{i}", title=f"Book {i}")
+        self.request = RequestFactory().get("/books/")
+        self.request.user = AnonymousUser()
+
+    def render(self, fail_on):
+        def title(book):
+            if book.slug == fail_on:
+                raise RuntimeError("broken row")
+            return book.slug
+
+        patches = ExitStack()
+        self.addCleanup(patches.close)
+        patches.enter_context(mock.patch.object(Book, "row_title", property(title), create=True))
+        patches.enter_context(mock.patch(
+            "books.streaming.render_to_string", lambda name, context, request: f"<ul>{context['rows']}</ul>"
+        ))
+        patches.enter_context(mock.patch(
+            "books.streaming.get_template", return_value=mock.Mock(template=Template("<li>{{ row.row_title }}</li>"))
+        ))
+        return streaming.stream_render(
+            self.request, "page.html", {}, rows=Book.objects.order_by("slug"),
+            row_name="row", row_template="row.html", chunk_size=1,
+        )
+
+    def test_rows_are_streamed_between_head_and_tail(self):
+        response = self.render(fail_on=None)
+        self.assertEqual(
+            b"".join(response.streaming_content),
+            b"<ul><li>book-0</li><li>book-1</li><li>book-2</li></ul>",
+        )
+
+    def test_error_in_the_first_chunk_raises_from_the_view(self):
+        with self.assertRaises(RuntimeError):
+            self.render(fail_on="book-0")
+
+    def test_exchanged_row_without_covers_uses_the_placeholder(self):
+        owner, requester = Book.objects.get(slug="book-0").owner, User.objects.create_user("requester")
+        exchange = ExchangeRequest.objects.create(
+            requester=requester, owner=owner, book=Book.objects.get(slug="book-0"),
+            expected_book=make_book(requester, slug="theirs"), status="completed",
+        )
+        html = get_template("books/rows/exchanged.html").render({"r": exchange, "user": owner})
+        self.assertEqual(html.count('src="/media/images/book-cover.png"'), 2)
+
+    def test_error_mid_stream_is_logged_and_aborts_the_response(self):
+        response = self.render(fail_on="book-1")
+        chunks = iter(response.streaming_content)
+        self.assertEqual(next(chunks), b"<ul>")
+        self.assertEqual(next(chunks), b"<li>book-0</li>")
+        with self.assertLogs("books.streaming", "ERROR"), self.assertRaises(RuntimeError):
+            list(chunks)
+
+
+@mock.patch("books.routers.has_replica", return_value=True)
+class ReplicaRoutingTests(TransactionTestCase):
+    # TestCase wraps each test in a transaction, and reads inside one never
+    # leave the primary
+
+    def serve(self, view, cookies=None):
+        request = RequestFactory().get("/books/")
+        request.COOKIES.update(cookies or {})
+
+        def get_response(request):
+            middleware.process_view(request, view, (), {})
+            return view(request)
+
+        middleware = ReplicaMiddleware(get_response)
+        return middleware(request)
+
+    @staticmethod
+    def reads(*, write=False, atomic=False):
+        def view(request):
+            used = [router.db_for_read(Book)]
+            if write:
+                Category.objects.create(name="Poetry")
+            with transaction.atomic() if atomic else ExitStack():
+                used.append(router.db_for_read(Book))
+            return HttpResponse(",".join(used))
+        return view
+
+    def test_replica_reads_view_reads_from_the_replica(self, has_replica):
+        response = self.serve(routers.replica_reads(self.reads()))
+        self.assertEqual(response.content, b"replica,replica")
+        self.assertNotIn(STICKY_COOKIE, response.cookies)
+
+    def test_other_views_read_from_the_primary(self, has_replica):
+        self.assertEqual(self.serve(self.reads()).content, b"default,default")
+
+    def test_reads_after_a_write_stay_on_the_primary_and_pin(self, has_replica):
+        response = self.serve(routers.replica_reads(self.reads(write=True)))
+        self.assertEqual(response.content, b"replica,default")
+        self.assertEqual(response.cookies[STICKY_COOKIE]["max-age"], settings.REPLICA_STICKY_SECONDS)
+
+    def test_pinned_browser_reads_from_the_primary(self, has_replica):
+        response = self.serve(routers.replica_reads(self.reads()), cookies={STICKY_COOKIE: "1"})
+        self.assertEqual(response.content, b"default,default")
+
+    def test_reads_inside_atomic_use_the_primary(self, has_replica):
+        response = self.serve(routers.replica_reads(self.reads(atomic=True)))
+        self.assertEqual(response.content, b"replica,default")
+
+    def test_state_does_not_outlive_the_request(self, has_replica):
+        self.serve(routers.replica_reads(self.reads(write=True)))
+        self.assertEqual(router.db_for_read(Book), "default")
+        self.assertIsNone(routers._state.get())
+
+
+class HybridMiddlewareTests(SimpleTestCase):
+
+    def adapted(self, handler_class):
+        with override_settings(DEBUG=True), self.assertLogs("django.request", "DEBUG") as logs:
+            handler_class()
+            logging.getLogger("django.request").debug("loaded")
+        return [r.getMessage() for r in logs.records if "adapted" in r.getMessage()]
+
+    def test_asgi_stack_runs_without_threads(self):
+        self.assertEqual(self.adapted(ASGIHandler), [])
+
+    def test_wsgi_stack_runs_without_an_event_loop(self):
+        self.assertEqual(self.adapted(WSGIHandler), [])
+
+
+class MediaStoreTests(TestCase):
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        self.enterContext(override_settings(MEDIA_ROOT=media))
+        self.owner = User.objects.create_user("owner")
+
+    def upload(self, book, data=b"cover bytes"):
+        book.cover_image.save("cover.jpg", ContentFile(data), save=False)
+        book.save()
+        return book.cover_image.name
+
+    def refcount(self, name):
+        return MediaBlob.objects.get(name=name).refcount
+
+    def test_identical_uploads_share_one_counted_blob(self):
+        name = self.upload(make_book(self.owner, slug="one"))
+        self.assertEqual(self.upload(make_book(self.owner, slug="two")), name)
+        self.assertEqual(self.refcount(name), 2)
+
+    def test_replacing_a_cover_moves_the_reference(self):
+        book = make_book(self.owner)
+        old = self.upload(book)
+        new = self.upload(book, b"other bytes")
+        self.assertEqual(self.refcount(new), 1)
+        self.assertFalse(MediaBlob.objects.filter(name=old).exists())
+
+    def test_rolled_back_save_leaves_no_reference(self):
+        book = make_book(self.owner)
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            name = self.upload(book)
+            raise RuntimeError
+        self.assertFalse(MediaBlob.objects.filter(name=name).exists())
+        self.assertEqual(list(storage.unreferenced_files(min_age=-1)), [name])
+
+
+@override_settings(SQL_PROFILE_SAMPLE_RATE=1, SQL_PROFILE_SLOW_MS=0)
+class SQLProfileTests(TestCase):
+
+    def setUp(self):
+        patcher = mock.patch.object(sqlprofile, "logger")
+        self.logger = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def profile(self, response):
+        request = RequestFactory().get("/books/")
+        return SQLProfileMiddleware(lambda request: response)(request)
+
+    def logged(self):
+        return [json.loads(call.args[0]) for call in self.logger.info.call_args_list]
+
+    def rows(self):
+        yield str(Book.objects.count()).encode()
+        yield str(Category.objects.count()).encode()
+
+    def test_plain_response_is_logged_at_once(self):
+        self.profile(HttpResponse("ok"))
+        self.assertEqual(len(self.logged()), 1)
+
+    def test_streamed_queries_are_counted(self):
+        response = self.profile(StreamingHttpResponse(self.rows()))
+        self.assertFalse(self.logged())
+        b"".join(response)
+        response.close()
+        [entry] = self.logged()
+        self.assertEqual(entry["queries"], 2)
+
+    def test_closed_before_streaming_is_logged(self):
+        response = self.profile(StreamingHttpResponse(self.rows()))
+        response.close()
+        [entry] = self.logged()
+        self.assertEqual(entry["queries"], 0)
+
+
+@override_settings(SQLITE_TUNING=True, SQLITE_PRAGMAS={"busy_timeout": 5000, "journal_mode": "WAL", "synchronous": "NORMAL"})
+class SQLiteTuningTests(SimpleTestCase):
+
+    def pragmas(self, alias):
+        connection = mock.MagicMock(vendor="sqlite", alias=alias)
+        sqlite.configure(connection)
+        execute = connection.cursor.return_value.__enter__.return_value.execute
+        return [call.args[0] for call in execute.call_args_list]
+
+    def test_primary_gets_every_pragma(self):
+        self.assertEqual(self.pragmas("default"), [
+            "PRAGMA busy_timeout = 5000", "PRAGMA journal_mode = WAL", "PRAGMA synchronous = NORMAL",
+        ])
+
+    def test_replica_skips_write_pragmas(self):
+        self.assertEqual(self.pragmas("replica"), ["PRAGMA busy_timeout = 5000"])
+
+    @override_settings(SQLITE_TUNING=False)
+    def test_nothing_runs_untuned(self):
+        self.assertEqual(self.pragmas("default"), [])
+
+
+class ServeMediaTests(SimpleTestCase):
+    data = b"0123456789"
+
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        self.enterContext(override_settings(MEDIA_ROOT=self.media, MEDIA_OFFLOAD=None))
+        digest = hashlib.sha256(self.data).hexdigest()
+        self.name = f"book_covers/{digest[:2]}/{digest}.jpg"
+        self.write(self.name)
+        self.etag = f'"{digest}"'
+
+    def write(self, name):
+        path = os.path.join(self.media, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(self.data)
+
+    def get(self, name, **headers):
+        response = serve_media(RequestFactory().get(f"/media/{name}", **headers), name)
+        if response.streaming:
+            response.content_bytes = b"".join(response.streaming_content)
+            response.close()
+        return response
+
+    def test_whole_file(self):
+        response = self.get(self.name)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content_bytes, self.data)
+        self.assertEqual(response["Content-Length"], "10")
+        self.assertEqual(response["ETag"], self.etag)
+        self.assertEqual(response["Accept-Ranges"], "bytes")
+        self.assertEqual(response["Cache-Control"], "public, max-age=31536000, immutable")
+
+    def test_matching_etag_is_not_modified(self):
+        response = self.get(self.name, HTTP_IF_NONE_MATCH=self.etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], self.etag)
+
+    def test_byte_range(self):
+        response = self.get(self.name, HTTP_RANGE="bytes=2-5")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response.content_bytes, b"2345")
+        self.assertEqual(response["Content-Range"], "bytes 2-5/10")
+        self.assertEqual(response["Content-Length"], "4")
+
+    def test_suffix_and_open_ranges(self):
+        self.assertEqual(self.get(self.name, HTTP_RANGE="bytes=-3").content_bytes, b"789")
+        self.assertEqual(self.get(self.name, HTTP_RANGE="bytes=7-").content_bytes, b"789")
+        self.assertEqual(self.get(self.name, HTTP_RANGE="bytes=8-99").content_bytes, b"89")
+
+    def test_unsatisfiable_range(self):
+        response = self.get(self.name, HTTP_RANGE="bytes=10-")
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response["Content-Range"], "bytes */10")
+
+    def test_stale_if_range_sends_the_whole_file(self):
+        response = self.get(self.name, HTTP_RANGE="bytes=2-5", HTTP_IF_RANGE='"old"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content_bytes, self.data)
+
+    def test_thumbnails_are_immutable_too(self):
+        thumb = variant_name(self.name, 200, "webp")
+        self.write(thumb)
+        self.assertEqual(self.get(thumb)["Cache-Control"], "public, max-age=31536000, immutable")
+
+    def test_other_files_are_revalidated(self):
+        self.write("images/book-cover.png")
+        self.assertEqual(self.get("images/book-cover.png")["Cache-Control"], "public, no-cache")
+
+    def test_paths_outside_media_root(self):
+        with self.assertRaises(Http404):
+            self.get("../settings.py")
+
+
+class CoverSrcsetTests(TestCase):
+    name = "book_covers/ab/" + "ab" * 32 + ".jpg"
+
+    def setUp(self):
+        self.owner = User.objects.create_user("owner", password="pw")
+        make_book(self.owner, cover_image=self.name)
+        patcher = mock.patch("books.templatetags.book_images.variants_ready", return_value=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def assertSrcset(self, response):
+        for ext in ("webp", "jpg"):
+            self.assertContains(response, f"{variant_name(self.name, 400, ext)} 400w")
+
+    def test_public_page(self):
+        self.assertSrcset(self.client.get(reverse("book_public", args=["book"])))
+
+    def test_detail_and_uploaded_pages(self):
+        self.addCleanup(sessions.flush_pending)
+        self.client.login(username="owner", password="pw")
+        self.assertSrcset(self.client.get(reverse("book_detail", args=["book"])))
+        self.assertSrcset(self.client.get(reverse("my_uploaded_books")))
+
+
+class VariantsReadyTests(SimpleTestCase):
+    name = "book_covers/ab/" + "ab" * 32 + ".jpg"
+
+    def setUp(self):
+        patcher = mock.patch("books.images.default_storage")
+        self.storage = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(images._ready.clear)
+
+    def test_ready_thumbnails_are_stat_once(self):
+        self.storage.exists.return_value = True
+        self.assertTrue(images.variants_ready(self.name))
+        self.assertTrue(images.variants_ready(self.name))
+        self.assertEqual(self.storage.exists.call_count, 1)
+
+    def test_pending_thumbnails_are_checked_again(self):
+        self.storage.exists.return_value = False
+        self.assertFalse(images.variants_ready(self.name))
+        self.storage.exists.return_value = True
+        self.assertTrue(images.variants_ready(self.name))
+
+    def test_forgotten_when_the_blob_goes(self):
+        self.storage.exists.return_value = True
+        images.variants_ready(self.name)
+        images.forget_variants(self.name)
+        self.storage.exists.return_value = False
+        self.assertFalse(images.variants_ready(self.name))
@@ -5,6 +5,7 @@ urlpatterns = [
     path("explore/", views.explore_books, name="explore_books"),
     path("upload/", views.upload_book, name="upload_book"),
     path("books/<slug:slug>/", views.book_detail, name="book_detail"),
+    path("p/<slug:slug>/", views.book_public, name="book_public"),
     path("my-books/", views.my_uploaded_books, name="my_uploaded_books"),
     path("books/edit/<int:pk>/", views.edit_book, name="edit_book"),
     path("books/delete/<int:pk>/", views.delete_book, name="delete_book"),
@@ -21,5 +22,7 @@ urlpatterns = [
     path("exchanged/", views.view_exchanged_books, name="view_exchanged_books"),
     path("exchange-status/<int:pk>/", views.exchange_status, name="exchange_status"),
     path("request-cash/<int:pk>/",views.request_cash,name="request_cash"),
-    path("approve-cash/<int:pk>/", views.approve_cash, name="approve_cash")
+    path("approve-cash/<int:pk>/", views.approve_cash, name="approve_cash"),
+    path("cache/cards/", views.card_cache_stats, name="card_cache_stats"),
+    path("ratelimit/", views.rate_limit_stats, name="rate_limit_stats"),
 ]
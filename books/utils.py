@@ -0,0 +1,90 @@
+import re
+
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils.text import slugify
+
+from .models import Book
+
+
+SLUG_RETRIES = 5
+
+
+def _slug_base(title):
+    max_length = Book._meta.get_field("slug").max_length
+    # leave room for a "-<n>" suffix
+    base = slugify(title)[:max_length - 8].strip("-")
+    return base or "book"
+
+
+def _taken_suffixes(slugs, base):
+    # "base" counts as suffix 0, "base-3" as 3
+    pattern = re.compile(rf"^{re.escape(base)}(?:-(\d+))?$")
+    taken = set()
+    for s in slugs:
+        m = pattern.match(s)
+        if m:
+            taken.add(int(m.group(1) or 0))
+    return taken
+
+
+def _candidates(base):
+    # the range is a scan of the slug index ("." sorts right after "-");
+    # the regex drops the "base-word" slugs in it, so only base and
+    # base-<n> rows come back
+    return Q(slug__gte=base, slug__lt=f"{base}.", slug__regex=rf"^{re.escape(base)}(-[0-9]+)?$")
+
+
+def _next_slug(base, taken):
+    if 0 not in taken:
+        return base
+    return f"{base}-{max(taken) + 1}"
+
+
+def unique_slug(title):
+    """Next free slug for ``title`` using a single query."""
+    base = _slug_base(title)
+    slugs = Book.objects.filter(_candidates(base)).values_list("slug", flat=True)
+    return _next_slug(base, _taken_suffixes(slugs, base))
+
+
+def unique_slugs(titles, chunk_size=200):
+    """Allocate slugs for many titles at once (bulk imports).
+
+    One query per ``chunk_size`` distinct bases; slugs handed out in this
+    call are remembered so duplicate titles in the batch don't collide.
+    """
+    bases = [_slug_base(t) for t in titles]
+    distinct = list(dict.fromkeys(bases))
+    taken = {b: set() for b in distinct}
+
+    for i in range(0, len(distinct), chunk_size):
+        chunk = distinct[i:i + chunk_size]
+        q = Q()
+        for b in chunk:
+            q |= _candidates(b)
+        slugs = list(Book.objects.filter(q).values_list("slug", flat=True))
+        for b in chunk:
+            taken[b] |= _taken_suffixes(slugs, b)
+
+    result = []
+    for b in bases:
+        slug = _next_slug(b, taken[b])
+        taken[b].add(int(slug.rsplit("-", 1)[1]) if slug != b else 0)
+        result.append(slug)
+    return result
+
+
+def save_with_unique_slug(book, retries=SLUG_RETRIES):
+    """Save a new book, retrying slug allocation if a concurrent upload won the race."""
+    for attempt in range(retries):
+        book.slug = unique_slug(book.title)
+        try:
+            with transaction.atomic():
+                book.save()
+            return book
+        except IntegrityError:
+            if Book.objects.filter(slug=book.slug).exists() and attempt < retries - 1:
+                book.pk = None
+                continue
+            raise
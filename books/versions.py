@@ -0,0 +1,21 @@
+import time
+
+# Version stamps kept in a shared cache, for data cached under a key that
+# embeds its version (pagecache, taxonomy): bumping the stamp retires
+# every copy at once, in every process that shares the cache. A stamp is
+# the time it was set, so a new one never repeats an old one.
+
+
+def get(cache, key):
+    """Current version stored at ``key``, starting one if there is none."""
+    version = cache.get(key)
+    if version is None:
+        # a lost version must never match a stale copy: start a new one
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key)
+    return version
+
+
+def bump(cache, *keys):
+    """Give each of ``keys`` a new version."""
+    cache.set_many(dict.fromkeys(keys, time.time_ns()), None)
@@ -1,18 +1,24 @@
-from django.shortcuts import render, redirect, get_object_or_404
+from django.shortcuts import render, redirect, get_object_or_404, aget_object_or_404
 from django.contrib.auth.decorators import login_required
-from django.utils.text import slugify
 from django.contrib import messages
+from django.contrib.admin.views.decorators import staff_member_required
 from django.http import JsonResponse
-from django.db.models import Q, Case, When, Value, IntegerField
+from django.db.models import Q, Case, When, Value, IntegerField, Prefetch
 from .forms import BookForm
+from . import cards, ratelimit, taxonomy
+from .pagecache import cache_anonymous
+from .ratelimit import rate_limited
+from .routers import replica_reads
+from .streaming import stream_render
+from .utils import save_with_unique_slug
 from django.db import transaction
 from .models import Book, Category, Genre, Inventory, ExchangeRequest
 
-@login_required
-def explore_books(request):
+def explore_queryset(user, category=None, genre=None, location=None, query=None):
+    """Books ``user`` can ask for, narrowed by the explore page's filters."""
 
     # Base queryset
-    books = Book.objects.exclude(owner=request.user)
+    books = Book.objects.exclude(owner=user)
 
     # Exclude completed / approved exchanges
     books = books.exclude(
@@ -20,27 +26,19 @@ def explore_books(request):
         Q(expected_for__status__in=["approved", "completed"])
     )
 
-    books = books.select_related("category", "genre", "inventory")
-
-    # ==========================
-    # FILTER PARAMETERS
-    # ==========================
-    selected_category = request.GET.get("category")
-    selected_genre = request.GET.get("genre")
-    selected_location = request.GET.get("location")
-    query = request.GET.get("q")
+    books = cards.book_cards(books)
 
     # Category filter
-    if selected_category:
-        books = books.filter(category__id=selected_category)
+    if category:
+        books = books.filter(category__id=category)
 
     # Genre filter
-    if selected_genre:
-        books = books.filter(genre__id=selected_genre)
+    if genre:
+        books = books.filter(genre__id=genre)
 
     # Location filter
-    if selected_location:
-        books = books.filter(location__iexact=selected_location)
+    if location:
+        books = books.filter(location__iexact=location)
 
     # Search
     if query:
@@ -56,6 +54,24 @@ def explore_books(request):
             )
         ).order_by("priority", "title")
 
+    return books
+
+@replica_reads
+@login_required
+def explore_books(request):
+
+    # ==========================
+    # FILTER PARAMETERS
+    # ==========================
+    selected_category = request.GET.get("category")
+    selected_genre = request.GET.get("genre")
+    selected_location = request.GET.get("location")
+    query = request.GET.get("q")
+
+    books = explore_queryset(
+        request.user, selected_category, selected_genre, selected_location, query
+    )
+
     # ==========================
     # UNIQUE FILTER DATA
     # ==========================
@@ -70,19 +86,21 @@ def explore_books(request):
         .order_by("location")
     )
 
-    return render(request, "books/explore_books.html", {
-        "books": books,
+    return stream_render(request, "books/explore_books.html", {
         "categories": categories,
         "genres": genres,
         "locations": locations,
         "selected_category": selected_category,
         "selected_genre": selected_genre,
         "selected_location": selected_location,
-    })
+    }, rows=books, row_name="book", row_template="books/rows/explore_book.html")
 
+@replica_reads
 @login_required
 def book_detail(request, slug):
-    book = get_object_or_404(Book, slug=slug)
+    book = get_object_or_404(
+        Book.objects.select_related("owner__profile", "inventory"), slug=slug
+    )
 
     # 1. Check if the CURRENT USER has an active request for this book
     exchange = ExchangeRequest.objects.filter(
@@ -108,6 +126,18 @@ def book_detail(request, slug):
         "exchange": exchange,
     })
 
+@cache_anonymous("taxonomy", lambda slug: f"book:{slug}")
+@replica_reads
+def book_public(request, slug):
+    # shareable, read-only page; signed-in users get the full detail view
+    if request.user.is_authenticated:
+        return redirect("book_detail", slug=slug)
+
+    book = get_object_or_404(
+        Book.objects.select_related("category", "genre", "owner"), slug=slug
+    )
+    return render(request, "books/book_public.html", {"book": book})
+
 @login_required
 def upload_book(request):
 
@@ -118,29 +148,21 @@ def upload_book(request):
             book = form.save(commit=False)
             book.owner = request.user
 
-            # slug
-            base_slug = slugify(book.title)
-            slug = base_slug
-            c = 1
-            while Book.objects.filter(slug=slug).exists():
-                slug = f"{base_slug}-{c}"
-                c += 1
-            book.slug = slug
-
             # Custom Category
             if form.cleaned_data["category"].name == "Others":
-                # .title() ensures "thriller" becomes "Thriller"
-                cat_name = form.cleaned_data["custom_category"].strip().title()
-                cat, _ = Category.objects.get_or_create(name=cat_name)
-                book.category = cat
+                # stored as display_name(): "thriller" becomes "Thriller"
+                book.category = taxonomy.get_or_create(
+                    Category, form.cleaned_data["custom_category"]
+                )
 
             # Custom Genre
             if form.cleaned_data["genre"].name == "Others":
-                gen_name = form.cleaned_data["custom_genre"].strip().title()
-                gen, _ = Genre.objects.get_or_create(name=gen_name)
-                book.genre = gen
+                book.genre = taxonomy.get_or_create(
+                    Genre, form.cleaned_data["custom_genre"]
+                )
 
-            book.save()
+            # slug (allocated in one query, retried on a concurrent clash)
+            save_with_unique_slug(book)
 
             # ✅ Auto Inventory
             Inventory.objects.create(
@@ -159,7 +181,9 @@ def upload_book(request):
 
 @login_required
 def my_uploaded_books(request):
-    books = Book.objects.filter(owner=request.user).order_by("-created_at")
+    books = cards.book_cards(
+        Book.objects.filter(owner=request.user).order_by("-created_at")
+    )
 
     return render(request, "books/my_uploaded_books.html", {
         "books": books
@@ -205,6 +229,7 @@ def delete_book(request, pk):
 
     return redirect("my_uploaded_books")
 
+@rate_limited("exchange_request")
 @login_required
 def request_exchange(request, slug):
 
@@ -248,9 +273,14 @@ def request_exchange(request, slug):
 @login_required
 def notifications(request):
 
-    requests = ExchangeRequest.objects.filter(owner=request.user).order_by("-created_at")
+    requests = (
+        cards.exchange_cards(ExchangeRequest.objects.filter(owner=request.user))
+        .prefetch_related(Prefetch("requester__books", queryset=cards.book_cards(Book.objects.all())))
+        .order_by("-created_at")
+    )
 
-    return render(request,"books/notifications.html",{"requests":requests})
+    return stream_render(request, "books/notifications.html", {},
+                         rows=requests, row_name="r", row_template="books/rows/notification.html")
 
 @login_required
 def approve_request(request,id):
@@ -526,9 +556,14 @@ def approve_cash(request, pk):
 
     return redirect("notifications")
 
+# Async, so under ASGI a poll waits for the database on the event loop
+# instead of holding a thread for the whole request; the middleware
+# stack (sessions, rate limits, replica routing) runs as for any view.
+@rate_limited("poll")
+@replica_reads
 @login_required
-def exchange_status(request, pk):
-    r = get_object_or_404(ExchangeRequest, pk=pk)
+async def exchange_status(request, pk):
+    r = await aget_object_or_404(ExchangeRequest, pk=pk)
 
     return JsonResponse({
         "status": r.status,
@@ -536,36 +571,43 @@ def exchange_status(request, pk):
         "requester_confirmed": r.requester_confirmed,
     })
 
+@rate_limited("poll")
+@replica_reads
 @login_required
-def check_notifications(request):
+async def check_notifications(request):
 
-    count = ExchangeRequest.objects.filter(owner=request.user,status="pending").count()
+    user = await request.auser()
+    count = await ExchangeRequest.objects.filter(owner=user, status="pending").acount()
 
-    return JsonResponse({"count":count})
+    return JsonResponse({"count": count})
 
 @login_required
 def view_requested_books(request):
 
-    exchanges = ExchangeRequest.objects.filter(
-        requester=request.user
-    ).select_related(
-        "book",
-        "expected_book",   # ✅ ADD THIS
-        "owner"
+    exchanges = cards.exchange_cards(
+        ExchangeRequest.objects.filter(requester=request.user)
     ).order_by("-created_at")
 
-    return render(request, "books/view_requested_books.html", {
-        "exchanges": exchanges
-    })
+    return stream_render(request, "books/view_requested_books.html", {},
+                         rows=exchanges, row_name="r", row_template="books/rows/requested.html")
 
+@replica_reads
 @login_required
 def view_exchanged_books(request):
-    exchanges = ExchangeRequest.objects.filter(
-        status="completed"
-    ).filter(
-        Q(requester=request.user) | Q(owner=request.user)
-    ).select_related("book").order_by("-created_at")
-
-    return render(request, "books/view_exchanged_books.html", {
-        "exchanges": exchanges
-    })
+    exchanges = cards.exchange_cards(
+        ExchangeRequest.objects.filter(status="completed")
+        .filter(Q(requester=request.user) | Q(owner=request.user))
+    ).order_by("-created_at")
+
+    return stream_render(request, "books/view_exchanged_books.html", {},
+                         rows=exchanges, row_name="r", row_template="books/rows/exchanged.html")
+
+@staff_member_required
+def card_cache_stats(request):
+    # counters are per process: each worker reports its own hit rate
+    return JsonResponse(cards.stats())
+
+@staff_member_required
+def rate_limit_stats(request):
+    # per process, like the card cache counters
+    return JsonResponse(ratelimit.stats())
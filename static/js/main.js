@@ -97,10 +97,10 @@ let notified = false;
 setInterval(() => {
 
     fetch("/books/check/")
-    .then(res => res.json())
+    .then(res => res.ok ? res.json() : null)   // 429: throttled, try next tick
     .then(data => {
 
-        if (data.count > 0 && !notified) {
+        if (data && data.count > 0 && !notified) {
 
             notified = true;
 
@@ -133,9 +133,11 @@ setInterval(() => {
         if (!exchangeId) return;
 
         fetch(`/exchange-status/${exchangeId}/`)
-        .then(res => res.json())
+        .then(res => res.ok ? res.json() : null)
         .then(data => {
 
+            if (!data) return;
+
             badge.innerText =
                 data.status.charAt(0).toUpperCase() + data.status.slice(1);
 
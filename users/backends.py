@@ -0,0 +1,61 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+
+
+def is_shared(store):
+    """Whether every server process reads the same ``store``.
+
+    A LocMem copy could outlive a logout, password change or deactivation
+    handled by another worker, so such a cache must not hold auth state.
+    """
+    return not isinstance(store, LocMemCache)
+
+
+def user_cache_key(user_id):
+    return f"auth:user:{user_id}"
+
+
+def forget_user(user_id):
+    cache.delete(user_cache_key(user_id))
+
+
+class CachedModelBackend(ModelBackend):
+    """ModelBackend that serves the per-request user lookup from the cache.
+
+    The cached user carries its profile, so ``request.user.profile`` costs
+    nothing either. users/signals.py drops the entry whenever the user or
+    profile is saved (edit_profile, password change, last_login) and on
+    logout. With a per-process default cache it is a plain ModelBackend.
+    """
+
+    def get_user(self, user_id):
+        if not is_shared(caches[DEFAULT_CACHE_ALIAS]):
+            return super().get_user(user_id)
+        key = user_cache_key(user_id)
+        user = cache.get(key)
+        if user is None:
+            UserModel = get_user_model()
+            try:
+                user = UserModel._default_manager.select_related("profile").get(pk=user_id)
+            except UserModel.DoesNotExist:
+                return None
+            cache.set(key, user, getattr(settings, "AUTH_USER_CACHE_SECONDS", 60))
+        return user if self.user_can_authenticate(user) else None
+
+    async def aget_user(self, user_id):
+        # request.auser() in the async polling views; same cache entry as get_user
+        if not is_shared(caches[DEFAULT_CACHE_ALIAS]):
+            return await super().aget_user(user_id)
+        key = user_cache_key(user_id)
+        user = await cache.aget(key)
+        if user is None:
+            UserModel = get_user_model()
+            try:
+                user = await UserModel._default_manager.select_related("profile").aget(pk=user_id)
+            except UserModel.DoesNotExist:
+                return None
+            await cache.aset(key, user, getattr(settings, "AUTH_USER_CACHE_SECONDS", 60))
+        return user if self.user_can_authenticate(user) else None
@@ -0,0 +1,12 @@
+from django.utils.functional import SimpleLazyObject
+
+
+def user_context(request):
+    """``profile`` and ``points`` of the current user (None when missing)."""
+    context = getattr(request, "user_context", None)
+    if context is None:
+        return {}
+    return {
+        "profile": SimpleLazyObject(lambda: context.profile),
+        "points": SimpleLazyObject(lambda: context.points),
+    }
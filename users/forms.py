@@ -1,6 +1,7 @@
 from django import forms
 from django.contrib.auth.forms import UserCreationForm, AuthenticationForm
 from django.contrib.auth.models import User
+from django.db import transaction
 from .models import Profile
 
 
@@ -46,9 +47,14 @@ class RegisterForm(UserCreationForm):
         fields = ['username', 'email', 'password1', 'password2']
     
     def save(self, commit=True):
-        user = super().save(commit)
-        user.profile.phone = self.cleaned_data['phone']
-        user.profile.save()
+        user = super().save(commit=False)
+        # create_profile writes the phone with the Profile INSERT
+        user._profile_defaults = {'phone': self.cleaned_data['phone']}
+        if commit:
+            # User, Profile and UserPoints: three INSERTs, all or nothing
+            with transaction.atomic():
+                user.save()
+                self.save_m2m()
         return user
     # def save(self, commit=True):
     #     user = super().save(commit=commit)
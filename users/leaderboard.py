@@ -0,0 +1,165 @@
+import threading
+import time
+from bisect import insort
+from collections import OrderedDict
+
+from django.apps import apps
+from django.db.models import Q
+
+# Top traders by points, then completed exchanges. Each scope (global or a
+# book location) keeps its best SIZE + SLACK rows in memory; ledger.post
+# feeds every balance change in, so pages never sort the table. Boards
+# are also reloaded after TTL seconds to pick up other processes' writes.
+SIZE = 50
+SLACK = 25
+TTL = 300
+MAX_LOCATIONS = 100
+
+_lock = threading.Lock()
+_global = None
+_locations = OrderedDict()
+
+
+def _sort_key(row):
+    return (-row["balance"], -row["completed_exchanges"], row["user_id"])
+
+
+def _queryset(location=None):
+    UserPoints = apps.get_model("users", "UserPoints")
+    qs = UserPoints.objects.all()
+    if location:
+        qs = qs.filter(user__books__location__iexact=location).distinct()
+    return qs
+
+
+class Board:
+
+    def __init__(self, location=None):
+        self.location = location
+        self.capacity = SIZE + SLACK
+        self.load()
+
+    def load(self):
+        rows = list(
+            _queryset(self.location)
+            .order_by("-balance", "-completed_exchanges", "user_id")
+            .values("user_id", "user__username", "balance", "completed_exchanges")[:self.capacity]
+        )
+        self.rows = [
+            (_sort_key(r), {
+                "user_id": r["user_id"],
+                "username": r["user__username"],
+                "balance": r["balance"],
+                "completed_exchanges": r["completed_exchanges"],
+            })
+            for r in rows
+        ]
+        # fewer rows than asked for: the board holds every member of the scope
+        self.complete = len(rows) < self.capacity
+        self.loaded_at = time.monotonic()
+
+    def stale(self):
+        return (
+            time.monotonic() - self.loaded_at > TTL
+            or (not self.complete and len(self.rows) < SIZE)
+        )
+
+    def update(self, row):
+        # build a new list so readers never see a half-applied change
+        rows = [r for r in self.rows if r[1]["user_id"] != row["user_id"]]
+        key = _sort_key(row)
+        if self.complete or (rows and key < rows[-1][0]):
+            insort(rows, (key, row), key=lambda r: r[0])
+            if len(rows) > self.capacity:
+                rows.pop()
+                self.complete = False
+        self.rows = rows
+
+    def top(self, n=SIZE):
+        return [
+            {**row, "rank": i} for i, (_, row) in enumerate(self.rows[:n], start=1)
+        ]
+
+    def rank(self, user_id):
+        for i, (_, row) in enumerate(self.rows, start=1):
+            if row["user_id"] == user_id:
+                return i, row
+
+        if self.complete:
+            # the board holds the whole scope, so the user is not in it
+            return None, None
+
+        # outside the board: count who is ahead using the leaderboard index.
+        # Users with no book in the location have no rank there.
+        try:
+            me = _queryset(self.location).values("balance", "completed_exchanges").get(user_id=user_id)
+        except apps.get_model("users", "UserPoints").DoesNotExist:
+            return None, None
+        b, c = me["balance"], me["completed_exchanges"]
+        ahead = _queryset(self.location).filter(
+            Q(balance__gt=b)
+            | Q(balance=b, completed_exchanges__gt=c)
+            | Q(balance=b, completed_exchanges=c, user_id__lt=user_id)
+        ).count()
+        return ahead + 1, {**me, "user_id": user_id}
+
+
+def _normalize(location):
+    return (location or "").strip().lower()
+
+
+def get_board(location=None):
+    global _global
+    key = _normalize(location)
+    with _lock:
+        board = _locations.get(key) if key else _global
+        if board is not None:
+            if key:
+                _locations.move_to_end(key)
+            if not board.stale():
+                return board
+
+    board = Board(key or None)
+    with _lock:
+        if key:
+            _locations[key] = board
+            _locations.move_to_end(key)
+            while len(_locations) > MAX_LOCATIONS:
+                _locations.popitem(last=False)
+        else:
+            _global = board
+    return board
+
+
+def record(points):
+    """Apply a committed balance change (a UserPoints row) to the loaded boards."""
+    row = {
+        "user_id": points.user_id,
+        "username": points.user.username,
+        "balance": points.balance,
+        "completed_exchanges": points.completed_exchanges,
+    }
+
+    with _lock:
+        boards = [_global] if _global is not None else []
+        location_keys = list(_locations)
+
+    if location_keys:
+        Book = apps.get_model("books", "Book")
+        user_locations = {
+            _normalize(loc) for loc in
+            Book.objects.filter(owner_id=points.user_id).values_list("location", flat=True).distinct()
+        }
+        with _lock:
+            boards += [_locations[k] for k in location_keys if k in user_locations and k in _locations]
+
+    with _lock:
+        for board in boards:
+            board.update(dict(row))
+
+
+def invalidate():
+    global _global
+    with _lock:
+        _global = None
+        _locations.clear()
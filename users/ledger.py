@@ -0,0 +1,197 @@
+from django.db import IntegrityError, transaction
+from django.db.models import Case, F, IntegerField, Sum, Value, When
+from . import leaderboard
+from .models import PointsSnapshot, PointsTransaction, UserPoints
+
+# write a balance checkpoint every N ledger entries per user
+SNAPSHOT_EVERY = 50
+
+
+class InsufficientPoints(Exception):
+    pass
+
+
+def _signed(amount, transaction_type):
+    # spends are stored as negative amounts, everything else as given
+    if transaction_type == "spend":
+        return -abs(amount)
+    return amount
+
+
+def post(user, amount, transaction_type, reason, idempotency_key=None,
+         related_book=None, allow_negative=True, completed_exchange=False):
+    """Append a ledger entry and apply it to the user's balance atomically.
+
+    Returns ``(transaction, created)``. Posting the same ``idempotency_key``
+    again returns the original entry and leaves the balance untouched.
+    ``user`` may be a User or a user id; ``completed_exchange`` also bumps
+    the user's completed exchange count.
+    """
+    amount = _signed(amount, transaction_type)
+    user_id = getattr(user, "pk", user)
+
+    if idempotency_key:
+        existing = PointsTransaction.objects.filter(idempotency_key=idempotency_key).first()
+        if existing:
+            return existing, False
+
+    try:
+        with transaction.atomic():
+            tx = PointsTransaction.objects.create(
+                user_id=user_id,
+                amount=amount,
+                transaction_type=transaction_type,
+                reason=reason,
+                related_book_id=getattr(related_book, "pk", related_book),
+                idempotency_key=idempotency_key,
+            )
+
+            UserPoints.objects.get_or_create(user_id=user_id)
+
+            balances = UserPoints.objects.filter(user_id=user_id)
+            if not allow_negative and amount < 0:
+                # conditional update: no read-modify-write window
+                balances = balances.filter(balance__gte=-amount)
+
+            updated = balances.update(
+                balance=F("balance") + amount,
+                transaction_count=F("transaction_count") + 1,
+                completed_exchanges=F("completed_exchanges") + int(completed_exchange),
+            )
+            if not updated:
+                raise InsufficientPoints(f"User {user_id} cannot spend {-amount} points")
+
+            points = UserPoints.objects.select_related("user").only(
+                "balance", "transaction_count", "completed_exchanges", "user__username"
+            ).get(user_id=user_id)
+            if points.transaction_count % SNAPSHOT_EVERY == 0:
+                PointsSnapshot.objects.create(
+                    user_id=user_id,
+                    balance=points.balance,
+                    last_transaction=tx,
+                    as_of=tx.created_at,
+                )
+
+            transaction.on_commit(lambda: leaderboard.record(points))
+    except IntegrityError:
+        # a concurrent request with the same key won the race
+        if idempotency_key:
+            existing = PointsTransaction.objects.filter(idempotency_key=idempotency_key).first()
+            if existing:
+                return existing, False
+        raise
+
+    return tx, True
+
+
+def post_many(entries, batch_size=1000):
+    """Bulk version of ``post`` for backfills.
+
+    ``entries`` are dicts with ``user_id``, ``amount``, ``transaction_type``,
+    ``reason``, ``idempotency_key`` and optionally ``related_book_id`` and
+    ``completed_exchange``.
+    Per batch: one lookup of known keys, one bulk insert, one balance
+    UPDATE for all touched users, and bulk snapshots. Returns the number
+    of entries applied.
+    """
+    applied = 0
+    for i in range(0, len(entries), batch_size):
+        batch = entries[i:i + batch_size]
+        keys = [e["idempotency_key"] for e in batch]
+        known = set(
+            PointsTransaction.objects.filter(idempotency_key__in=keys)
+            .values_list("idempotency_key", flat=True)
+        )
+
+        new, seen, completed = [], set(), {}
+        for e in batch:
+            key = e["idempotency_key"]
+            if key in known or key in seen:
+                continue
+            seen.add(key)
+            if e.get("completed_exchange"):
+                completed[e["user_id"]] = completed.get(e["user_id"], 0) + 1
+            new.append(PointsTransaction(
+                user_id=e["user_id"],
+                amount=_signed(e["amount"], e["transaction_type"]),
+                transaction_type=e["transaction_type"],
+                reason=e["reason"],
+                related_book_id=e.get("related_book_id"),
+                idempotency_key=key,
+            ))
+        if not new:
+            continue
+
+        deltas = {}
+        for tx in new:
+            total, count = deltas.get(tx.user_id, (0, 0))
+            deltas[tx.user_id] = (total + tx.amount, count + 1)
+
+        with transaction.atomic():
+            PointsTransaction.objects.bulk_create(new)
+
+            UserPoints.objects.bulk_create(
+                [UserPoints(user_id=u) for u in deltas], ignore_conflicts=True
+            )
+            UserPoints.objects.filter(user_id__in=deltas).update(
+                balance=F("balance") + Case(
+                    *[When(user_id=u, then=Value(d[0])) for u, d in deltas.items()],
+                    output_field=IntegerField(),
+                ),
+                transaction_count=F("transaction_count") + Case(
+                    *[When(user_id=u, then=Value(d[1])) for u, d in deltas.items()],
+                    output_field=IntegerField(),
+                ),
+                completed_exchanges=F("completed_exchanges") + Case(
+                    *[When(user_id=u, then=Value(n)) for u, n in completed.items()],
+                    default=Value(0),
+                    output_field=IntegerField(),
+                ),
+            )
+
+            # snapshot users whose count crossed a multiple of SNAPSHOT_EVERY
+            last_tx = {
+                tx["user_id"]: tx for tx in PointsTransaction.objects
+                .filter(idempotency_key__in=seen)
+                .order_by("id")
+                .values("id", "user_id", "created_at")
+            }
+            snapshots = []
+            points = UserPoints.objects.filter(user_id__in=deltas).values(
+                "user_id", "balance", "transaction_count"
+            )
+            for p in points:
+                before = p["transaction_count"] - deltas[p["user_id"]][1]
+                if p["transaction_count"] // SNAPSHOT_EVERY > before // SNAPSHOT_EVERY:
+                    tx = last_tx[p["user_id"]]
+                    snapshots.append(PointsSnapshot(
+                        user_id=p["user_id"],
+                        balance=p["balance"],
+                        last_transaction_id=tx["id"],
+                        as_of=tx["created_at"],
+                    ))
+            PointsSnapshot.objects.bulk_create(snapshots)
+
+            # too many changes to apply one by one; boards reload lazily
+            transaction.on_commit(leaderboard.invalidate)
+
+        applied += len(new)
+
+    return applied
+
+
+def balance_at(user, when):
+    """Balance as of ``when``: the last snapshot before it plus the short tail after it."""
+    snapshot = (
+        PointsSnapshot.objects.filter(user=user, as_of__lte=when)
+        .order_by("-as_of", "-last_transaction_id")
+        .first()
+    )
+
+    tail = PointsTransaction.objects.filter(user=user, created_at__lte=when)
+    base = 0
+    if snapshot:
+        base = snapshot.balance
+        tail = tail.filter(id__gt=snapshot.last_transaction_id)
+
+    return base + (tail.aggregate(total=Sum("amount"))["total"] or 0)
@@ -0,0 +1,68 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, Sum
+from users.models import PointsTransaction, UserPoints
+
+
+def _merge(totals, balances):
+    """Walk both user_id-ordered streams together, yielding per-user pairs."""
+    totals, balances = iter(totals), iter(balances)
+    t, b = next(totals, None), next(balances, None)
+    while t is not None or b is not None:
+        if b is None or (t is not None and t["user_id"] < b["user_id"]):
+            yield t["user_id"], t, None
+            t = next(totals, None)
+        elif t is None or b["user_id"] < t["user_id"]:
+            yield b["user_id"], None, b
+            b = next(balances, None)
+        else:
+            yield t["user_id"], t, b
+            t, b = next(totals, None), next(balances, None)
+
+
+class Command(BaseCommand):
+    help = "Check every UserPoints balance against its transaction log in one streaming pass."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--fix", action="store_true",
+                            help="Reset mismatched balances to the ledger total.")
+
+    def handle(self, *args, **options):
+
+        totals = (
+            PointsTransaction.objects.values("user_id")
+            .annotate(total=Sum("amount"), count=Count("id"))
+            .order_by("user_id")
+            .iterator(chunk_size=2000)
+        )
+        balances = (
+            UserPoints.objects.values("user_id", "balance", "transaction_count")
+            .order_by("user_id")
+            .iterator(chunk_size=2000)
+        )
+
+        checked = mismatched = 0
+        fixes = []
+
+        for user_id, t, b in _merge(totals, balances):
+            checked += 1
+            expected = t["total"] if t else 0
+            count = t["count"] if t else 0
+            actual = b["balance"] if b else 0
+
+            if b is None or actual != expected or b["transaction_count"] != count:
+                mismatched += 1
+                self.stdout.write(f"user {user_id}: balance {actual}, ledger {expected}")
+                fixes.append((user_id, expected, count))
+
+        if options["fix"]:
+            for user_id, expected, count in fixes:
+                UserPoints.objects.update_or_create(
+                    user_id=user_id,
+                    defaults={"balance": expected, "transaction_count": count},
+                )
+
+        style = self.style.SUCCESS if not mismatched else self.style.WARNING
+        self.stdout.write(style(
+            f"{checked} users checked, {mismatched} mismatched"
+            + (", fixed" if options["fix"] and mismatched else "")
+        ))
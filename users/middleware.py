@@ -0,0 +1,82 @@
+from django.contrib import auth
+from django.contrib.auth import get_user_model
+from django.utils.functional import SimpleLazyObject, cached_property
+from books.middleware import HybridMiddleware
+
+RELATED = ("profile", "points")
+
+
+class UserContext:
+    """The current user's Profile and UserPoints, loaded together on first use.
+
+    Whichever of the two is read first, one query fetches every one not
+    already cached on ``request.user``; both are then stored on the user
+    too, so ``user.profile`` / ``user.points`` in templates are free.
+    """
+
+    def __init__(self, request):
+        self.request = request
+
+    @cached_property
+    def _related(self):
+        user = self.request.user
+        if not user.is_authenticated:
+            return dict.fromkeys(RELATED)
+
+        cache = user._state.fields_cache
+        missing = [name for name in RELATED if name not in cache]
+        if missing:
+            fetched = (
+                get_user_model()._default_manager
+                .select_related(*missing).get(pk=user.pk)
+            )
+            for name in missing:
+                obj = fetched._state.fields_cache.get(name)
+                if obj is not None:
+                    obj._state.fields_cache["user"] = user
+                cache[name] = obj
+        return {name: cache[name] for name in RELATED}
+
+    @property
+    def profile(self):
+        return self._related["profile"]
+
+    @property
+    def points(self):
+        return self._related["points"]
+
+
+def share_user(request):
+    """Make ``request.user`` and ``await request.auser()`` one lookup between them.
+
+    AuthenticationMiddleware memoises the two separately, so a middleware
+    reading request.user and an async view awaiting auser() would each
+    fetch the session's user.
+    """
+    resolved = []
+
+    def get_user():
+        if not resolved:
+            resolved.append(auth.get_user(request))
+        return resolved[0]
+
+    async def auser():
+        if not resolved:
+            resolved.append(await auth.aget_user(request))
+        return resolved[0]
+
+    request.user = SimpleLazyObject(get_user)
+    request.auser = auser
+
+
+class UserContextMiddleware(HybridMiddleware):
+
+    def handle(self, request):
+        share_user(request)
+        request.user_context = UserContext(request)
+        return self.get_response(request)
+
+    async def ahandle(self, request):
+        share_user(request)
+        request.user_context = UserContext(request)
+        return await self.get_response(request)
@@ -19,8 +19,22 @@ class UserPoints(models.Model):
 
     balance = models.IntegerField(default=0)
 
+    # ledger entries applied so far (drives periodic snapshots)
+    transaction_count = models.PositiveIntegerField(default=0)
+
+    completed_exchanges = models.PositiveIntegerField(default=0)
+
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # leaderboard order; rank = rows before you in this index
+            models.Index(
+                fields=["-balance", "-completed_exchanges", "user"],
+                name="points_leaderboard_idx",
+            ),
+        ]
+
     def __str__(self):
         return f"{self.user.username} - {self.balance} points"
 
@@ -52,7 +66,44 @@ class PointsTransaction(models.Model):
         blank=True
     )
 
+    # same key twice = same transaction (retries, double clicks)
+    idempotency_key = models.CharField(max_length=100, unique=True, null=True, blank=True)
+
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "id"], name="points_tx_user_id_idx"),
+        ]
+
     def __str__(self):
         return f"{self.user.username} | {self.transaction_type} | {self.amount}"
+
+
+#PointsSnapshot
+#(balance checkpoint: balance = snapshot.balance + transactions after last_transaction)
+class PointsSnapshot(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='point_snapshots'
+    )
+
+    balance = models.IntegerField()
+
+    last_transaction = models.ForeignKey(
+        PointsTransaction,
+        on_delete=models.CASCADE,
+        related_name='+'
+    )
+
+    # created_at of last_transaction
+    as_of = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "as_of"], name="points_snapshot_user_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} - {self.balance} points @ {self.as_of:%Y-%m-%d %H:%M}"
@@ -0,0 +1,98 @@
+import atexit
+import logging
+import threading
+
+from django.conf import settings
+from django.contrib.sessions.backends.base import UpdateError
+from django.contrib.sessions.backends.cached_db import SessionStore as CachedDBStore
+from django.contrib.sessions.backends.db import SessionStore as DBStore
+from django.db import connections
+from django.utils.functional import cached_property
+from .backends import is_shared
+
+logger = logging.getLogger(__name__)
+
+# Sessions modified by a request, waiting for their database write.
+# Reads always hit the cache first, so the row only has to catch up
+# eventually; a timer writes the latest copy of each session after
+# SESSION_WRITE_BEHIND_SECONDS, and anything left is written at exit.
+_pending = {}
+_lock = threading.Lock()
+_timer = None
+
+
+def flush_pending():
+    """Write every deferred session to the database now."""
+    global _timer
+    with _lock:
+        stores = list(_pending.values())
+        _pending.clear()
+        _timer = None
+
+    for store in stores:
+        try:
+            DBStore.save(store)
+        except UpdateError:
+            # the row was deleted meanwhile (logout elsewhere, clearsessions)
+            pass
+        except Exception:
+            logger.exception("Deferred write of session %s failed", store.session_key)
+
+    if threading.current_thread() is not threading.main_thread():
+        connections.close_all()
+
+
+def _defer(store):
+    global _timer
+    with _lock:
+        _pending[store.session_key] = store
+        if _timer is None:
+            _timer = threading.Timer(
+                getattr(settings, "SESSION_WRITE_BEHIND_SECONDS", 30), flush_pending
+            )
+            _timer.daemon = True
+            _timer.start()
+
+
+atexit.register(flush_pending)
+
+
+class SessionStore(CachedDBStore):
+    """cached_db sessions whose database copy is written behind the cache.
+
+    New sessions (signup, login, key rotation) are inserted right away so
+    the key is reserved; later changes only update the cache and are
+    written by the flush timer. The cache copy is the one reads trust, so
+    SESSION_CACHE_ALIAS must be shared by every server process and outlive
+    them (settings.CACHES); with a per-process cache this is the plain
+    database engine: no cached reads, every change written at once.
+    """
+
+    @cached_property
+    def shared(self):
+        return is_shared(self._cache)
+
+    def load(self):
+        if not self.shared:
+            return DBStore.load(self)
+        return super().load()
+
+    async def aload(self):
+        if not self.shared:
+            return await DBStore.aload(self)
+        return await super().aload()
+
+    def save(self, must_create=False):
+        if must_create or self.session_key is None or not self.shared:
+            return super().save(must_create)
+        try:
+            self._cache.set(self.cache_key, self._session, self.get_expiry_age())
+        except Exception:
+            logger.exception("Error saving to cache (%s)", self._cache)
+            return super().save(must_create)
+        _defer(self)
+
+    def delete(self, session_key=None):
+        with _lock:
+            _pending.pop(session_key or self.session_key, None)
+        super().delete(session_key)
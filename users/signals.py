@@ -1,9 +1,36 @@
 from django.contrib.auth.models import User
-from django.db.models.signals import post_save
+from django.contrib.auth.signals import user_logged_out
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
-from .models import Profile
+from books.images import schedule, variants_ready
+from books.storage import track_media_field
+from .backends import forget_user
+from .models import Profile, UserPoints
 
 @receiver(post_save, sender=User)
 def create_profile(sender, instance, created, **kwargs):
     if created:
-        Profile.objects.create(user=instance)
+        Profile.objects.create(user=instance, **getattr(instance, '_profile_defaults', {}))
+        UserPoints.objects.create(user=instance)
+
+@receiver(post_save, sender=Profile)
+def process_avatar(sender, instance, **kwargs):
+    if instance.avatar and not variants_ready(instance.avatar.name):
+        schedule(instance.avatar.name)
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def uncache_user(sender, instance, **kwargs):
+    forget_user(instance.pk)
+
+@receiver(user_logged_out)
+def uncache_logged_out_user(sender, request, user, **kwargs):
+    if user is not None:
+        forget_user(user.pk)
+
+@receiver(post_save, sender=Profile)
+@receiver(post_delete, sender=Profile)
+def uncache_profile_user(sender, instance, **kwargs):
+    forget_user(instance.user_id)
+
+track_media_field(Profile, "avatar")
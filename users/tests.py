@@ -1,3 +1,156 @@
-from django.test import TestCase
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from books.models import Book, Category, Genre
+from . import leaderboard, ledger, sessions
+from .models import PointsSnapshot, PointsTransaction, UserPoints
+from .backends import CachedModelBackend, user_cache_key
+
+LOCAL_CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+
+
+class UserCacheTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("reader", password="secret-pass-1")
+        self.client.force_login(self.user)
+        # sessions written behind go to the test database, not at exit to the real one
+        self.addCleanup(sessions.flush_pending)
+
+    def test_request_caches_the_user(self):
+        self.client.get("/books/check/")
+        self.assertEqual(cache.get(user_cache_key(self.user.pk)), self.user)
+
+    def test_warm_poll_runs_only_its_own_query(self):
+        self.client.get("/books/check/")
+        with self.assertNumQueries(1):
+            self.client.get("/books/check/")
+
+    def test_user_is_fetched_once_for_sync_and_async_reads(self):
+        self.client.get("/books/check/")
+        with mock.patch.object(CachedModelBackend, "get_user", wraps=CachedModelBackend().get_user) as get_user, \
+                mock.patch.object(CachedModelBackend, "aget_user", wraps=CachedModelBackend().aget_user) as aget_user:
+            self.client.get("/books/check/")
+        self.assertEqual(get_user.call_count + aget_user.call_count, 1)
+
+    def test_logout_forgets_the_user(self):
+        self.client.get("/books/check/")
+        self.client.get("/accounts/logout/")
+        self.assertIsNone(cache.get(user_cache_key(self.user.pk)))
+
+    def test_deactivated_user_is_not_served_from_the_cache(self):
+        backend = CachedModelBackend()
+        backend.get_user(self.user.pk)
+        self.user.is_active = False
+        self.user.save()
+        self.assertIsNone(backend.get_user(self.user.pk))
+
+    def test_password_change_forgets_the_user(self):
+        CachedModelBackend().get_user(self.user.pk)
+        self.user.set_password("secret-pass-2")
+        self.user.save(update_fields=["password"])
+        self.assertIsNone(cache.get(user_cache_key(self.user.pk)))
+
+    @override_settings(CACHES=LOCAL_CACHES)
+    def test_per_process_cache_is_not_used(self):
+        self.assertEqual(CachedModelBackend().get_user(self.user.pk), self.user)
+        self.assertIsNone(cache.get(user_cache_key(self.user.pk)))
+
+
+class LeaderboardTests(TestCase):
+    def setUp(self):
+        self.addCleanup(leaderboard.invalidate)
+        category = Category.objects.create(name="Fiction")
+        genre = Genre.objects.create(name="Drama")
+        self.users = {}
+        for i, (name, location) in enumerate([("pune1", "Pune"), ("pune2", "Pune"), ("delhi", "Delhi")]):
+            user = User.objects.create_user(name)
+            Book.objects.create(
+                owner=user, slug=f"book-{i}", title="A Book", author="Someone", price=10,
+                location=location, language="English", condition="good",
+                category=category, genre=genre,
+            )
+            ledger.post(user, 10 * (i + 1), "earn", "seed")
+            self.users[name] = user
+
+    def test_rank_within_the_location(self):
+        rank, me = leaderboard.get_board("Pune").rank(self.users["pune1"].id)
+        self.assertEqual(rank, 2)
+        self.assertEqual(me["balance"], 10)
+
+    def test_no_rank_outside_the_location(self):
+        self.assertEqual(leaderboard.get_board("Pune").rank(self.users["delhi"].id), (None, None))
+
+    def test_no_rank_outside_the_location_beyond_the_board(self):
+        # a board too small to hold the scope falls back to counting
+        with mock.patch.object(leaderboard, "SIZE", 1), mock.patch.object(leaderboard, "SLACK", 0):
+            board = leaderboard.get_board("Pune")
+            self.assertFalse(board.complete)
+            self.assertEqual(board.rank(self.users["pune1"].id)[0], 2)
+            self.assertEqual(board.rank(self.users["delhi"].id), (None, None))
+
+
+class LedgerTests(TestCase):
+    def setUp(self):
+        self.addCleanup(leaderboard.invalidate)
+        self.user = User.objects.create_user("trader")
+
+    def balance(self):
+        return UserPoints.objects.get(user=self.user).balance
+
+    def test_same_key_applies_once(self):
+        first, created = ledger.post(self.user, 10, "earn", "upload", idempotency_key="upload-1")
+        again, created_again = ledger.post(self.user, 10, "earn", "upload", idempotency_key="upload-1")
+        self.assertTrue(created)
+        self.assertFalse(created_again)
+        self.assertEqual(again.pk, first.pk)
+        self.assertEqual(self.balance(), 10)
+
+    def test_spend_cannot_go_negative(self):
+        ledger.post(self.user, 5, "earn", "upload")
+        with self.assertRaises(ledger.InsufficientPoints):
+            ledger.post(self.user, 10, "spend", "exchange", allow_negative=False)
+        self.assertEqual(self.balance(), 5)
+        self.assertEqual(PointsTransaction.objects.filter(user=self.user).count(), 1)
+
+    def test_post_many_skips_known_keys(self):
+        ledger.post(self.user, 10, "earn", "upload", idempotency_key="k0")
+        entries = [
+            {"user_id": self.user.pk, "amount": 1, "transaction_type": "earn",
+             "reason": "backfill", "idempotency_key": f"k{i}"}
+            for i in range(3)
+        ]
+        self.assertEqual(ledger.post_many(entries + entries), 2)
+        self.assertEqual(self.balance(), 12)
+        self.assertEqual(UserPoints.objects.get(user=self.user).transaction_count, 3)
+
+    def test_balance_at_uses_snapshots(self):
+        with mock.patch.object(ledger, "SNAPSHOT_EVERY", 2):
+            for i in range(5):
+                ledger.post(self.user, 1, "earn", "upload")
+        self.assertEqual(PointsSnapshot.objects.filter(user=self.user).count(), 2)
+        last = PointsTransaction.objects.filter(user=self.user).latest("id")
+        self.assertEqual(ledger.balance_at(self.user, last.created_at), 5)
+
+    def test_reconcile_reports_and_fixes_drift(self):
+        ledger.post(self.user, 10, "earn", "upload")
+        UserPoints.objects.filter(user=self.user).update(balance=99)
+        other = User.objects.create_user("ledger-only")
+        PointsTransaction.objects.create(user=other, amount=3, transaction_type="admin", reason="seed")
+
+        out = StringIO()
+        call_command("reconcile_points", stdout=out)
+        self.assertIn("2 users checked, 2 mismatched", out.getvalue())
+        self.assertEqual(self.balance(), 99)
+
+        call_command("reconcile_points", "--fix", stdout=StringIO())
+        self.assertEqual(self.balance(), 10)
+        self.assertEqual(UserPoints.objects.get(user=other).balance, 3)
+
+        out = StringIO()
+        call_command("reconcile_points", stdout=out)
+        self.assertIn("2 users checked, 0 mismatched", out.getvalue())
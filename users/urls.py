@@ -7,4 +7,5 @@ urlpatterns = [
     path('logout/', views.logout_view, name='Logout'),
     path('profile/', views.profile_view, name='profile'),
     path('edit-profile/', views.edit_profile, name='edit_profile'),
+    path('leaderboard/', views.leaderboard_view, name='leaderboard'),
 ]
@@ -1,6 +1,8 @@
 from django.shortcuts import render, redirect
 from django.contrib.auth import login, logout
 from django.contrib.auth.decorators import login_required
+from books.models import Book
+from . import leaderboard
 from .forms import RegisterForm, LoginForm, UserUpdateForm, ProfileUpdateForm
 
 
@@ -65,3 +67,23 @@ def edit_profile(request):
 
     return render(request, 'users/edit_profile.html', context)
 
+@login_required
+def leaderboard_view(request):
+    selected_location = request.GET.get("location") or ""
+
+    board = leaderboard.get_board(selected_location)
+    rank, me = board.rank(request.user.id)
+
+    locations = (
+        Book.objects.values_list("location", flat=True)
+        .distinct()
+        .order_by("location")
+    )
+
+    return render(request, 'users/leaderboard.html', {
+        'rows': board.top(),
+        'rank': rank,
+        'me': me,
+        'locations': locations,
+        'selected_location': selected_location,
+    })